@@ -1,8 +1,14 @@
+from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
+from .scraper.log_config import configure_logging
 
 def create_app():
+    # PMS_USERNAME, PMS_PASSWORD etc. from backend/.env (see .env.example),
+    # before the routes import the scraper settings
+    load_dotenv()
     app = Flask(__name__)
+    configure_logging()
     
     # Configure CORS
     CORS(app, resources={
@@ -1,38 +1,37 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import sqlite3
-import os
 import logging
+from ..scraper import warehouse
+from ..scraper.snapshot_store import SOURCES, availability_as_of, list_captures
+from ..scraper.season_calendar import load_ranges, save_ranges
 
 bp = Blueprint('database', __name__)
 
-def get_db_connection(db_name):
+def get_db_connection(table):
+    """Open the warehouse for reading table; raises FileNotFoundError when the table doesn't exist yet"""
     try:
-        # Get the absolute path to the scraper/data directory
-        current_dir = os.path.dirname(os.path.dirname(__file__))  # backend/app
-        db_path = os.path.join(current_dir, 'scraper', 'data', db_name)
-        
-        # Log the path for debugging
-        logging.info(f"Attempting to connect to database at: {db_path}")
-        
-        if not os.path.exists(db_path):
-            logging.error(f"Database file not found: {db_path}")
-            raise FileNotFoundError(f"Database file not found: {db_path}")
-            
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = warehouse.connect(row_factory=sqlite3.Row)
+        if not warehouse.table_exists(conn, table):
+            conn.close()
+            logging.error(f"Table not found in warehouse: {table}")
+            raise FileNotFoundError(f"Table not found: {table}")
         return conn
     except Exception as e:
-        logging.error(f"Error connecting to database {db_name}: {str(e)}")
+        logging.error(f"Error connecting to warehouse for {table}: {str(e)}")
         raise
 
+def rows_to_dicts(rows):
+    """Convert sqlite rows to dicts, leaving out the internal row hash column"""
+    return [{key: row[key] for key in row.keys() if key != 'row_hash'} for row in rows]
+
 @bp.route('/api/db/combined-inventory', methods=['GET', 'OPTIONS'])
 def get_combined_inventory():
     try:
-        conn = get_db_connection('combined_inventory.db')
+        conn = get_db_connection('combined_inventory')
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM combined_inventory')
         rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
+        data = rows_to_dicts(rows)
         conn.close()
         return jsonify({"status": "success", "data": data})
     except FileNotFoundError as e:
@@ -48,11 +47,11 @@ def get_combined_inventory():
 @bp.route('/api/db/inventory-allocation', methods=['GET', 'OPTIONS'])
 def get_inventory_allocation():
     try:
-        conn = get_db_connection('inventory_allocation.db')
+        conn = get_db_connection('daily_inventory_allocation')
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM daily_inventory_allocation')
         rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
+        data = rows_to_dicts(rows)
         conn.close()
         return jsonify({"status": "success", "data": data})
     except FileNotFoundError as e:
@@ -68,11 +67,11 @@ def get_inventory_allocation():
 @bp.route('/api/db/pms-inventory-processed', methods=['GET', 'OPTIONS'])
 def get_pms_inventory_processed():
     try:
-        conn = get_db_connection('pms_inventory_processed.db')
+        conn = get_db_connection('pms_inventory_processed')
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM pms_inventory_processed')
         rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
+        data = rows_to_dicts(rows)
         conn.close()
         return jsonify({"status": "success", "data": data})
     except FileNotFoundError as e:
@@ -88,11 +87,11 @@ def get_pms_inventory_processed():
 @bp.route('/api/db/pms-inventory-raw', methods=['GET', 'OPTIONS'])
 def get_pms_inventory_raw():
     try:
-        conn = get_db_connection('pms_inventory_raw.db')
+        conn = get_db_connection('pms_inventory')
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM pms_inventory')
         rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
+        data = rows_to_dicts(rows)
         conn.close()
         return jsonify({"status": "success", "data": data})
     except FileNotFoundError as e:
@@ -103,4 +102,72 @@ def get_pms_inventory_raw():
         return jsonify({"status": "error", "message": "Database error"}), 500
     except Exception as e:
         logging.error(f"Unexpected error in get_pms_inventory_raw: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"status": "error", "message": str(e)}), 500 
+
+@bp.route('/api/db/snapshots/as-of', methods=['GET', 'OPTIONS'])
+def get_snapshot_as_of():
+    """Availability for stay dates from..to as captured at asOf (latest when omitted)"""
+    source = request.args.get('source', 'pms')
+    stay_from = request.args.get('from')
+    stay_to = request.args.get('to')
+    as_of = request.args.get('asOf')
+    if source not in SOURCES:
+        return jsonify({"status": "error", "message": f"Unknown source: {source}"}), 400
+    if not stay_from or not stay_to:
+        return jsonify({"status": "error", "message": "from and to stay dates are required"}), 400
+    try:
+        with warehouse.connection() as conn:
+            data = availability_as_of(conn, source, stay_from, stay_to, as_of)
+        return jsonify({"status": "success", "data": data.to_dict(orient='records')})
+    except sqlite3.Error as e:
+        logging.error(f"SQLite error: {str(e)}")
+        return jsonify({"status": "error", "message": "Database error"}), 500
+    except Exception as e:
+        logging.error(f"Unexpected error in get_snapshot_as_of: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/api/db/snapshots/captures', methods=['GET', 'OPTIONS'])
+def get_snapshot_captures():
+    try:
+        with warehouse.connection() as conn:
+            data = list_captures(conn, request.args.get('source'))
+        return jsonify({"status": "success", "data": data.to_dict(orient='records')})
+    except sqlite3.Error as e:
+        logging.error(f"SQLite error: {str(e)}")
+        return jsonify({"status": "error", "message": "Database error"}), 500
+    except Exception as e:
+        logging.error(f"Unexpected error in get_snapshot_captures: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/api/db/seasons', methods=['GET', 'OPTIONS'])
+def get_season_calendar():
+    """Season ranges that apply to ?property= (the defaults when omitted)"""
+    try:
+        with warehouse.connection() as conn:
+            data = load_ranges(conn, request.args.get('property'))
+        return jsonify({"status": "success", "data": data})
+    except sqlite3.Error as e:
+        logging.error(f"SQLite error: {str(e)}")
+        return jsonify({"status": "error", "message": "Database error"}), 500
+    except Exception as e:
+        logging.error(f"Unexpected error in get_season_calendar: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/api/db/seasons', methods=['PUT'])
+def put_season_calendar():
+    """Replace the season ranges of ?property= with the JSON list [{season, start, end}, ...]"""
+    ranges = request.get_json(silent=True)
+    if not isinstance(ranges, list):
+        return jsonify({"status": "error", "message": "Expected a JSON list of season ranges"}), 400
+    try:
+        with warehouse.connection() as conn:
+            count = save_ranges(conn, ranges, request.args.get('property'))
+        return jsonify({"status": "success", "message": f"Saved {count} season ranges"})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except sqlite3.Error as e:
+        logging.error(f"SQLite error: {str(e)}")
+        return jsonify({"status": "error", "message": "Database error"}), 500
+    except Exception as e:
+        logging.error(f"Unexpected error in put_season_calendar: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
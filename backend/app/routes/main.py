@@ -1,24 +1,29 @@
 from flask import Blueprint, jsonify, Response, request, stream_with_context
-from ..scraper.scraper import scrape_pms_inventory
+from ..scraper.scraper import scrape_pms_inventory, MAX_CONCURRENCY, MAX_HORIZON_DAYS
 from ..scraper.combine_inventory import combine_inventory_files
-from ..scraper.yielder import load_and_clean_data, apply_yield_matrix
+from ..scraper.yielder import compute_yield, explain_yield
 from ..scraper.process_cm_inventory import process_cm_inventory
 from ..scraper.update_pms_cm_allotment import update_allotmet
 from ..shared import log_queue
 import queue
 import threading
 import time
-import sys
-from io import StringIO
 import logging
 from werkzeug.utils import secure_filename
 import os
 import json
-import sqlite3
 import pandas as pd
 from ..scraper.update_allotment_dom import main as update_allotment_dom_main
+from ..scraper.driver_pool import pool_stats
+from ..scraper.scrape_metrics import phase_percentiles, recent_runs
+from ..scraper import warehouse
+from ..scraper import cm_upload_cache
+from ..scraper import yield_cache
+from ..scraper.log_config import capture_to_queue
+from ..scraper.yield_scenarios import expand_grid, run_scenarios, MAX_SCENARIOS
 
 bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 # Global variables for scraping progress
 scraping_active = False
@@ -28,33 +33,16 @@ scraping_progress = queue.Queue()
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data')
 ALLOWED_EXTENSIONS = {'xlsx'}
 
-class RealTimeStringIO(StringIO):
-    def __init__(self, queue):
-        super().__init__()
-        self.queue = queue
-        self._is_capturing = False
-
-    def write(self, text):
-        if not self._is_capturing:
-            self._is_capturing = True
-            try:
-                if text.strip():  # Only process non-empty lines
-                    self.queue.put(text.strip())
-            finally:
-                self._is_capturing = False
-
-def scrape_with_progress(start_date=None):
+def scrape_with_progress(start_date=None, engine='selenium', horizon_days=None, concurrency=None):
     global scraping_active, scraping_error
     try:
-        # Redirect stdout to capture print statements
-        old_stdout = sys.stdout
-        sys.stdout = RealTimeStringIO(scraping_progress)
-        
-        result = scrape_pms_inventory(start_date)
-        
-        # Restore stdout
-        sys.stdout = old_stdout
-        
+        scrape_options = {'engine': engine, 'horizon_days': horizon_days}
+        if concurrency:
+            scrape_options['concurrency'] = concurrency
+        # Stream the scraper's log records to the progress endpoint
+        with capture_to_queue(scraping_progress):
+            result = scrape_pms_inventory(start_date, **scrape_options)
+
         if result is not None:
             scraping_progress.put({"status": "success", "message": "Scraping completed successfully"})
         else:
@@ -70,6 +58,30 @@ def scrape_with_progress(start_date=None):
 def health_check():
     return jsonify({"status": "healthy"})
 
+@bp.route('/api/driver-pool/stats')
+def get_driver_pool_stats():
+    """Hits, cold starts and checkout latency of the shared WebDriver pools"""
+    return jsonify({"status": "success", "data": pool_stats()})
+
+@bp.route('/api/scrape/metrics')
+def get_scrape_metrics():
+    """p50/p95 seconds per scrape phase over the most recent runs"""
+    limit = request.args.get('limit', default=50, type=int)
+    status = request.args.get('status', default='success')
+    if limit < 1:
+        return jsonify({"status": "error", "message": "limit must be a positive integer"}), 400
+    return jsonify({
+        "status": "success",
+        "data": {
+            "percentiles": phase_percentiles(limit, status=status or None),
+            "recent_runs": recent_runs(min(limit, 20))
+        }
+    })
+
+@bp.route('/api/yield/cache-stats')
+def get_yield_cache_stats():
+    return jsonify({"status": "success", "data": yield_cache.stats()})
+
 @bp.route('/api/scrape', methods=['POST'])
 def trigger_scrape():
     global scraping_active, scraping_error
@@ -81,6 +93,21 @@ def trigger_scrape():
     if not start_date:
         return jsonify({"status": "error", "message": "Start date is required"}), 400
     
+    # Scrape engine: 'selenium' (default) or 'http'
+    engine = request.json.get('engine', 'selenium')
+    if engine not in ('selenium', 'http'):
+        return jsonify({"status": "error", "message": f"Unknown engine: {engine}"}), 400
+    
+    # Optional long-horizon scrape split into parallel windows
+    horizon_days = request.json.get('horizonDays')
+    concurrency = request.json.get('concurrency')
+    if horizon_days is not None and (not isinstance(horizon_days, int) or not 1 <= horizon_days <= MAX_HORIZON_DAYS):
+        return jsonify({"status": "error",
+                        "message": f"horizonDays must be an integer from 1 to {MAX_HORIZON_DAYS}"}), 400
+    if concurrency is not None and (not isinstance(concurrency, int) or not 1 <= concurrency <= MAX_CONCURRENCY):
+        return jsonify({"status": "error",
+                        "message": f"concurrency must be an integer from 1 to {MAX_CONCURRENCY}"}), 400
+    
     # Reset error state
     scraping_error = None
     scraping_active = True
@@ -92,7 +119,7 @@ def trigger_scrape():
         except queue.Empty:
             break
     
-    scraping_thread = threading.Thread(target=scrape_with_progress, args=(start_date,))
+    scraping_thread = threading.Thread(target=scrape_with_progress, args=(start_date, engine, horizon_days, concurrency))
     scraping_thread.daemon = True
     scraping_thread.start()
     
@@ -132,42 +159,39 @@ def scrape_stream():
 @bp.route('/api/combine-inventory', methods=['POST'])
 def trigger_combine():
     try:
-        print("Starting inventory combination process...")
+        logger.info("Starting inventory combination process...")
         
-        # Check if required files exist
-        pms_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'pms_inventory_processed.db')
-        cm_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'cm_inventory_processed.db')
+        # Check if required tables exist
+        with warehouse.connection() as conn:
+            has_pms = warehouse.table_exists(conn, 'pms_inventory_processed')
+            has_cm = warehouse.table_exists(conn, 'cm_inventory_processed')
         
-        if not os.path.exists(pms_db_path):
+        if not has_pms:
             return jsonify({
                 "status": "error",
                 "message": "PMS inventory database not found. Please run scraping first."
             }), 400
             
-        if not os.path.exists(cm_db_path):
+        if not has_cm:
             return jsonify({
                 "status": "error",
                 "message": "CM inventory database not found. Please upload and process CM Excel file first."
             }), 400
         
-        print(f"Found required databases: PMS={pms_db_path}, CM={cm_db_path}")
+        logger.info("Found required PMS and CM tables in the warehouse")
         
         result = combine_inventory_files()
         
-        # Verify the combined database was created
-        combined_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'combined_inventory.db')
-        if not os.path.exists(combined_db_path):
-            return jsonify({
-                "status": "error",
-                "message": "Failed to create combined inventory database"
-            }), 500
-            
-        # Verify data was written
-        conn = sqlite3.connect(combined_db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM combined_inventory")
-        count = cursor.fetchone()[0]
-        conn.close()
+        # Verify the combined table was created
+        with warehouse.connection() as conn:
+            if not warehouse.table_exists(conn, 'combined_inventory'):
+                return jsonify({
+                    "status": "error",
+                    "message": "Failed to create combined inventory database"
+                }), 500
+                
+            # Verify data was written
+            count = warehouse.count_rows(conn, 'combined_inventory')
         
         if count == 0:
             return jsonify({
@@ -175,7 +199,7 @@ def trigger_combine():
                 "message": "No data was written to the combined inventory database"
             }), 500
             
-        print(f"Successfully combined inventory with {count} rows")
+        logger.info("Successfully combined inventory with %s rows", count)
         
         return jsonify({
             "status": "success",
@@ -183,7 +207,7 @@ def trigger_combine():
             "data": str(result)
         })
     except Exception as e:
-        print(f"Error in combine inventory: {str(e)}")
+        logger.error("Error in combine inventory: %s", e)
         return jsonify({
             "status": "error",
             "message": str(e)
@@ -192,19 +216,21 @@ def trigger_combine():
 @bp.route('/api/yield', methods=['POST'])
 def trigger_yield():
     try:
-        print("Starting yield calculation process...")
+        logger.info("Starting yield calculation process...")
         
         # Check if combined inventory exists
-        combined_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'combined_inventory.db')
-        if not os.path.exists(combined_db_path):
+        with warehouse.connection() as conn:
+            has_combined = warehouse.table_exists(conn, 'combined_inventory')
+        if not has_combined:
             return jsonify({
                 "status": "error",
                 "message": "Combined inventory database not found. Please run combine inventory first."
             }), 400
 
-        # Call the main function which handles the entire process
-        from ..scraper.yielder import main
-        result = main()
+        # Recompute the dates whose inputs changed since the last run (all of them with full_rebuild)
+        from ..scraper.yielder import run_yield
+        body = request.get_json(silent=True) or {}
+        result, report = run_yield(full_rebuild=bool(body.get('full_rebuild', False)))
         
         if result is None:
             return jsonify({
@@ -212,20 +238,9 @@ def trigger_yield():
                 "message": "Failed to process yield calculation"
             }), 500
         
-        # Verify the database was created
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'inventory_allocation.db')
-        if not os.path.exists(db_path):
-            return jsonify({
-                "status": "error",
-                "message": "Failed to create inventory allocation database"
-            }), 500
-
         # Verify the data was written correctly
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM daily_inventory_allocation")
-        count = cursor.fetchone()[0]
-        conn.close()
+        with warehouse.connection() as conn:
+            count = warehouse.count_rows(conn, warehouse.ALLOCATION_TABLE)
 
         if count == 0:
             return jsonify({
@@ -239,10 +254,11 @@ def trigger_yield():
         return jsonify({
             "status": "success",
             "message": "Yield calculation completed successfully",
-            "data": result_dict
+            "data": result_dict,
+            "report": report
         })
     except Exception as e:
-        print(f"Error in yield calculation: {str(e)}")
+        logger.error("Error in yield calculation: %s", e)
         return jsonify({
             "status": "error",
             "message": f"Failed to calculate yield: {str(e)}"
@@ -266,7 +282,7 @@ def trigger_process_cm():
 @bp.route('/api/custom-yield', methods=['POST'])
 def trigger_custom_yield():
     try:
-        print("Starting custom yield calculation process...")
+        logger.info("Starting custom yield calculation process...")
         
         # Get configuration from request
         config = request.json
@@ -301,69 +317,48 @@ def trigger_custom_yield():
                 }), 400
 
         # Check if combined inventory exists
-        combined_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'combined_inventory.db')
-        if not os.path.exists(combined_db_path):
+        with warehouse.connection() as conn:
+            has_combined = warehouse.table_exists(conn, 'combined_inventory')
+        if not has_combined:
             return jsonify({
                 "status": "error",
                 "message": "Combined inventory database not found. Please run combine inventory first."
             }), 400
 
-        # Import the yielder module
-        from ..scraper.yielder import load_and_clean_data, apply_yield_matrix
-
-        # Load and clean data with custom configuration
-        data = load_and_clean_data(
+        # Load, clean and apply the yield matrix with custom configuration,
+        # reusing the cached result for an unchanged inventory and configuration
+        result = compute_yield(
             demand_bins=config['demand_bins'],
-            demand_labels=config['demand_labels']
+            demand_labels=config['demand_labels'],
+            very_low_threshold_pct=config['very_low_threshold_pct'],
+            low_threshold_pct=config['low_threshold_pct'],
+            room_caps=config['room_caps'],
+            property_id=config.get('property')
         )
-        
-        if data is None:
+
+        if result is None:
             return jsonify({
                 "status": "error",
                 "message": "Failed to load and clean data"
             }), 500
 
-        # Apply yield matrix with custom configuration
-        result = apply_yield_matrix(
-            data,
-            very_low_threshold_pct=config['very_low_threshold_pct'],
-            low_threshold_pct=config['low_threshold_pct'],
-            room_caps=config['room_caps']
-        )
+        # Per-date decision trace, only built when the caller asks for it
+        explain = None
+        if config.get('explain'):
+            explain = explain_yield(
+                result,
+                very_low_threshold_pct=config['very_low_threshold_pct'],
+                low_threshold_pct=config['low_threshold_pct'],
+                room_caps=config['room_caps']
+            )
+            explain['Date'] = explain['Date'].dt.strftime('%Y-%m-%d')
 
-        # Save to database
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'inventory_allocation.db')
-        conn = sqlite3.connect(db_path)
-        
-        # Enable date handling in SQLite
-        conn.execute('PRAGMA foreign_keys = ON')
-        
-        # Define SQLite data types for each column
-        dtype = {
-            'Date': 'DATE',
-            'DayOfWeek': 'TEXT',
-            'Season': 'TEXT',
-            'Occupancy': 'REAL',
-            'DemandLevel': 'TEXT',
-            'Deluxe Remaining Inventory': 'INTEGER',
-            'Deluxe Online Inventory': 'INTEGER',
-            'Deluxe BAR Rate': 'TEXT',
-            'Premiere Remaining Inventory': 'INTEGER',
-            'Premiere Online Inventory': 'INTEGER',
-            'Premiere BAR Rate': 'TEXT'
-        }
-        
         # Ensure date is in YYYY-MM-DD format before saving
         result['Date'] = pd.to_datetime(result['Date']).dt.strftime('%Y-%m-%d')
         
-        # Save to database
-        result.to_sql('daily_inventory_allocation', conn, if_exists='replace', index=False, dtype=dtype)
-        
-        # Verify the data was written
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM daily_inventory_allocation")
-        count = cursor.fetchone()[0]
-        conn.close()
+        # Replace the allocation rows in the warehouse and verify the data was written
+        with warehouse.connection() as conn:
+            count = warehouse.replace_allocation(conn, result)
 
         if count == 0:
             return jsonify({
@@ -374,18 +369,60 @@ def trigger_custom_yield():
         # Convert the result to a format that can be serialized to JSON
         result_dict = result.to_dict(orient='records')
         
-        return jsonify({
+        response = {
             "status": "success",
             "message": "Custom yield calculation completed successfully",
             "data": result_dict
-        })
+        }
+        if explain is not None:
+            response["explain"] = explain.to_dict(orient='records')
+        return jsonify(response)
     except Exception as e:
-        print(f"Error in custom yield calculation: {str(e)}")
+        logger.error("Error in custom yield calculation: %s", e)
         return jsonify({
             "status": "error",
             "message": f"Failed to calculate custom yield: {str(e)}"
         }), 500
 
+@bp.route('/api/yield-scenarios', methods=['POST'])
+def evaluate_yield_scenarios():
+    """
+    Evaluate what-if yield configurations without touching the live allocation.
+    Body: {"scenarios": [config, ...]} and/or {"grid": {setting: [values]}, "base": config},
+    plus optional "include_dates", "workers" and "property".
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        configs = list(body.get('scenarios') or [])
+        if body.get('grid'):
+            # Reject oversized grids before expanding them
+            configs += expand_grid(body['grid'], body.get('base'), limit=max(0, MAX_SCENARIOS - len(configs)))
+        if not configs:
+            return jsonify({
+                "status": "error",
+                "message": "Provide a list of scenarios or a grid"
+            }), 400
+
+        results = run_scenarios(
+            configs,
+            include_dates=bool(body.get('include_dates', False)),
+            workers=int(body.get('workers') or 0),
+            property_id=body.get('property')
+        )
+        return jsonify({
+            "status": "success",
+            "message": f"Evaluated {len(results)} scenarios",
+            "data": results
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error("Error in scenario evaluation: %s", e)
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to evaluate scenarios: {str(e)}"
+        }), 500
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -397,25 +434,51 @@ def upload_cm_excel():
     if file.filename == '':
         return jsonify({'status': 'error', 'message': 'No selected file'}), 400
     if file and allowed_file(file.filename):
-        filename = secure_filename('cm_upload.xlsx')
-        save_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(save_path)
-        return jsonify({'status': 'success', 'message': 'File uploaded successfully'})
+        # Uploads are content-addressed; re-uploading the active file is a no-op
+        result = cm_upload_cache.store_upload(file, secure_filename(file.filename))
+        message = ('File already uploaded' if result['status'] == 'duplicate'
+                   else 'File uploaded successfully')
+        return jsonify({'status': 'success', 'message': message, 'data': result})
     return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
 
+@bp.route('/api/cm-uploads')
+def list_cm_uploads():
+    try:
+        with warehouse.connection() as conn:
+            uploads = cm_upload_cache.list_uploads(conn)
+        return jsonify({"status": "success", "data": uploads})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/api/cm-uploads/<content_hash>/activate', methods=['POST'])
+def activate_cm_upload(content_hash):
+    """Switch back to a previously uploaded CM file; ?process=true also reprocesses it"""
+    try:
+        with warehouse.connection() as conn:
+            cm_upload_cache.activate_upload(conn, content_hash)
+        result = None
+        if request.args.get('process', 'false').lower() == 'true':
+            result = process_cm_inventory()
+        return jsonify({
+            "status": "success",
+            "message": f"CM upload {content_hash[:12]} activated",
+            "data": result
+        })
+    except FileNotFoundError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @bp.route('/api/db/inventory-allocation')
 def get_inventory_allocation():
     try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper', 'data', 'inventory_allocation.db')
-        if not os.path.exists(db_path):
-            return jsonify({
-                "status": "error",
-                "message": "Inventory allocation database not found"
-            }), 404
-
-        conn = sqlite3.connect(db_path)
-        data = pd.read_sql_query("SELECT * FROM daily_inventory_allocation", conn)
-        conn.close()
+        with warehouse.connection() as conn:
+            if not warehouse.count_rows(conn, warehouse.ALLOCATION_TABLE):
+                return jsonify({
+                    "status": "error",
+                    "message": "Inventory allocation database not found"
+                }), 404
+            data = warehouse.read_allocation(conn)
 
         # Convert the data to a format that can be serialized to JSON
         result = data.to_dict(orient='records')
@@ -425,7 +488,7 @@ def get_inventory_allocation():
             "data": result
         })
     except Exception as e:
-        print(f"Error fetching inventory allocation: {str(e)}")
+        logger.error("Error fetching inventory allocation: %s", e)
         return jsonify({
             "status": "error",
             "message": f"Failed to fetch inventory allocation: {str(e)}"
@@ -481,7 +544,9 @@ def trigger_update_allotment():
                 })
 
                 # Call the update function
-                result = update_allotmet(username=username, password=password)
+                result = update_allotmet(username=username, password=password,
+                                         full_resync=bool(data.get('full_resync', False)),
+                                         engine=data.get('engine', 'selenium'))
 
                 if result:
                     log_queue.put({
@@ -539,10 +604,12 @@ def trigger_update_allotment_dom():
                     'message': 'Starting DOM-based allotment update process...'
                 })
                 # Call the update_allotment_dom main function
-                update_allotment_dom_main()
+                counts = update_allotment_dom_main(username=username, password=password,
+                                                   full_resync=bool(data.get('full_resync', False)))
                 log_queue.put({
                     'type': 'success',
-                    'message': 'DOM-based allotment update completed!'
+                    'message': f"DOM-based allotment update completed! {counts['pushed']} dates pushed, "
+                               f"{counts['skipped']} unchanged"
                 })
             except Exception as e:
                 log_queue.put({
@@ -0,0 +1,296 @@
+"""
+Browserless allotment push.
+
+Posts each planned submission (see allotment_plan) to the endpoint the
+modal's Save button, btnSaveRoomAllotment, calls, on a pooled logged-in
+session from the HTTP scrape engine. Submissions are sent with bounded
+concurrency. A save sets an absolute number of rooms for its dates, so
+retrying one after a dropped connection or an expired session is
+idempotent; each request also carries a key derived from its payload.
+Only a JSON answer with success: true counts as saved. Saved submissions
+are recorded in the allotment ledger and the ones that still fail are
+handed back for the Selenium updater to push.
+
+Experimental: SAVE_ALLOTMENT_PATH and build_payload are modeled on the
+modal's form, and every push warns until they match a recording of the
+real Save request. Record one through the stub server with the Selenium
+engine, so the browser's own request is captured (this saves to the live
+PMS), and import it into RECORDED_SAVE_DIR without session cookies:
+
+    python -m app.scraper.benchmark record /tmp/allotment-recording --target allotment --allow-live-writes
+    python -m app.scraper.allotment_http --import /tmp/allotment-recording
+
+Then check the payload against the recording, and the client against the
+local stub replaying it, with:
+
+    python -m app.scraper.allotment_http
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from .pms_config import PMS_USERNAME, PMS_PASSWORD, pms_url
+from .http_scraper import get_session, SessionExpired, REQUEST_TIMEOUT, _is_login_page
+from .allotment_ledger import record_pushed, DELUXE_ROOM_TYPE
+from .pms_stub_server import resolve_fixture, load_fixture_meta, META_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# The request btnSaveRoomAllotment sends from the allotment detail page
+SAVE_ALLOTMENT_PATH = 'Allotment/SaveRoomAllotment'
+COMPANY_ID = '1001'
+# The real Save request and its answer, recorded through the stub server
+RECORDED_SAVE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'allotment')
+
+CONCURRENCY = 4
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5  # Seconds, multiplied by the attempt number
+
+class AllotmentRejected(Exception):
+    """Raised when the PMS doesn't confirm a save; retrying won't help"""
+    pass
+
+def build_payload(submission, room_type=DELUXE_ROOM_TYPE, company_id=COMPANY_ID):
+    """The save form's fields for one submission"""
+    return {
+        'companyId': company_id,
+        'roomTypes': [room_type],
+        'numberOfRoom': submission['inventory'],
+        'remark': f"Automated update via HTTP, inventory {submission['inventory']}",
+        'dateRanges': [{'startDate': start, 'endDate': end} for start, end in submission['ranges']]
+    }
+
+def _shape(value):
+    """Field names and nesting of a payload, without its values"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(value[0])] if value else []
+    return None
+
+def recorded_save(fixture_dir=RECORDED_SAVE_DIR):
+    """Path of the recorded Save response, or None"""
+    return resolve_fixture(fixture_dir, SAVE_ALLOTMENT_PATH, 'POST', fallback=False)
+
+def save_payload_mismatch(fixture_dir=RECORDED_SAVE_DIR):
+    """
+    Why build_payload isn't known to match the real Save request: none was
+    recorded, or the recorded body has another content type or other
+    fields. None once the recording agrees.
+    """
+    fixture = recorded_save(fixture_dir)
+    request = load_fixture_meta(fixture).get('request') if fixture else None
+    if not request or not request.get('body'):
+        return f"no recorded {SAVE_ALLOTMENT_PATH} request in {fixture_dir}"
+    if 'json' not in (request.get('content_type') or ''):
+        return f"the recorded Save request is {request.get('content_type')}, save_submission posts JSON"
+    expected = _shape(build_payload({'inventory': 0, 'ranges': [('01/01/2000', '01/01/2000')]}))
+    recorded = _shape(json.loads(request['body']))
+    if recorded != expected:
+        return f"the recorded Save request has fields {json.dumps(recorded)}, build_payload {json.dumps(expected)}"
+    return None
+
+def import_recorded_save(recording_dir, fixture_dir=RECORDED_SAVE_DIR):
+    """
+    Copy the Save request from a recording (benchmark record --target
+    allotment) into fixture_dir, dropping its cookies. Returns the copied
+    path, or None after logging the POSTs that were recorded instead.
+    """
+    fixture = recorded_save(recording_dir)
+    if fixture is None:
+        posts = sorted(os.path.relpath(os.path.join(root, name), recording_dir)
+                       for root, _, names in os.walk(recording_dir) for name in names
+                       if '__post' in name and not name.endswith(META_SUFFIX))
+        logger.error("No %s request in %s; recorded POSTs: %s", SAVE_ALLOTMENT_PATH, recording_dir,
+                     ', '.join(posts) or 'none')
+        return None
+    target = os.path.join(fixture_dir, os.path.relpath(fixture, recording_dir))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(fixture, target)
+    meta = load_fixture_meta(fixture)
+    meta.pop('cookies', None)
+    with open(target + META_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    logger.info("Imported the recorded Save request into %s", target)
+    return target
+
+def idempotency_key(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def save_submission(session, submission, base_url=None):
+    """
+    POST one submission and return the PMS's JSON answer. Raises
+    SessionExpired, an HTTP error, or AllotmentRejected unless the answer is
+    JSON with success: true.
+    """
+    payload = build_payload(submission)
+    response = session.post(
+        pms_url(SAVE_ALLOTMENT_PATH, base_url),
+        json=payload,
+        headers={
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'application/json',
+            'Idempotency-Key': idempotency_key(payload)
+        },
+        timeout=REQUEST_TIMEOUT
+    )
+    if response.status_code in (401, 403) or _is_login_page(response):
+        raise SessionExpired("PMS session expired")
+    response.raise_for_status()
+    # Only an explicit success counts: an HTML page or an unexpected body
+    # means nothing may have been saved, and the ledger must not say otherwise
+    if 'json' not in response.headers.get('Content-Type', ''):
+        raise AllotmentRejected(f"Save answered with {response.headers.get('Content-Type') or 'no content type'}, "
+                                f"not JSON")
+    result = response.json()
+    if not isinstance(result, dict) or result.get('success') is not True:
+        message = result.get('message') if isinstance(result, dict) else None
+        raise AllotmentRejected(message or f"Save not confirmed: {str(result)[:200]}")
+    return result
+
+def _save_with_retries(submission, username, password, base_url):
+    """save_submission, logging in again on an expired session and retrying dropped connections"""
+    force_login = False
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        session = get_session(username, password, base_url, force_login=force_login)
+        force_login = False
+        try:
+            return save_submission(session, submission, base_url)
+        except SessionExpired:
+            force_login = True
+            error = "session expired"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        if attempt < MAX_ATTEMPTS:
+            logger.warning("Allotment save for %s failed (%s), retrying", submission['ranges'][0][0], error)
+            time.sleep(RETRY_BACKOFF * attempt)
+    raise Exception(f"Allotment save failed after {MAX_ATTEMPTS} attempts: {error}")
+
+def push_allotment_http(submissions, counts=None, username=PMS_USERNAME, password=PMS_PASSWORD,
+                        base_url=None, concurrency=CONCURRENCY):
+    """
+    Save submissions with at most concurrency requests in flight, recording
+    each saved one in the ledger and adding its dates to counts['pushed'].
+    Returns the submissions that could not be saved, in plan order.
+    """
+    mismatch = save_payload_mismatch()
+    if mismatch:
+        logger.warning("HTTP allotment push is experimental: %s", mismatch)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(_save_with_retries, submission, username, password, base_url): position
+            for position, submission in enumerate(submissions)
+        }
+        for future in as_completed(futures):
+            submission = submissions[futures[future]]
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning("Allotment save for %s failed: %s", submission['ranges'], e)
+                failed.append(futures[future])
+                continue
+            record_pushed(submission['items'], base_url=base_url)
+            if counts is not None:
+                counts['pushed'] += len(submission['items'])
+    logger.info("HTTP allotment push: %s of %s submissions saved", len(submissions) - len(failed), len(submissions))
+    return [submissions[position] for position in sorted(failed)]
+
+def check_against_stub(submissions=None):
+    """
+    Check build_payload against the recorded Save request (see
+    save_payload_mismatch), then push submissions (by default the current
+    plan for every date) to a local PMSStubServer answering with the
+    recorded response: each must be posted once, counted and recorded, and
+    a save answered with HTML must not be. Runs against a scratch warehouse.
+    Returns True when every check passes.
+    """
+    import os
+    import tempfile
+
+    from . import warehouse
+    from .allotment_ledger import read_allocation_csv, plan_push
+    from .allotment_plan import plan_submissions
+    from .pms_stub_server import PMSStubServer
+
+    if submissions is None:
+        submissions = plan_submissions(read_allocation_csv())
+    with tempfile.TemporaryDirectory() as scratch:
+        warehouse.set_warehouse_path(os.path.join(scratch, warehouse.WAREHOUSE_DB))
+        try:
+            fixture_dir = os.path.join(scratch, 'fixtures')
+            os.makedirs(os.path.join(fixture_dir, os.path.dirname(SAVE_ALLOTMENT_PATH)))
+            os.makedirs(os.path.join(fixture_dir, 'Login'))
+            with open(os.path.join(fixture_dir, 'index.html'), 'w') as f:
+                f.write('<html><body>Stub PMS</body></html>')
+            with open(os.path.join(fixture_dir, 'Login', 'DoLogin.json'), 'w') as f:
+                f.write('{"success": true}')
+            save_fixture = os.path.join(fixture_dir, SAVE_ALLOTMENT_PATH + '.json')
+
+            passed = True
+            mismatch = save_payload_mismatch()
+            if mismatch:
+                logger.error("Save payload unverified: %s", mismatch)
+                passed = False
+            # Replay the real answer to a save when one was recorded
+            recorded = recorded_save()
+            if recorded:
+                shutil.copyfile(recorded, save_fixture)
+                shutil.copyfile(recorded + META_SUFFIX, save_fixture + META_SUFFIX)
+            else:
+                with open(save_fixture, 'w') as f:
+                    f.write('{"success": true}')
+            with PMSStubServer(fixture_dir) as server:
+                counts = {'pushed': 0}
+                failed = push_allotment_http(submissions, counts, 'stub', 'stub', base_url=server.base_url)
+                received = sorted(json.dumps(json.loads(body), sort_keys=True) for path, body in server.received
+                                  if path.strip('/') == SAVE_ALLOTMENT_PATH)
+            expected = sorted(json.dumps(build_payload(submission), sort_keys=True) for submission in submissions)
+            if failed or received != expected:
+                logger.error("Stub received %s saves for %s submissions (%s failed)",
+                             len(received), len(submissions), len(failed))
+                passed = False
+            dates = [item for submission in submissions for item in submission['items']]
+            if counts['pushed'] != len(dates) or plan_push(dates, base_url=server.base_url)[1]['planned']:
+                logger.error("Saved dates were not all counted and recorded in the ledger")
+                passed = False
+
+            # A 200 that isn't a JSON success (e.g. a wrong endpoint's HTML page) must not count
+            os.remove(save_fixture)
+            if os.path.exists(save_fixture + META_SUFFIX):
+                os.remove(save_fixture + META_SUFFIX)
+            with open(os.path.join(fixture_dir, SAVE_ALLOTMENT_PATH + '.html'), 'w') as f:
+                f.write('<html><body>Not found</body></html>')
+            with PMSStubServer(fixture_dir) as server:
+                counts = {'pushed': 0}
+                failed = push_allotment_http(submissions[:1], counts, 'stub', 'stub', base_url=server.base_url)
+                unrecorded = plan_push(submissions[0]['items'], base_url=server.base_url)[1]['planned']
+            if len(failed) != 1 or counts['pushed'] or unrecorded != len(submissions[0]['items']):
+                logger.error("An HTML answer to a save was treated as saved")
+                passed = False
+        finally:
+            warehouse.set_warehouse_path(None)
+    logger.info("HTTP allotment stub check %s: %s submissions", "passed" if passed else "FAILED", len(submissions))
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the HTTP allotment push against the recorded Save request")
+    parser.add_argument('--import', dest='recording_dir', metavar='RECORDING_DIR',
+                        help="First copy the Save request from this recording into RECORDED_SAVE_DIR")
+    args = parser.parse_args()
+    if args.recording_dir and import_recorded_save(args.recording_dir) is None:
+        return 1
+    return 0 if check_against_stub() else 1
+
+if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
+    raise SystemExit(main())
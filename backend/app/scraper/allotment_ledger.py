@@ -0,0 +1,110 @@
+"""
+Ledger of the allotment last pushed to the PMS.
+
+Every batch an allotment updater saves successfully is recorded per (PMS,
+room type, date), the PMS being its base URL, so pushes to a local stub
+never count for the live site. Before a push the allocation is diffed
+against the ledger, so only dates whose inventory differs from what the PMS
+was last given are sent. A full resync ignores the ledger and pushes
+everything, for when the PMS has been edited by hand.
+"""
+
+import csv
+import logging
+import os
+from datetime import datetime
+
+from . import warehouse
+from .pms_config import pms_url
+
+logger = logging.getLogger(__name__)
+
+LEDGER_TABLE = 'allotment_ledger'
+DELUXE_ROOM_TYPE = 'DLT'
+INVENTORY_COLUMN = 'Deluxe Online Inventory'
+ALLOCATION_CSV = os.path.join(warehouse.DATA_DIR, 'daily_inventory_allocation_seasonal.csv')
+PMS_DATE_FORMAT = '%m/%d/%Y'
+
+def ensure_ledger_table(conn):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({LEDGER_TABLE})")]
+    if columns and 'pms' not in columns:
+        # Rows from before the ledger was keyed by PMS can't be attributed to
+        # one; dropping them makes the next push resend every date once
+        conn.execute(f"DROP TABLE {LEDGER_TABLE}")
+        logger.info("Dropped the allotment ledger recorded without a PMS key")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            pms TEXT NOT NULL,
+            room_type TEXT NOT NULL,
+            Date TEXT NOT NULL,
+            inventory INTEGER NOT NULL,
+            pushed_at TEXT NOT NULL,
+            PRIMARY KEY (pms, room_type, Date)
+        )
+    """)
+
+def _pms_key(base_url=None):
+    return pms_url('', base_url)
+
+def _iso_date(pms_date):
+    return datetime.strptime(pms_date, PMS_DATE_FORMAT).strftime('%Y-%m-%d')
+
+def read_allocation_csv(csv_path=None, column=INVENTORY_COLUMN):
+    """[{'date': 'MM/DD/YYYY', 'inventory': n}] from the allocation CSV, in file order"""
+    date_inventory = []
+    with open(csv_path or ALLOCATION_CSV, 'r') as file:
+        for row in csv.DictReader(file):
+            date_obj = datetime.strptime(row['Date'], '%Y-%m-%d')
+            date_inventory.append({
+                'date': date_obj.strftime(PMS_DATE_FORMAT),
+                'inventory': int(row[column])
+            })
+    return date_inventory
+
+def group_consecutive(date_inventory):
+    """Split into runs of consecutive items with the same inventory"""
+    groups = []
+    current_group = []
+    for item in date_inventory:
+        if current_group and item['inventory'] != current_group[0]['inventory']:
+            groups.append(current_group)
+            current_group = []
+        current_group.append(item)
+    if current_group:
+        groups.append(current_group)
+    return groups
+
+def read_ledger(conn, room_type=DELUXE_ROOM_TYPE, base_url=None):
+    """{'YYYY-MM-DD': inventory} last pushed for room_type to the PMS at base_url (default: the configured one)"""
+    ensure_ledger_table(conn)
+    return dict(conn.execute(f"SELECT Date, inventory FROM {LEDGER_TABLE} WHERE pms = ? AND room_type = ?",
+                             (_pms_key(base_url), room_type)))
+
+def plan_push(date_inventory, room_type=DELUXE_ROOM_TYPE, full_resync=False, db_path=None, base_url=None):
+    """
+    The items of date_inventory the PMS doesn't have yet according to the
+    ledger (all of them with full_resync), and run counts
+    {'planned', 'skipped', 'pushed'} for the updater to fill in.
+    """
+    ledger = {}
+    if not full_resync:
+        with warehouse.connection(db_path) as conn:
+            ledger = read_ledger(conn, room_type, base_url)
+    to_push = [item for item in date_inventory if ledger.get(_iso_date(item['date'])) != item['inventory']]
+    counts = {'planned': len(to_push), 'skipped': len(date_inventory) - len(to_push), 'pushed': 0}
+    logger.info("Allotment diff for %s: %s dates to push, %s unchanged%s",
+                room_type, counts['planned'], counts['skipped'], " (full resync)" if full_resync else "")
+    return to_push, counts
+
+def record_pushed(items, room_type=DELUXE_ROOM_TYPE, db_path=None, base_url=None):
+    """Record items as saved on the PMS at base_url; call once the save is confirmed"""
+    pushed_at = datetime.now().isoformat(timespec='seconds')
+    pms = _pms_key(base_url)
+    with warehouse.connection(db_path) as conn:
+        ensure_ledger_table(conn)
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {LEDGER_TABLE} (pms, room_type, Date, inventory, pushed_at) "
+                f"VALUES (?, ?, ?, ?, ?)",
+                [(pms, room_type, _iso_date(item['date']), item['inventory'], pushed_at) for item in items]
+            )
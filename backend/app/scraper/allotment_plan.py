@@ -0,0 +1,74 @@
+"""
+Plan allotment pushes as few modal submissions as possible.
+
+A submission sets one number of rooms for every date range added to the
+modal. Dates are grouped by inventory across the whole horizon, each group
+is coalesced into maximal contiguous [start, end] ranges, and ranges are
+packed up to MAX_RANGES_PER_SUBMISSION per submission. A 30-day run at
+one inventory becomes one range in one submission instead of 30 single-day
+ranges over 6 submissions.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+
+from .allotment_ledger import group_consecutive, PMS_DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Date ranges the modal has always been given per save
+MAX_RANGES_PER_SUBMISSION = 5
+# Dates per submission under the old one-range-per-date batching
+LEGACY_BATCH_SIZE = 5
+
+def coalesce_ranges(dates):
+    """Maximal runs of consecutive days in dates as [(start, end)] date pairs, in order"""
+    ranges = []
+    for day in sorted(set(dates)):
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+def plan_submissions(date_inventory, max_ranges=MAX_RANGES_PER_SUBMISSION):
+    """
+    Submissions for date_inventory ([{'date': 'MM/DD/YYYY', 'inventory': n}]):
+    [{'inventory', 'ranges': [('MM/DD/YYYY', 'MM/DD/YYYY')], 'items'}], with
+    the items each submission covers for the ledger.
+    """
+    by_inventory = {}
+    for item in date_inventory:
+        day = datetime.strptime(item['date'], PMS_DATE_FORMAT).date()
+        by_inventory.setdefault(item['inventory'], {})[day] = item
+
+    submissions = []
+    for inventory, items in by_inventory.items():
+        ranges = coalesce_ranges(items)
+        for start in range(0, len(ranges), max_ranges):
+            packed = ranges[start:start + max_ranges]
+            submissions.append({
+                'inventory': inventory,
+                'ranges': [(first.strftime(PMS_DATE_FORMAT), last.strftime(PMS_DATE_FORMAT)) for first, last in packed],
+                'items': [items[first + timedelta(days=offset)]
+                          for first, last in packed for offset in range((last - first).days + 1)]
+            })
+    # Push in date order, like the per-date batching did
+    submissions.sort(key=lambda s: datetime.strptime(s['ranges'][0][0], PMS_DATE_FORMAT))
+    return submissions
+
+def plan_summary(date_inventory, submissions):
+    """Counts for a plan, next to what the per-date batching would have needed"""
+    legacy = sum(math.ceil(len(group) / LEGACY_BATCH_SIZE) for group in group_consecutive(date_inventory))
+    summary = {
+        'dates': len(date_inventory),
+        'submissions': len(submissions),
+        'ranges': sum(len(s['ranges']) for s in submissions),
+        'legacy_submissions': legacy,
+        'legacy_ranges': len(date_inventory)
+    }
+    logger.info("Allotment plan: %s dates in %s ranges over %s submissions (was %s submissions of %s ranges)",
+                summary['dates'], summary['ranges'], summary['submissions'],
+                summary['legacy_submissions'], summary['legacy_ranges'])
+    return summary
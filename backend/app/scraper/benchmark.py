@@ -0,0 +1,343 @@
+"""
+Offline benchmarks for the PMS scrapers.
+
+Record once against the live site, then replay the fixtures from the local
+stub for repeatable numbers:
+
+    python -m app.scraper.benchmark record fixtures/pms
+    python -m app.scraper.benchmark run fixtures/pms --target scrape --runs 3
+
+Both log in with PMS_USERNAME and PMS_PASSWORD from the environment; the
+stub accepts any values, recording needs the real login.
+
+Each run reports wall time, WebDriver commands issued and memory (peak
+Python allocations plus the process' max RSS). Runs use a fresh scratch
+warehouse each; CSV mirrors still go to the data directory like a normal
+scrape or allotment update.
+
+The CM upload parser is benchmarked on a generated workbook instead, against
+a scratch warehouse:
+
+    python -m app.scraper.benchmark cm-ingest --years 3 --runs 3
+
+and the yield engines on generated inventory for several properties:
+
+    python -m app.scraper.benchmark yield --years 5 --properties 10
+
+The allocation update after a scrape that changed a few dates, incremental
+against a full recompute:
+
+    python -m app.scraper.benchmark yield-update --years 10 --changed 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from .pms_config import PMS_BASE_URL, set_base_url
+from .pms_stub_server import PMSStubServer
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+TARGETS = ['scrape', 'allotment', 'allotment-dom']
+CM_ENGINES = ['pandas', 'streaming']
+CM_ROOM_TYPES = ['Deluxe Room', 'Premiere Room', 'Junior Suite', 'Family Suite', 'Villa']
+
+@contextmanager
+def count_webdriver_calls():
+    """Count the WebDriver commands every driver in the process issues"""
+    counter = {'calls': 0}
+    lock = threading.Lock()
+    original_execute = WebDriver.execute
+
+    def counting_execute(self, driver_command, params=None):
+        with lock:
+            counter['calls'] += 1
+        return original_execute(self, driver_command, params)
+
+    WebDriver.execute = counting_execute
+    try:
+        yield counter
+    finally:
+        WebDriver.execute = original_execute
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _run_target(target, start_date=None, engine='selenium'):
+    if target == 'scrape':
+        from .scraper import scrape_pms_inventory
+        return scrape_pms_inventory(start_date, engine=engine) is not None
+    if target == 'allotment':
+        from .update_pms_cm_allotment import update_allotmet
+        return update_allotmet(engine=engine)
+    if target == 'allotment-dom':
+        from .update_allotment_dom import main as update_allotment_dom_main
+        update_allotment_dom_main()
+        return True
+    raise ValueError(f"Unknown benchmark target: {target}")
+
+def measure_run(target, start_date=None, engine='selenium'):
+    """Run target once and return its wall time, WebDriver calls and memory"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    succeeded = False
+    try:
+        with count_webdriver_calls() as counter:
+            succeeded = _run_target(target, start_date, engine)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'target': target,
+        'succeeded': succeeded,
+        'wall_seconds': round(elapsed, 3),
+        'webdriver_calls': counter['calls'],
+        'python_peak_mb': round(peak / (1024 * 1024), 1),
+        'max_rss_mb': _max_rss_mb()
+    }
+
+def run_benchmark(fixture_dir, target='scrape', runs=3, start_date=None, engine='selenium'):
+    """
+    Replay fixture_dir from the stub and measure target runs times. Every
+    run gets an empty scratch warehouse, so runs do the same work (the
+    allotment ledger starts empty) and the real warehouse is left alone.
+    """
+    from . import warehouse
+
+    results = []
+    with PMSStubServer(fixture_dir) as server, tempfile.TemporaryDirectory() as scratch:
+        previous = set_base_url(server.base_url)
+        print(f"Replaying {fixture_dir} from {server.base_url}")
+        try:
+            for run in range(1, runs + 1):
+                warehouse.set_warehouse_path(os.path.join(scratch, f'run-{run}.db'))
+                result = measure_run(target, start_date, engine)
+                result['run'] = run
+                results.append(result)
+                print(f"Run {run}: {result['wall_seconds']:.2f}s, {result['webdriver_calls']} WebDriver calls, "
+                      f"peak {result['python_peak_mb']} MB Python, max RSS {result['max_rss_mb']} MB"
+                      f"{'' if result['succeeded'] else ' (failed)'}")
+        finally:
+            set_base_url(previous)
+            warehouse.set_warehouse_path(None)
+    return results
+
+# Targets that save to the PMS, so recording them changes the live allotment
+WRITE_TARGETS = ['allotment', 'allotment-dom']
+
+def record_fixtures(fixture_dir, target='scrape', upstream_url=None, start_date=None, engine='selenium',
+                    allow_live_writes=False):
+    """
+    Run target once through the recording proxy so its responses land in
+    fixture_dir. Recording an allotment target really updates the PMS, so
+    it needs allow_live_writes.
+    """
+    if target in WRITE_TARGETS and not allow_live_writes:
+        raise ValueError(f"Recording {target} saves allotment on the live PMS; pass allow_live_writes to do so")
+    upstream_url = upstream_url or PMS_BASE_URL
+    with PMSStubServer(fixture_dir, upstream_url=upstream_url) as server:
+        previous = set_base_url(server.base_url)
+        print(f"Recording {upstream_url} into {fixture_dir}")
+        try:
+            return _run_target(target, start_date, engine)
+        finally:
+            set_base_url(previous)
+
+def write_cm_workbook(path, years=3, room_types=None, seed=0):
+    """Write a synthetic CM 'Planning' export covering years of dates"""
+    from openpyxl import Workbook
+
+    room_types = room_types or CM_ROOM_TYPES
+    rng = random.Random(seed)
+    start = date.today()
+    dates = [datetime.combine(start + timedelta(days=offset), datetime.min.time())
+             for offset in range(365 * years)]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Planning')
+    sheet.append(['Planning', None, None] + dates)
+    for room_type in room_types:
+        sheet.append([room_type, None, 'Left for sale'] +
+                     [rng.choice([rng.randint(0, 30), 'X', None]) for _ in dates])
+        sheet.append([None, None, 'Price (IDR)'] + [rng.randint(900, 4000) * 1000 for _ in dates])
+        sheet.append([])
+    workbook.save(path)
+    return len(dates)
+
+def measure_cm_ingest(upload_path, engine, db_path):
+    """Parse upload_path into a scratch warehouse once and return wall time and peak memory"""
+    from . import warehouse
+    from .process_cm_inventory import ingest_cm_workbook
+
+    conn = warehouse.connect(db_path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        change_set = ingest_cm_workbook(conn, upload_path, engine)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        conn.close()
+    return {
+        'engine': engine,
+        'wall_seconds': round(elapsed, 3),
+        'python_peak_mb': round(peak / (1024 * 1024), 1),
+        'rows': len(change_set['added']) + len(change_set['changed']) + change_set['unchanged']
+    }
+
+def run_cm_benchmark(years=3, runs=3, engines=None):
+    """Time each CM ingest engine on a generated workbook; every run starts from an empty warehouse"""
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        upload_path = os.path.join(scratch, 'cm_upload.xlsx')
+        days = write_cm_workbook(upload_path, years)
+        print(f"Generated {upload_path}: {days} dates x {len(CM_ROOM_TYPES)} room types")
+        for engine in engines or CM_ENGINES:
+            for run in range(1, runs + 1):
+                db_path = os.path.join(scratch, f'{engine}-{run}.db')
+                result = measure_cm_ingest(upload_path, engine, db_path)
+                result['run'] = run
+                results.append(result)
+                print(f"{engine} run {run}: {result['wall_seconds']:.2f}s, "
+                      f"peak {result['python_peak_mb']} MB Python, {result['rows']} rows")
+    return results
+
+def make_yield_frame(years=3, properties=1, seed=0):
+    """Synthetic load_and_clean_data output: years of dates for each property, stacked"""
+    import numpy as np
+    import pandas as pd
+    from .yielder import DEMAND_BINS, DEMAND_LABELS, YIELD_MATRIX
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(properties):
+        dates = pd.date_range(date.today(), periods=365 * years)
+        frame = pd.DataFrame({
+            'Date': dates,
+            'Deluxe Room': rng.integers(0, 170, len(dates)),
+            'Premiere Room': rng.integers(0, 270, len(dates)),
+            'Occupancy': rng.uniform(0, 100, len(dates))
+        })
+        frame['Season'] = rng.choice(list(YIELD_MATRIX['Deluxe Room']), len(dates))
+        frames.append(frame)
+    data = pd.concat(frames, ignore_index=True)
+    data['DemandLevel'] = pd.cut(data['Occupancy'], bins=DEMAND_BINS, labels=DEMAND_LABELS, include_lowest=True)
+    data['DayOfWeek'] = data['Date'].dt.day_name()
+    return data
+
+def run_yield_benchmark(years=3, properties=1, runs=3, engines=None):
+    """Time apply_yield_matrix per engine on the same generated input and check the outputs match"""
+    from .yielder import apply_yield_matrix
+
+    data = make_yield_frame(years, properties)
+    print(f"Generated {len(data)} rows ({years} years x {properties} properties)")
+    results, outputs = [], {}
+    for engine in engines or ['rowwise', 'vectorized']:
+        for run in range(1, runs + 1):
+            start = time.perf_counter()
+            outputs[engine] = apply_yield_matrix(data.copy(), engine=engine)
+            elapsed = time.perf_counter() - start
+            results.append({'engine': engine, 'run': run, 'rows': len(data), 'wall_seconds': round(elapsed, 4)})
+            print(f"{engine} run {run}: {elapsed:.4f}s")
+    frames = list(outputs.values())
+    identical = all(frame.equals(frames[0]) for frame in frames[1:])
+    print(f"Outputs identical: {identical}")
+    return results
+
+def run_yield_update_benchmark(years=3, changed=5, runs=3):
+    """
+    Time update_allocation on a scratch warehouse after changing a few
+    combined dates, incrementally and as a full recompute, and check both
+    leave the same allocation
+    """
+    import pandas as pd
+    from . import warehouse
+    from .inventory_store import upsert_by_date
+    from .yielder import update_allocation
+
+    data = make_yield_frame(years)
+    combined = pd.DataFrame({
+        'Date': data['Date'].dt.strftime('%Y-%m-%d'),
+        'Deluxe Room': data['Deluxe Room'],
+        'Premiere Room': data['Premiere Room'],
+        'Occupancy': data['Occupancy'].round(2)
+    })
+    print(f"Generated {len(combined)} combined dates, changing {changed} per run")
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, warehouse.WAREHOUSE_DB)
+        with warehouse.connection(db_path) as conn:
+            upsert_by_date(conn, 'combined_inventory', combined, {'Date': 'DATE', 'Occupancy': 'REAL'})
+        update_allocation(db_path=db_path)
+
+        for run in range(1, runs + 1):
+            rows = random.Random(run).sample(range(len(combined)), changed)
+            combined.loc[rows, 'Deluxe Room'] = (combined.loc[rows, 'Deluxe Room'] + 1) % 170
+            with warehouse.connection(db_path) as conn:
+                upsert_by_date(conn, 'combined_inventory', combined, {'Date': 'DATE', 'Occupancy': 'REAL'})
+            allocations = {}
+            # The full recompute runs second on the same inputs and must agree with the incremental one
+            for mode in ('incremental', 'full'):
+                start = time.perf_counter()
+                allocations[mode], report = update_allocation(full_rebuild=(mode == 'full'), db_path=db_path)
+                elapsed = time.perf_counter() - start
+                results.append(dict(report, run=run, wall_seconds=round(elapsed, 4)))
+                print(f"{mode} run {run}: {elapsed:.4f}s "
+                      f"({report['recomputed']} recomputed, {report['reused']} reused)")
+            print(f"Allocations identical: {allocations['incremental'].equals(allocations['full'])}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Record PMS fixtures or benchmark the scrapers against them")
+    parser.add_argument('mode', choices=['record', 'run', 'cm-ingest', 'yield', 'yield-update'])
+    parser.add_argument('fixture_dir', nargs='?')
+    parser.add_argument('--target', choices=TARGETS, default='scrape')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--start-date')
+    parser.add_argument('--engine', choices=['selenium', 'http'], default='selenium')
+    parser.add_argument('--upstream', help="PMS to record from (defaults to PMS_BASE_URL)")
+    parser.add_argument('--allow-live-writes', action='store_true',
+                        help="Let record run an allotment target, which saves to the live PMS")
+    parser.add_argument('--years', type=int, default=3, help="Years of generated dates (cm-ingest, yield)")
+    parser.add_argument('--properties', type=int, default=1, help="Generated properties (yield)")
+    parser.add_argument('--changed', type=int, default=5, help="Dates changed per run (yield-update)")
+    args = parser.parse_args()
+
+    if args.mode == 'cm-ingest':
+        run_cm_benchmark(args.years, args.runs)
+        return
+    if args.mode == 'yield':
+        run_yield_benchmark(args.years, args.properties, args.runs)
+        return
+    if args.mode == 'yield-update':
+        run_yield_update_benchmark(args.years, args.changed, args.runs)
+        return
+    if not args.fixture_dir:
+        parser.error(f"{args.mode} needs a fixture_dir")
+    if args.mode == 'record':
+        if args.target in WRITE_TARGETS and not args.allow_live_writes:
+            parser.error(f"recording {args.target} saves allotment on the live PMS; add --allow-live-writes")
+        record_fixtures(args.fixture_dir, args.target, args.upstream, args.start_date, args.engine,
+                        args.allow_live_writes)
+    else:
+        run_benchmark(args.fixture_dir, args.target, args.runs, args.start_date, args.engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Content-addressed cache of CM Excel uploads and their parsed records.
+
+Every upload is stored once under data/cm_uploads/<sha256>.xlsx and indexed
+in the warehouse. The active upload is copied to data/cm_upload.xlsx, which
+is what process_cm_inventory reads. Parsed (date, room_type, count) records
+are kept per hash, so re-activating an older upload, or processing an
+unchanged one, needs no Excel parsing. Uploads are evicted least recently used
+first once the cache is over MAX_CACHED_UPLOADS files or MAX_CACHE_BYTES;
+the active upload is never evicted.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from . import warehouse
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.path.join(warehouse.DATA_DIR, 'cm_uploads')
+ACTIVE_UPLOAD = os.path.join(warehouse.DATA_DIR, 'cm_upload.xlsx')
+UPLOADS_TABLE = 'cm_uploads'
+RECORDS_TABLE = 'cm_upload_records'
+STATE_TABLE = 'cm_upload_state'
+
+MAX_CACHED_UPLOADS = 20
+MAX_CACHE_BYTES = 100 * 1024 * 1024
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def ensure_cache_tables(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {UPLOADS_TABLE} (
+            content_hash TEXT PRIMARY KEY,
+            filename TEXT,
+            size_bytes INTEGER NOT NULL,
+            uploaded_at TEXT NOT NULL,
+            last_used_at TEXT NOT NULL,
+            parsed_at TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RECORDS_TABLE} (
+            content_hash TEXT NOT NULL REFERENCES {UPLOADS_TABLE}(content_hash) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            Date TEXT NOT NULL,
+            room_type TEXT NOT NULL,
+            count NUMERIC,
+            PRIMARY KEY (content_hash, position)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cached_upload_path(content_hash):
+    return os.path.join(UPLOAD_DIR, f'{content_hash}.xlsx')
+
+def _get_state(conn, key):
+    row = conn.execute(f"SELECT value FROM {STATE_TABLE} WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_state(conn, key, value):
+    conn.execute(f"INSERT OR REPLACE INTO {STATE_TABLE} (key, value) VALUES (?, ?)", (key, value))
+
+def active_hash(conn):
+    ensure_cache_tables(conn)
+    return _get_state(conn, 'active')
+
+def processed_hash(conn):
+    """Hash of the upload cm_inventory_processed currently reflects"""
+    ensure_cache_tables(conn)
+    return _get_state(conn, 'processed')
+
+def mark_processed(conn, content_hash):
+    """Record content_hash as processed; it is also the active upload, since that is the file processing read"""
+    ensure_cache_tables(conn)
+    _set_state(conn, 'active', content_hash)
+    _set_state(conn, 'processed', content_hash)
+    conn.commit()
+
+def register_file(conn, path, content_hash=None, filename=None):
+    """
+    Copy the file at path into the cache and return its hash. Files already
+    cached just have their use time bumped.
+    """
+    ensure_cache_tables(conn)
+    content_hash = content_hash or hash_file(path)
+    cached = conn.execute(f"SELECT 1 FROM {UPLOADS_TABLE} WHERE content_hash = ?", (content_hash,)).fetchone()
+    cache_path = cached_upload_path(content_hash)
+    if not os.path.exists(cache_path):
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        shutil.copyfile(path, cache_path)
+    now = _now()
+    if cached:
+        conn.execute(f"UPDATE {UPLOADS_TABLE} SET last_used_at = ? WHERE content_hash = ?", (now, content_hash))
+    else:
+        conn.execute(
+            f"INSERT INTO {UPLOADS_TABLE} (content_hash, filename, size_bytes, uploaded_at, last_used_at) "
+            f"VALUES (?, ?, ?, ?, ?)",
+            (content_hash, filename, os.path.getsize(cache_path), now, now)
+        )
+    conn.commit()
+    return content_hash
+
+def activate_upload(conn, content_hash):
+    """Make a cached upload the one process_cm_inventory reads"""
+    ensure_cache_tables(conn)
+    cache_path = cached_upload_path(content_hash)
+    known = conn.execute(f"SELECT 1 FROM {UPLOADS_TABLE} WHERE content_hash = ?", (content_hash,)).fetchone()
+    if not known or not os.path.exists(cache_path):
+        raise FileNotFoundError(f"No cached CM upload with hash {content_hash}")
+    shutil.copyfile(cache_path, ACTIVE_UPLOAD)
+    _set_state(conn, 'active', content_hash)
+    conn.execute(f"UPDATE {UPLOADS_TABLE} SET last_used_at = ? WHERE content_hash = ?", (_now(), content_hash))
+    conn.commit()
+
+def store_upload(file_storage, filename=None):
+    """
+    Save an uploaded file into the cache and activate it. Returns
+    {'hash', 'status', 'evicted'}, where status is 'duplicate' when the
+    upload matches the active file (nothing is touched), 'reactivated' when
+    it matches an older cached upload, and 'stored' for new content.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix='.part')
+    os.close(fd)
+    try:
+        file_storage.save(temp_path)
+        content_hash = hash_file(temp_path)
+        conn = warehouse.connect()
+        try:
+            ensure_cache_tables(conn)
+            if content_hash == _get_state(conn, 'active') and os.path.exists(ACTIVE_UPLOAD):
+                return {'hash': content_hash, 'status': 'duplicate', 'evicted': []}
+            known = conn.execute(
+                f"SELECT 1 FROM {UPLOADS_TABLE} WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if not os.path.exists(cached_upload_path(content_hash)):
+                os.replace(temp_path, cached_upload_path(content_hash))
+            register_file(conn, cached_upload_path(content_hash), content_hash, filename)
+            activate_upload(conn, content_hash)
+            evicted = evict_uploads(conn)
+        finally:
+            conn.close()
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    status = 'reactivated' if known else 'stored'
+    logger.info("CM upload %s %s", content_hash[:12], status)
+    return {'hash': content_hash, 'status': status, 'evicted': evicted}
+
+def has_records(conn, content_hash):
+    ensure_cache_tables(conn)
+    row = conn.execute(
+        f"SELECT parsed_at FROM {UPLOADS_TABLE} WHERE content_hash = ?", (content_hash,)
+    ).fetchone()
+    return bool(row and row[0])
+
+def store_records(conn, content_hash, records):
+    """Cache the parsed records of an upload, keeping their order"""
+    ensure_cache_tables(conn)
+    conn.execute(f"DELETE FROM {RECORDS_TABLE} WHERE content_hash = ?", (content_hash,))
+    conn.executemany(
+        f"INSERT INTO {RECORDS_TABLE} (content_hash, position, Date, room_type, count) VALUES (?, ?, ?, ?, ?)",
+        ((content_hash, position, date, room_type, count)
+         for position, (date, room_type, count) in enumerate(records))
+    )
+    conn.execute(f"UPDATE {UPLOADS_TABLE} SET parsed_at = ? WHERE content_hash = ?", (_now(), content_hash))
+    conn.commit()
+
+def evict_uploads(conn, max_uploads=None, max_bytes=None):
+    """Drop least recently used uploads until the cache fits; returns the evicted hashes"""
+    max_uploads = MAX_CACHED_UPLOADS if max_uploads is None else max_uploads
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    ensure_cache_tables(conn)
+    active = _get_state(conn, 'active')
+    uploads = conn.execute(
+        f"SELECT content_hash, size_bytes FROM {UPLOADS_TABLE} ORDER BY last_used_at DESC, uploaded_at DESC"
+    ).fetchall()
+    count = len(uploads)
+    total = sum(size for _, size in uploads)
+    evicted = []
+    for content_hash, size in reversed(uploads):
+        if count <= max_uploads and total <= max_bytes:
+            break
+        if content_hash == active:
+            continue
+        # Cached records go with it (ON DELETE CASCADE)
+        conn.execute(f"DELETE FROM {UPLOADS_TABLE} WHERE content_hash = ?", (content_hash,))
+        cache_path = cached_upload_path(content_hash)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        evicted.append(content_hash)
+        count -= 1
+        total -= size
+    conn.commit()
+    if evicted:
+        logger.info("Evicted %s cached CM uploads", len(evicted))
+    return evicted
+
+def list_uploads(conn):
+    """Cached uploads, most recently used first, flagged active/processed"""
+    ensure_cache_tables(conn)
+    active, processed = _get_state(conn, 'active'), _get_state(conn, 'processed')
+    uploads = []
+    for row in conn.execute(
+        f"SELECT content_hash, filename, size_bytes, uploaded_at, last_used_at, parsed_at "
+        f"FROM {UPLOADS_TABLE} ORDER BY last_used_at DESC, uploaded_at DESC"
+    ):
+        upload = dict(zip(['hash', 'filename', 'size_bytes', 'uploaded_at', 'last_used_at', 'parsed_at'], row))
+        upload['active'] = upload['hash'] == active
+        upload['processed'] = upload['hash'] == processed
+        uploads.append(upload)
+    return uploads
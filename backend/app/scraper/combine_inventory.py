@@ -1,8 +1,186 @@
+import logging
 import pandas as pd
 import os
 import sqlite3
+from .inventory_store import (
+    upsert_by_date, read_table, has_changes, get_pending_changes, clear_pending_changes,
+    delete_dates, upsert_from_stage, register_row_hash_function, HASH_COLUMN
+)
+from . import warehouse
+from . import yield_cache
 
-def combine_inventory_files():
+logger = logging.getLogger(__name__)
+
+PMS_TABLE = 'pms_inventory_processed'
+CM_TABLE = 'cm_inventory_processed'
+COMBINED_TABLE = 'combined_inventory'
+
+# CM room type names that should be summed into a differently named PMS column
+CM_COLUMN_ALIASES = {}
+
+def _combined_table_is_incremental(conn):
+    """True when combined_inventory already exists in the Date-keyed, hashed layout"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(combined_inventory)")]
+    return HASH_COLUMN in columns
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _data_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] not in ('Date', HASH_COLUMN)]
+
+def build_column_mapping(pms_columns, cm_columns, aliases=None):
+    """
+    Map every combined column onto its PMS and/or CM source column, from the
+    two table schemas. Columns present on both sides are summed. Returns
+    [(column, pms_column or None, cm_column or None)] in the order the
+    combined table has always used: PMS-only, CM-only, then summed columns.
+    """
+    aliases = CM_COLUMN_ALIASES if aliases is None else aliases
+    cm_targets = {aliases.get(col, col): col for col in cm_columns}
+    shared = [col for col in pms_columns if col in cm_targets]
+    mapping = [(col, col, None) for col in pms_columns if col not in cm_targets]
+    mapping += [(target, None, col) for target, col in cm_targets.items() if target not in pms_columns]
+    mapping += [(col, col, cm_targets[col]) for col in shared]
+    return mapping
+
+def _column_expression(pms_col, cm_col):
+    if pms_col and cm_col:
+        return f"p.{_quote(pms_col)} + c.{_quote(cm_col)}"
+    if pms_col:
+        return f"p.{_quote(pms_col)}"
+    return f"c.{_quote(cm_col)}"
+
+def _combine_in_sqlite(conn, dates=None):
+    """
+    Build the combined rows with a single INSERT ... SELECT over the full outer
+    join of the PMS and CM tables (the union of their dates left-joined to
+    both), hashing rows in SQL so only changed dates are rewritten. Returns
+    (change_set, stale_dates).
+    """
+    mapping = build_column_mapping(_data_columns(conn, PMS_TABLE), _data_columns(conn, CM_TABLE))
+    columns = ['Date'] + [col for col, _, _ in mapping]
+    dtype_dict = {'Date': 'DATE'}
+    dtype_dict.update({col: 'INTEGER' for col in columns[1:]})
+    register_row_hash_function(conn)
+
+    select_list = ', '.join(['d.Date AS "Date"'] + [
+        f"{_column_expression(pms_col, cm_col)} AS {_quote(col)}" for col, pms_col, cm_col in mapping
+    ])
+    date_filter = ''
+    conn.execute("DROP TABLE IF EXISTS temp.combine_dates")
+    conn.execute("DROP TABLE IF EXISTS temp.combined_stage")
+    if dates is not None:
+        conn.execute("CREATE TEMP TABLE combine_dates (Date TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO temp.combine_dates (Date) VALUES (?)", [(d,) for d in dates])
+        date_filter = "WHERE d.Date IN (SELECT Date FROM temp.combine_dates)"
+
+    column_list = ', '.join(_quote(col) for col in columns)
+    conn.execute(f"""
+        CREATE TEMP TABLE combined_stage AS
+        SELECT {column_list}, {HASH_COLUMN}({column_list}) AS {HASH_COLUMN} FROM (
+            SELECT {select_list}
+            FROM (SELECT Date FROM {PMS_TABLE} UNION SELECT Date FROM {CM_TABLE}) d
+            LEFT JOIN {PMS_TABLE} p ON p.Date = d.Date
+            LEFT JOIN {CM_TABLE} c ON c.Date = d.Date
+            {date_filter}
+        )
+    """)
+
+    change_set = upsert_from_stage(conn, COMBINED_TABLE, 'temp.combined_stage', columns, dtype_dict,
+                                   remove_missing=False)
+
+    # Dates that no longer exist in either source
+    if dates is not None:
+        stale_dates = [row[0] for row in conn.execute(
+            "SELECT Date FROM temp.combine_dates WHERE Date NOT IN (SELECT Date FROM temp.combined_stage)"
+        )]
+    else:
+        stale_dates = [row[0] for row in conn.execute(
+            f"SELECT Date FROM {COMBINED_TABLE} WHERE Date NOT IN (SELECT Date FROM temp.combined_stage)"
+        )]
+    if stale_dates:
+        delete_dates(conn, COMBINED_TABLE, stale_dates)
+
+    conn.execute("DROP TABLE temp.combined_stage")
+    conn.execute("DROP TABLE IF EXISTS temp.combine_dates")
+    conn.commit()
+    return change_set, stale_dates
+
+def _combine_with_pandas(conn, dates=None, incremental=False):
+    """Outer-merge the two tables in pandas and upsert the result. Returns (change_set, stale_dates) or None"""
+    pms_df = read_table(conn, PMS_TABLE, dates)
+    logger.info("Successfully read %s rows from PMS table", len(pms_df))
+    logger.debug("PMS columns: %s", pms_df.columns.tolist())
+    
+    cm_df = read_table(conn, CM_TABLE, dates)
+    logger.info("Successfully read %s rows from CM table", len(cm_df))
+    logger.debug("CM columns: %s", cm_df.columns.tolist())
+
+    # Ensure Date columns are in datetime format
+    try:
+        pms_df['Date'] = pd.to_datetime(pms_df['Date'])
+        cm_df['Date'] = pd.to_datetime(cm_df['Date'])
+    except Exception as e:
+        logger.error("Error converting dates: %s", e)
+        return None
+
+    # Merge the dataframes on Date
+    try:
+        combined_df = pd.merge(pms_df, cm_df, on='Date', how='outer')
+        logger.info("Successfully merged data. Combined dataframe has %s rows", len(combined_df))
+    except Exception as e:
+        logger.error("Error merging dataframes: %s", e)
+        return None
+
+    # Sort by Date
+    combined_df = combined_df.sort_values('Date')
+
+    # Sum the columns both sources have, as mapped from their schemas
+    mapping = build_column_mapping([c for c in pms_df.columns if c != 'Date'],
+                                   [c for c in cm_df.columns if c != 'Date'])
+    combined = {'Date': combined_df['Date'].dt.strftime('%Y-%m-%d')}
+    for col, pms_col, cm_col in mapping:
+        if pms_col and cm_col:
+            combined[col] = combined_df[pms_col + '_x' if pms_col == cm_col else pms_col] + \
+                combined_df[cm_col + '_y' if pms_col == cm_col else cm_col]
+        else:
+            combined[col] = combined_df[pms_col or cm_col]
+    combined_df = pd.DataFrame(combined)
+
+    # Create dtype dictionary for all columns except Date
+    dtype_dict = {'Date': 'DATE'}
+    for col in combined_df.columns:
+        if col != 'Date':
+            dtype_dict[col] = 'INTEGER'
+    
+    # Upsert only the rows whose values changed
+    change_set = upsert_by_date(conn, COMBINED_TABLE, combined_df, dtype_dict, remove_missing=False)
+    
+    # Drop dates that no longer exist in either source
+    written_dates = set(combined_df['Date'])
+    if incremental:
+        stale_dates = [d for d in dates if d not in written_dates]
+    else:
+        stale_dates = [row[0] for row in conn.execute("SELECT Date FROM combined_inventory")
+                       if row[0] not in written_dates]
+    if stale_dates:
+        delete_dates(conn, COMBINED_TABLE, stale_dates)
+        conn.commit()
+    return change_set, stale_dates
+
+def combine_inventory_files(changed_dates=None, full_rebuild=False, engine='sql'):
+    """
+    Combine the processed PMS and CM inventories into combined_inventory.
+
+    Only dates in changed_dates are recomputed; when it is None the dates
+    queued as pending changes by the PMS and CM stages are used. A full
+    rebuild happens when full_rebuild is set or the combined table has not
+    been written in the incremental layout yet. engine='sql' joins inside
+    SQLite; engine='pandas' keeps the DataFrame merge.
+    """
+    if engine not in ('sql', 'pandas'):
+        raise ValueError(f"Unknown combine engine: {engine}")
     try:
         # Get the absolute path to the data directory within the scraper folder
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,129 +188,94 @@ def combine_inventory_files():
         os.makedirs(data_dir, exist_ok=True)
         
         # Print paths for debugging
-        print(f"Current directory: {current_dir}")
-        print(f"Data directory: {data_dir}")
-        
-        # Define database paths
-        pms_db_path = os.path.join(data_dir, 'pms_inventory_processed.db')
-        cm_db_path = os.path.join(data_dir, 'cm_inventory_processed.db')
-        
-        # Check if input databases exist
-        if not os.path.exists(pms_db_path):
-            print(f"Error: PMS database not found at {pms_db_path}")
-            return None
-        if not os.path.exists(cm_db_path):
-            print(f"Error: CM database not found at {cm_db_path}")
-            return None
-            
-        print(f"Reading PMS data from: {pms_db_path}")
-        print(f"Reading CM data from: {cm_db_path}")
+        logger.debug("Current directory: %s", current_dir)
+        logger.debug("Data directory: %s", data_dir)
         
-        # Read the processed files from SQLite databases
-        pms_conn = sqlite3.connect(pms_db_path)
-        cm_conn = sqlite3.connect(cm_db_path)
+        # Both sources and the combined table live in the warehouse
+        conn = warehouse.connect()
         
         try:
-            pms_df = pd.read_sql_query("SELECT * FROM pms_inventory_processed", pms_conn)
-            print(f"Successfully read {len(pms_df)} rows from PMS database")
-            print("PMS columns:", pms_df.columns.tolist())
+            # Check if input tables exist
+            if not warehouse.table_exists(conn, PMS_TABLE):
+                logger.error("Error: PMS table pms_inventory_processed not found in the warehouse")
+                return None
+            if not warehouse.table_exists(conn, CM_TABLE):
+                logger.error("Error: CM table cm_inventory_processed not found in the warehouse")
+                return None
             
-            cm_df = pd.read_sql_query("SELECT * FROM cm_inventory_processed", cm_conn)
-            print(f"Successfully read {len(cm_df)} rows from CM database")
-            print("CM columns:", cm_df.columns.tolist())
-        except sqlite3.OperationalError as e:
-            print(f"Database error: {e}")
-            if "no such table" in str(e):
-                print("Error: Required table not found in database")
-            return None
-        finally:
-            # Close the connections
-            pms_conn.close()
-            cm_conn.close()
-        
-        # Check if dataframes are empty
-        if pms_df.empty:
-            print("Error: No data found in PMS database")
-            return None
-        if cm_df.empty:
-            print("Error: No data found in CM database")
-            return None
-
-        # Ensure Date columns are in datetime format
-        try:
-            pms_df['Date'] = pd.to_datetime(pms_df['Date'])
-            cm_df['Date'] = pd.to_datetime(cm_df['Date'])
-        except Exception as e:
-            print(f"Error converting dates: {e}")
-            return None
-
-        # Merge the dataframes on Date
-        try:
-            combined_df = pd.merge(pms_df, cm_df, on='Date', how='outer')
-            print(f"Successfully merged data. Combined dataframe has {len(combined_df)} rows")
-        except Exception as e:
-            print(f"Error merging dataframes: {e}")
-            return None
-
-        # Sort by Date
-        combined_df = combined_df.sort_values('Date')
-
-        # sum two values in the same column
-        for col in combined_df.columns:
-            if col.endswith('_x'):
-                base_col = col[:-2]
-                y_col = base_col + '_y'
-                if y_col in combined_df.columns:
-                    combined_df[base_col] = combined_df[col] + combined_df[y_col]
-                    combined_df = combined_df.drop([col, y_col], axis=1)
-
-        # Convert date back to string format for consistency
-        combined_df['Date'] = combined_df['Date'].dt.strftime('%Y-%m-%d')
-
-        # Save the combined data to CSV in data directory
-        csv_path = os.path.join(data_dir, 'combined_inventory.csv')
-        combined_df.to_csv(csv_path, index=False)
-        print(f'Combined inventory saved to CSV: {csv_path}')
-
-        # Save to SQLite database
-        db_path = os.path.join(data_dir, 'combined_inventory.db')
-        
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
-        
-        try:
-            # Create dtype dictionary for all columns except Date
-            dtype_dict = {'Date': 'DATE'}
-            for col in combined_df.columns:
-                if col != 'Date':
-                    dtype_dict[col] = 'INTEGER'
+            incremental = not full_rebuild and _combined_table_is_incremental(conn)
             
-            # Save DataFrame to SQLite with explicit data types
-            combined_df.to_sql('combined_inventory', conn, if_exists='replace', index=False, dtype=dtype_dict)
+            dates = None
+            if incremental:
+                if changed_dates is None:
+                    changed_dates = set(get_pending_changes(conn, PMS_TABLE))
+                    changed_dates |= set(get_pending_changes(conn, CM_TABLE))
+                dates = sorted(changed_dates)
+                logger.info("Incremental combine of %s changed dates", len(dates))
+                if not dates:
+                    logger.info("No changed dates, combined inventory is up to date")
+                    return read_table(conn, COMBINED_TABLE)
+            else:
+                # Check if tables are empty (a subset of dates may legitimately be missing on one side)
+                if not warehouse.count_rows(conn, PMS_TABLE):
+                    logger.error("Error: No data found in PMS table")
+                    return None
+                if not warehouse.count_rows(conn, CM_TABLE):
+                    logger.error("Error: No data found in CM table")
+                    return None
+            
+            if engine == 'sql':
+                change_set, stale_dates = _combine_in_sqlite(conn, dates)
+            else:
+                result = _combine_with_pandas(conn, dates, incremental)
+                if result is None:
+                    return None
+                change_set, stale_dates = result
+            if stale_dates:
+                logger.info("Removed %s dates no longer present in PMS or CM data", len(stale_dates))
             
             # Verify the data was written
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM combined_inventory")
-            count = cursor.fetchone()[0]
-            print(f"Verified {count} rows written to combined_inventory table")
+            count = warehouse.count_rows(conn, COMBINED_TABLE)
+            logger.info("Verified %s rows in combined_inventory table", count)
             
             if count == 0:
-                print("Error: No data was written to the database")
+                logger.error("Error: No data was written to the database")
                 return None
-                
-        except Exception as e:
-            print(f"Error writing to database: {e}")
+            
+            full_df = read_table(conn, COMBINED_TABLE)
+            full_df = full_df.sort_values('Date').reset_index(drop=True)
+            
+            # Save the combined data to CSV in data directory
+            csv_path = os.path.join(data_dir, 'combined_inventory.csv')
+            if has_changes(change_set) or stale_dates or not os.path.exists(csv_path):
+                full_df.to_csv(csv_path, index=False)
+                logger.info("Combined inventory saved to CSV: %s", csv_path)
+
+            # Yield results computed from the old rows can't be reused
+            if has_changes(change_set) or stale_dates:
+                yield_cache.invalidate()
+            
+            # The source changes are now reflected in the combined table
+            for table in (PMS_TABLE, CM_TABLE):
+                clear_pending_changes(conn, table, dates)
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            logger.error("Database error: %s", e)
+            if "no such table" in str(e):
+                logger.error("Error: Required table not found in database")
             return None
         finally:
             # Close the connection
             conn.close()
             
-        print(f'Combined inventory saved to database: {db_path}')
-        return combined_df
+        logger.info("Combined inventory saved to database: %s", warehouse.WAREHOUSE_DB)
+        return full_df
         
     except Exception as e:
-        print(f"Error during inventory combination: {e}")
+        logger.error("Error during inventory combination: %s", e)
         return None
 
 if __name__ == "__main__":
-    combine_inventory_files()
\ No newline at end of file
+    from .log_config import configure_logging
+    configure_logging()
+    combine_inventory_files()
@@ -0,0 +1,197 @@
+"""
+Shared Chrome driver factory for every Selenium entry point.
+
+Drivers start with a lean profile (no extensions, background networking or
+images), the eager page-load strategy, and CDP Network.setBlockedURLs
+dropping fonts, images and analytics the PMS pages pull in but the scrapers
+never read. A measurement mode records bytes transferred and load time for
+each navigation so profiles can be compared.
+"""
+
+import json
+import logging
+import os
+import platform
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+logger = logging.getLogger(__name__)
+
+# Resources the scrapers never need; stylesheets are optional because the
+# allotment modal relies on CSS visibility
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*'
+]
+STYLESHEET_PATTERNS = ['*.css']
+
+LEAN_ARGUMENTS = [
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--no-first-run',
+    '--metrics-recording-only',
+    '--blink-settings=imagesEnabled=false'
+]
+
+# Set PMS_MEASURE_NAVIGATION=1 to record bytes and load time per navigation
+MEASURE_NAVIGATION = os.environ.get('PMS_MEASURE_NAVIGATION') == '1'
+
+def build_chrome_options(headless=True, lean=True, measure=False):
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--start-maximized')
+    chrome_options.add_argument('--disable-gpu')  # Required for headless on some systems
+    chrome_options.add_argument('--disable-software-rasterizer')  # Better performance in headless
+
+    if lean:
+        for argument in LEAN_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2
+        })
+        # Return from driver.get once the DOM is ready instead of after every subresource
+        chrome_options.page_load_strategy = 'eager'
+
+    if measure:
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    # Add specific options for Mac ARM64
+    if platform.system() == 'Darwin' and platform.machine() == 'arm64':
+        chrome_options.binary_location = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
+    return chrome_options
+
+def block_resources(driver, block_stylesheets=False):
+    """Drop non-essential requests at the network layer through CDP"""
+    patterns = list(BLOCKED_URL_PATTERNS)
+    if block_stylesheets:
+        patterns += STYLESHEET_PATTERNS
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+# A measured navigation ends once the document is complete and no request
+# has been in flight for NETWORK_IDLE_SECONDS, whatever the page-load strategy
+NETWORK_IDLE_SECONDS = 0.5
+MEASURE_TIMEOUT = 30
+
+def _transferred_bytes(driver):
+    """Sum the encoded bytes of every request finished since the log was last read"""
+    total = 0
+    requests = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message.get('method') == 'Network.loadingFinished':
+            total += message['params'].get('encodedDataLength', 0)
+            requests += 1
+    return total, requests
+
+def _wait_for_network_idle(driver, timeout=MEASURE_TIMEOUT, idle_seconds=NETWORK_IDLE_SECONDS):
+    """
+    Read the performance log until the document is complete and the network
+    has been idle for idle_seconds. Returns (bytes, requests, idle_at) where
+    idle_at is the perf_counter time the last request finished.
+    """
+    pending = set()
+    total = 0
+    requests = 0
+    idle_at = time.perf_counter()
+    deadline = idle_at + timeout
+    while True:
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            request_id = message.get('params', {}).get('requestId')
+            if method == 'Network.requestWillBeSent':
+                pending.add(request_id)
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                pending.discard(request_id)
+                idle_at = time.perf_counter()
+                if method == 'Network.loadingFinished':
+                    total += message['params'].get('encodedDataLength', 0)
+                    requests += 1
+        now = time.perf_counter()
+        complete = driver.execute_script("return document.readyState") == 'complete'
+        if complete and not pending and now - idle_at >= idle_seconds:
+            return total, requests, idle_at
+        if now > deadline:
+            logger.warning("Network not idle after %ss, %s requests still pending", timeout, len(pending))
+            return total, requests, now
+        time.sleep(0.1)
+
+def enable_navigation_metering(driver):
+    """
+    Wrap driver.get so every navigation records bytes transferred and load
+    time up to network idle, so eager and normal page loads count the same
+    subresources
+    """
+    original_get = driver.get
+    driver.navigation_metrics = []
+
+    def measured_get(url):
+        _transferred_bytes(driver)  # Discard entries from earlier activity
+        start = time.perf_counter()
+        original_get(url)
+        transferred, requests, finished_at = _wait_for_network_idle(driver)
+        elapsed = finished_at - start
+        metric = {
+            'url': url,
+            'bytes': transferred,
+            'requests': requests,
+            'load_seconds': round(elapsed, 3)
+        }
+        driver.navigation_metrics.append(metric)
+        logger.debug("Navigation %s: %.1f KB in %s requests, %.2fs", url, transferred / 1024, requests, elapsed)
+
+    driver.get = measured_get
+    return driver
+
+def create_driver(headless=True, lean=True, block_stylesheets=False, measure=None):
+    """
+    Start Chrome for the PMS scrapers. lean=False reproduces the original
+    full-profile setup, which is what the measurement comparison runs against.
+    """
+    measure = MEASURE_NAVIGATION if measure is None else measure
+    driver = webdriver.Chrome(options=build_chrome_options(headless, lean, measure))
+    if lean:
+        block_resources(driver, block_stylesheets)
+    if measure:
+        enable_navigation_metering(driver)
+    return driver
+
+def compare_profiles(urls, headless=True):
+    """
+    Load urls with the original profile and with the lean profile and report
+    bytes transferred and load time of each navigation.
+    """
+    results = {}
+    for label, lean in (('before', False), ('after', True)):
+        driver = create_driver(headless=headless, lean=lean, measure=True)
+        try:
+            for url in urls:
+                driver.get(url)
+            results[label] = driver.navigation_metrics
+        finally:
+            driver.quit()
+
+    for before, after in zip(results['before'], results['after']):
+        logger.info(
+            "%s: %.1f KB / %.2fs -> %.1f KB / %.2fs",
+            before['url'], before['bytes'] / 1024, before['load_seconds'], after['bytes'] / 1024, after['load_seconds']
+        )
+    return results
+
+if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
+    from .pms_config import pms_url
+    compare_profiles([pms_url()])
@@ -0,0 +1,232 @@
+"""
+Process-wide pool of warm Chrome drivers shared by the scrape and allotment jobs.
+
+Drivers are checked out and returned instead of being started and quit for
+every job. Authenticated cookies are kept per user so a driver started
+within the session TTL can skip the login page.
+"""
+
+import atexit
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+from .pms_config import credential_hash
+
+DEFAULT_MAX_SIZE = 2
+MAX_POOL_SIZE = 4                 # ensure_capacity never grows a pool beyond this
+DEFAULT_IDLE_TIMEOUT = 5 * 60     # Quit drivers idle for more than 5 minutes
+DEFAULT_SESSION_TTL = 20 * 60     # Reuse login cookies for 20 minutes
+
+class DriverPool:
+    """Bounded pool of WebDriver instances created by a factory callable"""
+    def __init__(self, factory, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (driver, released_at)
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'cold_starts': 0,
+            'evictions': 0,
+            'health_failures': 0,
+            'total_checkout_seconds': 0.0
+        }
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self):
+        """Quit drivers that have been idle longer than idle_timeout (lock held)"""
+        now = time.time()
+        keep = []
+        for driver, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._stats['evictions'] += 1
+                self._quit(driver)
+            else:
+                keep.append((driver, released_at))
+        self._idle = keep
+
+    def checkout(self, timeout=None):
+        """Return a healthy driver, reusing an idle one when possible"""
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                self._evict_idle()
+                while self._idle:
+                    driver, _ = self._idle.pop()
+                    if self._is_healthy(driver):
+                        self._in_use += 1
+                        self._stats['hits'] += 1
+                        self._record_checkout(start)
+                        return driver
+                    self._stats['health_failures'] += 1
+                    self._quit(driver)
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free WebDriver")
+                self._condition.wait(remaining)
+
+        # Cold start outside the lock so other checkouts are not blocked
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['cold_starts'] += 1
+            self._record_checkout(start)
+        return driver
+
+    def _record_checkout(self, start):
+        self._stats['checkouts'] += 1
+        self._stats['total_checkout_seconds'] += time.perf_counter() - start
+
+    def ensure_capacity(self, size):
+        """Grow max_size so at least size drivers (up to MAX_POOL_SIZE) can be checked out at once"""
+        size = min(size, MAX_POOL_SIZE)
+        with self._condition:
+            if size > self.max_size:
+                self.max_size = size
+                self._condition.notify_all()
+
+    def release(self, driver, discard=False):
+        """Return a driver to the pool, or quit it when discard=True"""
+        with self._condition:
+            self._in_use -= 1
+            if discard or not self._is_healthy(driver):
+                self._quit(driver)
+            else:
+                self._idle.append((driver, time.time()))
+            self._evict_idle()
+            self._condition.notify()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Check out a driver for the duration of a with-block"""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close_all(self):
+        with self._condition:
+            for driver, _ in self._idle:
+                self._quit(driver)
+            self._idle = []
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+            stats['max_size'] = self.max_size
+        checkouts = stats.pop('checkouts')
+        total = stats.pop('total_checkout_seconds')
+        stats['checkouts'] = checkouts
+        stats['avg_checkout_seconds'] = round(total / checkouts, 3) if checkouts else 0.0
+        return stats
+
+class LoginSessionStore:
+    """
+    Authenticated cookies per user, shared by every pool in the process.
+    Cookies are only handed back for the password they were saved with.
+    """
+    def __init__(self, ttl=DEFAULT_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def save(self, username, password, driver):
+        cookies = driver.get_cookies()
+        with self._lock:
+            self._sessions[username] = {
+                'cookies': cookies,
+                'password_hash': credential_hash(password),
+                'saved_at': time.time()
+            }
+
+    def get(self, username, password):
+        with self._lock:
+            entry = self._sessions.get(username)
+            if entry and time.time() - entry['saved_at'] < self.ttl:
+                if hmac.compare_digest(entry['password_hash'], credential_hash(password)):
+                    return entry['cookies']
+                # A different password must go through the login form
+                return None
+            self._sessions.pop(username, None)
+            return None
+
+    def invalidate(self, username):
+        with self._lock:
+            self._sessions.pop(username, None)
+
+    def restore(self, username, password, driver, base_url):
+        """
+        Load the saved cookies for username into driver if password matches
+        the one they were saved with. Returns False when there is nothing
+        fresh to restore. The caller still has to verify that the next page
+        is not the login form.
+        """
+        cookies = self.get(username, password)
+        if not cookies:
+            return False
+        # Cookies can only be set for the domain currently loaded
+        driver.get(base_url)
+        driver.delete_all_cookies()
+        for cookie in cookies:
+            cookie = {k: v for k, v in cookie.items() if k != 'sameSite'}
+            try:
+                driver.add_cookie(cookie)
+            except Exception:
+                continue
+        return True
+
+login_sessions = LoginSessionStore()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name, factory, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Return the process-wide pool registered under name, creating it on first use"""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = DriverPool(factory, max_size=max_size, idle_timeout=idle_timeout)
+            _pools[name] = pool
+        return pool
+
+def pool_stats():
+    """Stats of every registered pool, keyed by pool name"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in pools.items()}
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
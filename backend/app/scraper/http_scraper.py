@@ -0,0 +1,184 @@
+"""
+Browserless scrape engine for the Room Availability page.
+
+Logs in with a pooled requests.Session and calls the Room Availability
+data endpoint directly, so no Chrome instance is needed.
+
+Experimental: LOGIN_PATH, ROOM_AVAILABILITY_DATA_PATH, the request
+parameters and the payload shapes parse_room_availability accepts are
+inferred from the page, not taken from a recorded response. Record the
+page's real requests with the stub server's record mode and check them
+before relying on this engine; scrape_pms_inventory falls back to
+Selenium whenever it fails.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .pms_config import PMS_USERNAME, PMS_PASSWORD, pms_url, require_credentials, credential_hash
+from .scraper import build_inventory_dataframe
+from .scrape_metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Paths used by the login form and the Room Availability data call (unverified, see above)
+LOGIN_PAGE_PATH = ''
+LOGIN_PATH = 'Login/DoLogin'
+ROOM_AVAILABILITY_DATA_PATH = 'RoomAvailable/GetRoomAvailability'
+
+DEFAULT_DAYS = 100
+REQUEST_TIMEOUT = 30
+SESSION_TTL = 20 * 60  # Re-login after 20 minutes
+
+# Logged-in sessions keyed by (base_url, username, credential_hash(password))
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class SessionExpired(Exception):
+    """Raised when the PMS answers with the login page instead of data"""
+    pass
+
+def create_session(pool_size=4):
+    """Create a requests session with a connection pool and retry policy"""
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=['GET', 'POST']
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'User-Agent': 'Mozilla/5.0 (inventory-scraper)'})
+    return session
+
+def _find_verification_token(html):
+    """Return the anti-forgery token of the login form, if the page has one"""
+    soup = BeautifulSoup(html, 'html.parser')
+    token_input = soup.find('input', {'name': '__RequestVerificationToken'})
+    return token_input.get('value') if token_input else None
+
+def _is_login_page(response):
+    content_type = response.headers.get('Content-Type', '')
+    return 'html' in content_type and 'txtUsername' in response.text
+
+def login(session, username=PMS_USERNAME, password=PMS_PASSWORD, base_url=None):
+    """Log the session in through the same form fields the login page posts"""
+    page = session.get(pms_url(LOGIN_PAGE_PATH, base_url), timeout=REQUEST_TIMEOUT)
+    page.raise_for_status()
+
+    payload = {'txtUsername': username, 'txtPassword': password}
+    token = _find_verification_token(page.text)
+    if token:
+        payload['__RequestVerificationToken'] = token
+
+    response = session.post(
+        pms_url(LOGIN_PATH, base_url),
+        data=payload,
+        headers={'X-Requested-With': 'XMLHttpRequest'},
+        timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+
+    if 'json' in response.headers.get('Content-Type', ''):
+        result = response.json()
+        if isinstance(result, dict) and result.get('success') is False:
+            raise Exception(f"Login rejected: {result.get('message', 'unknown reason')}")
+    elif _is_login_page(response):
+        raise Exception("Login rejected: login page returned again")
+
+    logger.info("HTTP engine logged in")
+    return session
+
+def get_session(username=PMS_USERNAME, password=PMS_PASSWORD, base_url=None, force_login=False):
+    """Return a pooled, logged-in session, logging in again once the TTL has passed"""
+    require_credentials(username, password)
+    # A session is only reused for the password it was logged in with
+    key = (pms_url('', base_url), username, credential_hash(password))
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry and not force_login and time.time() - entry['logged_in_at'] < SESSION_TTL:
+            return entry['session']
+
+        session = entry['session'] if entry else create_session()
+        session.cookies.clear()
+        login(session, username, password, base_url)
+        _sessions[key] = {'session': session, 'logged_in_at': time.time()}
+        return session
+
+def parse_room_availability(payload):
+    """
+    Convert the Room Availability response into (headers, rows).
+
+    Accepts either {'headers': [...], 'rows': [[...]]}, a list of records
+    keyed by column name, or one of those wrapped in a 'data' key.
+    """
+    if isinstance(payload, dict) and 'data' in payload and 'headers' not in payload:
+        payload = payload['data']
+
+    if isinstance(payload, dict) and 'headers' in payload:
+        headers = list(payload['headers'])
+        rows = [list(row) for row in payload.get('rows', []) if row]
+    elif isinstance(payload, list):
+        if not payload:
+            return [], []
+        headers = list(payload[0].keys())
+        rows = [[record.get(col) for col in headers] for record in payload]
+    else:
+        raise ValueError(f"Unexpected Room Availability payload: {type(payload).__name__}")
+    return headers, rows
+
+def fetch_room_availability(session, start_date, days=DEFAULT_DAYS, base_url=None):
+    """Call the Room Availability XHR endpoint and return (headers, rows)"""
+    response = session.get(
+        pms_url(ROOM_AVAILABILITY_DATA_PATH, base_url),
+        params={'startDate': start_date.strftime('%d-%b-%Y'), 'days': days},
+        headers={'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'},
+        timeout=REQUEST_TIMEOUT
+    )
+    if response.status_code in (401, 403) or _is_login_page(response):
+        raise SessionExpired("PMS session expired")
+    response.raise_for_status()
+    return parse_room_availability(response.json())
+
+def scrape_pms_inventory_http(start_date=None, days=DEFAULT_DAYS, username=PMS_USERNAME,
+                              password=PMS_PASSWORD, base_url=None):
+    """
+    Fetch the Room Availability table over HTTP and return the same raw
+    DataFrame the Selenium engine produces.
+    """
+    if start_date:
+        target_date = datetime.strptime(start_date, '%Y-%m-%d')
+    else:
+        target_date = datetime.now()
+
+    logger.warning("HTTP engine is experimental: its endpoint and payload format are unverified")
+    logger.info("HTTP engine: requesting %s days from %s", days, target_date.strftime('%d-%b-%Y'))
+    with span('login'):
+        session = get_session(username, password, base_url)
+    try:
+        with span('search'):
+            headers, rows = fetch_room_availability(session, target_date, days, base_url)
+    except SessionExpired:
+        logger.warning("HTTP engine: session expired, logging in again")
+        with span('login'):
+            session = get_session(username, password, base_url, force_login=True)
+        with span('search'):
+            headers, rows = fetch_room_availability(session, target_date, days, base_url)
+
+    if not headers:
+        raise Exception("No headers found in Room Availability response")
+    if not rows:
+        raise Exception("No data rows found in Room Availability response")
+
+    logger.info("HTTP engine: received %s rows", len(rows))
+    with span('extraction'):
+        return build_inventory_dataframe(headers, rows)
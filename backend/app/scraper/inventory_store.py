@@ -0,0 +1,289 @@
+"""
+Incremental, Date-keyed persistence for the inventory tables.
+
+Rows are hashed on write so a scrape only touches the dates whose values
+actually changed. Every write returns a change set and queues the affected
+dates as pending changes for the next pipeline stage to pick up.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+HASH_COLUMN = 'row_hash'
+PENDING_TABLE = 'pending_changes'
+
+# Date formats found in the Date columns, tried in order
+DATE_FORMATS = ['%Y-%m-%d', '%A, %d-%b-%Y', '%A, %d-%B-%Y']
+
+def _normalize(value):
+    """Convert pandas/numpy scalars to plain Python values with a stable repr"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+def _row_hash(values):
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def register_row_hash_function(conn):
+    """
+    Expose the row hash to SQL as row_hash(col1, col2, ...) so rows built with
+    INSERT ... SELECT hash exactly like rows written by upsert_by_date.
+    """
+    conn.create_function(
+        HASH_COLUMN, -1, lambda *values: _row_hash([_normalize(v) for v in values]), deterministic=True
+    )
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return pd.to_datetime(value, format=date_format)
+        except (ValueError, TypeError):
+            continue
+    return pd.to_datetime(value, errors='coerce')
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+def _has_date_primary_key(conn, table, key):
+    return any(row[1] == key and row[5] for row in conn.execute(f"PRAGMA table_info({_quote(table)})"))
+
+def ensure_table(conn, table, columns, dtype_dict=None, key='Date'):
+    """
+    Create table keyed on Date with a row hash column, or bring an existing
+    one up to date. Tables written by the old to_sql(if_exists='replace')
+    path have no key or hashes and are rebuilt.
+    """
+    dtype_dict = dtype_dict or {}
+    existing = _table_columns(conn, table)
+    if existing and (HASH_COLUMN not in existing or not _has_date_primary_key(conn, table, key)):
+        logger.info("Rebuilding legacy table %s with a %s primary key", table, key)
+        conn.execute(f"DROP TABLE {_quote(table)}")
+        existing = []
+
+    if not existing:
+        definitions = []
+        for col in columns:
+            col_type = dtype_dict.get(col, 'TEXT' if col == key else 'INTEGER')
+            suffix = ' PRIMARY KEY' if col == key else ''
+            definitions.append(f"{_quote(col)} {col_type}{suffix}")
+        definitions.append(f"{_quote(HASH_COLUMN)} TEXT")
+        conn.execute(f"CREATE TABLE {_quote(table)} ({', '.join(definitions)})")
+        return
+
+    for col in columns:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(col)} {dtype_dict.get(col, 'INTEGER')}")
+
+def _ensure_pending_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PENDING_TABLE} (
+            table_name TEXT NOT NULL,
+            Date TEXT NOT NULL,
+            PRIMARY KEY (table_name, Date)
+        )
+    """)
+
+def record_pending_changes(conn, table, dates):
+    """Queue dates of table for the next stage to recompute"""
+    _ensure_pending_table(conn)
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {PENDING_TABLE} (table_name, Date) VALUES (?, ?)",
+        [(table, date) for date in dates]
+    )
+
+def get_pending_changes(conn, table):
+    """Dates of table changed since the pending queue was last cleared"""
+    _ensure_pending_table(conn)
+    rows = conn.execute(f"SELECT Date FROM {PENDING_TABLE} WHERE table_name = ?", (table,))
+    return sorted(row[0] for row in rows)
+
+def clear_pending_changes(conn, table, dates=None):
+    _ensure_pending_table(conn)
+    if dates is None:
+        conn.execute(f"DELETE FROM {PENDING_TABLE} WHERE table_name = ?", (table,))
+    else:
+        conn.executemany(
+            f"DELETE FROM {PENDING_TABLE} WHERE table_name = ? AND Date = ?",
+            [(table, date) for date in dates]
+        )
+
+def upsert_by_date(conn, table, df, dtype_dict=None, key='Date', remove_missing=True, track_pending=True):
+    """
+    Write only the rows of df whose content changed, keyed on Date.
+
+    Returns a change set {'added': [...], 'changed': [...], 'removed': [...],
+    'unchanged': n}. With remove_missing, stored dates up to the last date
+    of df that df doesn't contain are deleted: dates before its first date
+    have passed (a scrape starts at today or the requested start date) and
+    gaps inside its span no longer exist. Dates after its last date are
+    kept, so a shorter scrape doesn't drop the rest of a longer horizon.
+    With track_pending the touched dates are queued in pending_changes.
+    """
+    columns = [col for col in df.columns if col != HASH_COLUMN]
+    ensure_table(conn, table, columns, dtype_dict, key)
+    df = df.drop_duplicates(subset=key, keep='last')
+
+    existing = dict(conn.execute(f"SELECT {_quote(key)}, {_quote(HASH_COLUMN)} FROM {_quote(table)}"))
+
+    added, changed, to_write = [], [], []
+    new_keys = set()
+    for values in df[columns].itertuples(index=False, name=None):
+        values = [_normalize(v) for v in values]
+        row = dict(zip(columns, values))
+        row_key = row[key]
+        new_keys.add(row_key)
+        row_hash = _row_hash(values)
+        old_hash = existing.get(row_key)
+        if old_hash == row_hash:
+            continue
+        (added if old_hash is None else changed).append(row_key)
+        to_write.append(values + [row_hash])
+
+    removed = []
+    if remove_missing and new_keys:
+        parsed_new = [_parse_date(k) for k in new_keys]
+        parsed_new = [d for d in parsed_new if not pd.isna(d)]
+        if parsed_new:
+            last = max(parsed_new)
+            for old_key in existing:
+                if old_key in new_keys:
+                    continue
+                old_date = _parse_date(old_key)
+                if not pd.isna(old_date) and old_date <= last:
+                    removed.append(old_key)
+
+    if to_write:
+        column_list = ', '.join(_quote(col) for col in columns + [HASH_COLUMN])
+        placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(table)} ({column_list}) VALUES ({placeholders})",
+            to_write
+        )
+    if removed:
+        conn.executemany(f"DELETE FROM {_quote(table)} WHERE {_quote(key)} = ?", [(k,) for k in removed])
+
+    change_set = {
+        'added': added,
+        'changed': changed,
+        'removed': removed,
+        'unchanged': len(new_keys) - len(added) - len(changed)
+    }
+    if track_pending:
+        record_pending_changes(conn, table, changed_keys(change_set))
+    conn.commit()
+    logger.info(
+        "%s: %s added, %s changed, %s removed, %s unchanged",
+        table, len(added), len(changed), len(removed), change_set['unchanged']
+    )
+    return change_set
+
+def upsert_from_stage(conn, table, stage, columns, dtype_dict=None, key='Date', remove_missing=True,
+                      track_pending=True):
+    """
+    upsert_by_date for rows already staged in SQLite. stage is a table (or
+    temp table) holding columns plus a row_hash computed with the SQL
+    row_hash() function, so nothing passes through pandas. Keys must be
+    ISO 'YYYY-MM-DD' dates for remove_missing's retention rule, which is the
+    same as upsert_by_date's. Returns the same change set as upsert_by_date.
+    """
+    ensure_table(conn, table, columns, dtype_dict, key)
+    table_q, key_q, hash_q = _quote(table), _quote(key), _quote(HASH_COLUMN)
+
+    rows = conn.execute(f"""
+        SELECT s.{key_q}, t.{key_q} IS NULL, t.{hash_q} IS NOT s.{hash_q}
+        FROM {stage} s LEFT JOIN {table_q} t ON t.{key_q} = s.{key_q}
+    """).fetchall()
+    added = sorted(k for k, is_new, _ in rows if is_new)
+    changed = sorted(k for k, is_new, differs in rows if differs and not is_new)
+
+    column_list = ', '.join(_quote(col) for col in columns + [HASH_COLUMN])
+    conn.execute(f"""
+        INSERT OR REPLACE INTO {table_q} ({column_list})
+        SELECT {column_list} FROM {stage} s
+        WHERE NOT EXISTS (SELECT 1 FROM {table_q} t WHERE t.{key_q} = s.{key_q} AND t.{hash_q} = s.{hash_q})
+    """)
+
+    removed = []
+    if remove_missing and rows:
+        removed = [row[0] for row in conn.execute(f"""
+            SELECT {key_q} FROM {table_q}
+            WHERE {key_q} <= (SELECT MAX({key_q}) FROM {stage})
+              AND {key_q} NOT IN (SELECT {key_q} FROM {stage})
+        """)]
+        if removed:
+            delete_dates(conn, table, removed, key)
+
+    change_set = {
+        'added': added,
+        'changed': changed,
+        'removed': removed,
+        'unchanged': len(rows) - len(added) - len(changed)
+    }
+    if track_pending:
+        record_pending_changes(conn, table, changed_keys(change_set))
+    conn.commit()
+    logger.info(
+        "%s: %s added, %s changed, %s removed, %s unchanged",
+        table, len(added), len(changed), len(removed), change_set['unchanged']
+    )
+    return change_set
+
+def changed_keys(change_set):
+    """Every date touched by a change set"""
+    return sorted(set(change_set['added']) | set(change_set['changed']) | set(change_set['removed']))
+
+def has_changes(change_set):
+    return bool(change_set['added'] or change_set['changed'] or change_set['removed'])
+
+def _sort_by_date(df, key):
+    """Sort df by its key column parsed as a date, whatever DATE_FORMATS it uses"""
+    parsed = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    for date_format in DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(df[key], format=date_format, errors='coerce'))
+    return df.loc[parsed.sort_values(kind='stable').index].reset_index(drop=True)
+
+def read_table(conn, table, dates=None, key='Date'):
+    """Read a table without its hash column in date order, optionally limited to some dates"""
+    columns = [col for col in _table_columns(conn, table) if col != HASH_COLUMN]
+    if not columns:
+        raise sqlite3.OperationalError(f"no such table: {table}")
+    column_list = ', '.join(_quote(col) for col in columns)
+    query = f"SELECT {column_list} FROM {_quote(table)}"
+    # Rewritten rows get new rowids, so the storage order is not the date order
+    order_by = f" ORDER BY {_quote(key)}"
+    if dates is None:
+        return _sort_by_date(pd.read_sql_query(query + order_by, conn), key)
+    dates = sorted(dates)
+    if not dates:
+        return pd.DataFrame(columns=columns)
+    frames = []
+    # Stay below SQLite's bound parameter limit
+    for start in range(0, len(dates), 500):
+        chunk = dates[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        frames.append(pd.read_sql_query(f"{query} WHERE {_quote(key)} IN ({placeholders}){order_by}", conn,
+                                        params=chunk))
+    return _sort_by_date(pd.concat(frames, ignore_index=True), key)
+
+def delete_dates(conn, table, dates, key='Date'):
+    conn.executemany(f"DELETE FROM {_quote(table)} WHERE {_quote(key)} = ?", [(d,) for d in dates])
@@ -0,0 +1,65 @@
+"""
+Logging setup for the scraper package.
+
+Every module logs through logging.getLogger(__name__) with %-style
+arguments, so messages below the configured level are never formatted.
+configure_logging() sends the package's and the routes' records to
+stdout as plain messages, the way the old prints looked;
+SCRAPER_LOG_LEVEL=DEBUG brings back the per-row traces. capture_to_queue() streams records into one of
+the routes' progress queues while a job runs.
+"""
+
+import logging
+import os
+import sys
+from contextlib import contextmanager
+
+PACKAGE_LOGGER = __name__.rpartition('.')[0]
+ROUTES_LOGGER = PACKAGE_LOGGER.rpartition('.')[0] + '.routes'
+LOG_LEVEL = os.environ.get('SCRAPER_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = '%(message)s'
+
+_configured = False
+
+def configure_logging(level=None):
+    """Attach a stdout handler to the package, routes and __main__ loggers; safe to call repeatedly"""
+    global _configured
+    level = level or LOG_LEVEL
+    for name in (PACKAGE_LOGGER, ROUTES_LOGGER, '__main__'):
+        logging.getLogger(name).setLevel(level)
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    for name in (PACKAGE_LOGGER, ROUTES_LOGGER, '__main__'):
+        logger = logging.getLogger(name)
+        logger.addHandler(handler)
+        logger.propagate = False
+    _configured = True
+
+class QueueLogHandler(logging.Handler):
+    """Puts each formatted record on a queue.Queue"""
+
+    def __init__(self, queue, level=logging.NOTSET):
+        super().__init__(level)
+        self.queue = queue
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record):
+        try:
+            message = self.format(record).strip()
+            if message:
+                self.queue.put(message)
+        except Exception:
+            self.handleError(record)
+
+@contextmanager
+def capture_to_queue(queue, level=logging.INFO, logger_name=PACKAGE_LOGGER):
+    """Copy the package's records at level and above onto queue for the duration"""
+    logger = logging.getLogger(logger_name)
+    handler = QueueLogHandler(queue, level)
+    logger.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        logger.removeHandler(handler)
@@ -0,0 +1,41 @@
+"""
+Connection settings for the Hospitality Suite PMS.
+
+Every value can be overridden from the environment, e.g. pointing
+PMS_BASE_URL at a local stub server. The login has no default: set
+PMS_USERNAME and PMS_PASSWORD in the environment or in backend/.env,
+which create_app() loads (see backend/.env.example), or pass credentials
+explicitly.
+"""
+
+import hashlib
+import hmac
+import os
+
+PMS_BASE_URL = os.environ.get('PMS_BASE_URL', 'https://fo.hospitality.mykg.id/')
+PMS_USERNAME = os.environ.get('PMS_USERNAME')
+PMS_PASSWORD = os.environ.get('PMS_PASSWORD')
+
+# Per-process key, so credential hashes are never comparable across runs
+_CREDENTIAL_KEY = os.urandom(32)
+
+def require_credentials(username, password):
+    """Raise ValueError unless both a username and a password were given"""
+    if not username or not password:
+        raise ValueError("PMS credentials missing: set PMS_USERNAME and PMS_PASSWORD or pass them explicitly")
+
+def credential_hash(password):
+    """Keyed hash of a password, for telling cached logins apart without keeping the password"""
+    return hmac.new(_CREDENTIAL_KEY, (password or '').encode('utf-8'), hashlib.sha256).hexdigest()
+
+def pms_url(path='', base_url=None):
+    """Build an absolute PMS URL from a path relative to the site root"""
+    base_url = base_url or PMS_BASE_URL
+    return base_url.rstrip('/') + '/' + path.lstrip('/')
+
+def set_base_url(base_url):
+    """Point every scraper at another PMS (e.g. the local stub); returns the previous URL"""
+    global PMS_BASE_URL
+    previous = PMS_BASE_URL
+    PMS_BASE_URL = base_url
+    return previous
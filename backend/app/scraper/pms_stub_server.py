@@ -0,0 +1,287 @@
+"""
+Local stub of the Hospitality Suite PMS serving recorded responses.
+
+A fixture directory mirrors the site's paths: a request for
+/RoomAvailable/GetRoomAvailability is answered with
+RoomAvailable/GetRoomAvailability.json (or .html), and the site root with
+index.html. Non-GET methods and query strings are part of the name
+(Login/DoLogin__post.json, GetRoomAvailability__q<hash>.json), so
+requests that differ only in those are recorded and replayed separately. Point PMS_BASE_URL (or a base_url argument) at the stub to run
+the scrapers offline.
+
+With an upstream URL the server records instead: every request is forwarded
+to the live site and the response is written to the fixture directory
+(with a .meta.json sidecar holding status, redirect, cookies and the
+request body, password fields blanked) before it is relayed, so one scrape
+through the recorder produces a replayable set.
+"""
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+FIXTURE_EXTENSIONS = ['', '.json', '.html']
+# Cache-busting query parameters left out of fixture names
+IGNORED_QUERY_PARAMS = ['_']
+META_SUFFIX = '.meta.json'
+
+# Request headers forwarded to the live site while recording
+FORWARDED_HEADERS = ['Accept', 'Content-Type', 'Cookie', 'X-Requested-With', 'User-Agent']
+# Request fields whose values are never written to a fixture
+REDACTED_FIELDS = ['password']
+REDACTED_VALUE = '***'
+
+def _request_suffix(path, method):
+    """
+    Fixture name suffix for everything but the path: '__post' etc. for
+    non-GET methods and '__q' plus a hash of the query string, ignoring
+    IGNORED_QUERY_PARAMS
+    """
+    suffix = '' if method.upper() == 'GET' else '__' + method.lower()
+    params = [(k, v) for k, v in parse_qsl(urlsplit(path).query, keep_blank_values=True)
+              if k not in IGNORED_QUERY_PARAMS]
+    if params:
+        suffix += '__q' + hashlib.sha1(urlencode(sorted(params)).encode('utf-8')).hexdigest()[:12]
+    return suffix
+
+def _fixture_base(fixture_dir, path, method='GET', exact=True):
+    relative = urlsplit(path).path.strip('/')
+    if not relative:
+        relative = 'index'
+    if exact:
+        root, extension = os.path.splitext(relative)
+        relative = root + _request_suffix(path, method) + extension
+    base = os.path.normpath(os.path.join(fixture_dir, relative))
+    if not base.startswith(os.path.normpath(fixture_dir)):
+        return None
+    return base
+
+def resolve_fixture(fixture_dir, path, method='GET', fallback=True):
+    """
+    Map a request onto a recorded response file, or None. The fixture
+    recorded for the same method and query is preferred; a plain path
+    fixture (hand-written, or recorded before the key included them) is
+    the fallback unless fallback is False.
+    """
+    for exact in ((True, False) if fallback else (True,)):
+        base = _fixture_base(fixture_dir, path, method, exact)
+        if base is None:
+            return None
+        for extension in FIXTURE_EXTENSIONS:
+            candidate = base + extension
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+def fixture_path_for(fixture_dir, path, content_type, method='GET'):
+    """Where a recorded response for the request is written, so resolve_fixture finds it again"""
+    base = _fixture_base(fixture_dir, path, method)
+    if base is None:
+        return None
+    if not os.path.splitext(base)[1]:
+        if 'json' in content_type:
+            base += '.json'
+        elif 'html' in content_type:
+            base += '.html'
+    return base
+
+def _redacted(name):
+    return any(field in name.lower() for field in REDACTED_FIELDS)
+
+def recorded_request(body, content_type):
+    """
+    The request body as stored in a fixture's sidecar, with the values of
+    REDACTED_FIELDS blanked; a body that can't be parsed but mentions one
+    is dropped
+    """
+    text = body.decode('utf-8', 'replace')
+    if 'json' in content_type:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = {key: REDACTED_VALUE if _redacted(key) else value for key, value in data.items()}
+            return {'content_type': content_type, 'body': json.dumps(data)}
+    elif 'form' in content_type:
+        params = [(key, REDACTED_VALUE if _redacted(key) else value)
+                  for key, value in parse_qsl(text, keep_blank_values=True)]
+        return {'content_type': content_type, 'body': urlencode(params)}
+    if _redacted(text):
+        return {'content_type': content_type, 'body': None}
+    return {'content_type': content_type, 'body': text}
+
+def load_fixture_meta(fixture_path):
+    meta_path = fixture_path + META_SUFFIX
+    if not os.path.isfile(meta_path):
+        return {}
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _local_cookie(cookie):
+    """Strip Domain/Secure so a cookie from the live site sticks to localhost"""
+    parts = [part.strip() for part in cookie.split(';')]
+    kept = [part for part in parts if part.split('=')[0].strip().lower() not in ('domain', 'secure', 'samesite')]
+    return '; '.join(kept)
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    fixture_dir = None
+    received = None
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _serve(self):
+        body = self._read_body()
+        if self.command == 'POST' and self.received is not None:
+            self.received.append((self.path, body))
+
+        fixture_path = resolve_fixture(self.fixture_dir, self.path, self.command)
+        if fixture_path is None:
+            self.send_error(404, f"No fixture recorded for {self.path}")
+            return
+
+        with open(fixture_path, 'rb') as f:
+            body = f.read()
+        meta = load_fixture_meta(fixture_path)
+        content_type = meta.get('content_type') or \
+            f"{mimetypes.guess_type(fixture_path)[0] or 'text/html'}; charset=utf-8"
+        self.send_response(meta.get('status', 200))
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if meta.get('location'):
+            self.send_header('Location', meta['location'])
+        for cookie in meta.get('cookies') or ['stub_session=1; Path=/']:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _serve
+    do_POST = _serve
+
+    def log_message(self, format, *args):
+        pass  # Keep test and benchmark output quiet
+
+class RecordingRequestHandler(StubRequestHandler):
+    """Forward requests to the live site and save each response as a fixture"""
+    upstream_url = None
+
+    def _serve(self):
+        body = self._read_body()
+        headers = {name: self.headers[name] for name in FORWARDED_HEADERS if self.headers.get(name)}
+        upstream = self.upstream_url.rstrip('/') + self.path
+        # No shared session: the browser's own Cookie header decides who is logged in
+        response = requests.request(self.command, upstream, data=body or None, headers=headers,
+                                        allow_redirects=False, timeout=60)
+
+        content_type = response.headers.get('Content-Type', 'text/html')
+        location = response.headers.get('Location')
+        if location and location.startswith(self.upstream_url.rstrip('/')):
+            location = location[len(self.upstream_url.rstrip('/')):] or '/'
+        cookies = [_local_cookie(cookie) for cookie in response.raw.headers.getlist('Set-Cookie')]
+
+        fixture_path = fixture_path_for(self.fixture_dir, self.path, content_type, self.command)
+        if fixture_path is not None:
+            os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+            with open(fixture_path, 'wb') as f:
+                f.write(response.content)
+            meta = {'status': response.status_code, 'content_type': content_type}
+            if location:
+                meta['location'] = location
+            if cookies:
+                meta['cookies'] = cookies
+            if body:
+                meta['request'] = recorded_request(body, self.headers.get('Content-Type', ''))
+            with open(fixture_path + META_SUFFIX, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+
+        self.send_response(response.status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(response.content)))
+        if location:
+            self.send_header('Location', location)
+        for cookie in cookies:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    do_GET = _serve
+    do_POST = _serve
+
+class PMSStubServer:
+    """
+    Serve a fixture directory on localhost in a background thread, or record
+    into it from upstream_url when one is given.
+    """
+    def __init__(self, fixture_dir, host='127.0.0.1', port=0, upstream_url=None):
+        if upstream_url:
+            handler = type('BoundRecordingRequestHandler', (RecordingRequestHandler,), {
+                'fixture_dir': fixture_dir,
+                'upstream_url': upstream_url
+            })
+        else:
+            handler = type('BoundStubRequestHandler', (StubRequestHandler,), {
+                'fixture_dir': fixture_dir,
+                'received': []
+            })
+        self.fixture_dir = fixture_dir
+        # (path, body) of every POST served from fixtures, to check what a client sent
+        self.received = handler.received
+        self.upstream_url = upstream_url
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded PMS responses locally")
+    parser.add_argument('fixture_dir')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--record', metavar='UPSTREAM_URL',
+                        help="Forward to this PMS and record its responses into fixture_dir")
+    args = parser.parse_args()
+
+    server = PMSStubServer(args.fixture_dir, port=args.port, upstream_url=args.record)
+    if args.record:
+        print(f"Recording {args.record} into {args.fixture_dir} via {server.base_url}")
+    else:
+        print(f"Serving {args.fixture_dir} at {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
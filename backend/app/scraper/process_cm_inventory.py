@@ -1,22 +1,129 @@
+import logging
 import pandas as pd
 import os
-import sqlite3
+from datetime import datetime
+from openpyxl import load_workbook
+from .inventory_store import upsert_by_date, upsert_from_stage, read_table, has_changes, register_row_hash_function
+from . import warehouse
+from . import cm_upload_cache
+from .snapshot_store import record_snapshot
 
-def process_cm_inventory():
-    # Get the absolute path to the data directory within the scraper folder
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, 'data')
-    
-    # Use path for the Excel file in data directory
-    upload_path = os.path.join(data_dir, 'cm_upload.xlsx')
-    
-    if not os.path.exists(upload_path):
-        raise FileNotFoundError(f"The CM Excel file was not found at: {upload_path}")
-    
+logger = logging.getLogger(__name__)
+
+CM_TABLE = 'cm_inventory_processed'
+LEFT_FOR_SALE = 'Left for sale'
+
+# Layout of the channel manager "Planning" export: room type in the first
+# column, row type in the third, one column per date after that
+ROOM_COLUMN = 0
+TYPE_COLUMN = 2
+
+def _header_date(value):
+    """The 'YYYY-MM-DD' date of a header cell, or None for non-date cells"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, str):
+        parsed = pd.to_datetime(value, errors='coerce')
+        if not pd.isna(parsed):
+            return parsed.strftime('%Y-%m-%d')
+    return None
+
+def _count(value):
+    """Numeric cells as int, anything else ('X', blanks) as 0 like pd.to_numeric(errors='coerce').fillna(0)"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value) if float(value).is_integer() else value
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return 0
+        return int(number) if number.is_integer() else number
+    return 0
+
+def iter_cm_records(upload_path):
+    """
+    Stream (date, room_type, count) records for the 'Left for sale' rows of
+    the CM workbook, reading it row by row in openpyxl read-only mode.
+    """
+    workbook = load_workbook(upload_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        date_columns = [(index, _header_date(value)) for index, value in enumerate(header)
+                        if index > TYPE_COLUMN and _header_date(value)]
+        for row in rows:
+            if len(row) <= TYPE_COLUMN or row[TYPE_COLUMN] != LEFT_FOR_SALE:
+                continue
+            room_type = row[ROOM_COLUMN]
+            for index, date in date_columns:
+                yield date, room_type, _count(row[index] if index < len(row) else None)
+    finally:
+        workbook.close()
+
+def _create_records_table(conn):
+    conn.execute("DROP TABLE IF EXISTS temp.cm_records")
+    conn.execute("CREATE TEMP TABLE cm_records (Date TEXT, room_type TEXT, count NUMERIC)")
+
+def ingest_cm_records(conn, records):
+    """
+    Load long-format records into cm_inventory_processed. Records are
+    streamed into a temp table and pivoted to one row per date in SQL, so the
+    wide frame is never built in Python. Returns the change set.
+    """
+    _create_records_table(conn)
+    conn.executemany("INSERT INTO temp.cm_records (Date, room_type, count) VALUES (?, ?, ?)", records)
+    return _upsert_loaded_records(conn)
+
+def ingest_cached_records(conn, content_hash):
+    """ingest_cm_records for an upload whose records are already in the upload cache"""
+    _create_records_table(conn)
+    conn.execute(f"""
+        INSERT INTO temp.cm_records (Date, room_type, count)
+        SELECT Date, room_type, count FROM {cm_upload_cache.RECORDS_TABLE}
+        WHERE content_hash = ? ORDER BY position
+    """, (content_hash,))
+    return _upsert_loaded_records(conn)
+
+def _upsert_loaded_records(conn):
+    # Room types keep the order they appear in the workbook
+    room_types = [row[0] for row in conn.execute(
+        "SELECT room_type FROM temp.cm_records GROUP BY room_type ORDER BY MIN(rowid)"
+    )]
+    if not room_types:
+        conn.execute("DROP TABLE temp.cm_records")
+        raise ValueError(f"No '{LEFT_FOR_SALE}' rows found in the CM workbook")
+
+    columns = ['Date'] + room_types
+    quoted = ['"' + col.replace('"', '""') + '"' for col in columns]
+    pivot = ', '.join(
+        f"SUM(CASE WHEN room_type = ? THEN count END) AS {name}" for name in quoted[1:]
+    )
+    register_row_hash_function(conn)
+    conn.execute("DROP TABLE IF EXISTS temp.cm_stage")
+    conn.execute(f"""
+        CREATE TEMP TABLE cm_stage AS
+        SELECT {', '.join(quoted)}, row_hash({', '.join(quoted)}) AS row_hash FROM (
+            SELECT Date AS "Date", {pivot} FROM temp.cm_records GROUP BY Date
+        )
+    """, room_types)
+
+    dtype_dict = {'Date': 'DATE'}
+    dtype_dict.update({col: 'INTEGER' for col in room_types})
+    change_set = upsert_from_stage(conn, CM_TABLE, 'temp.cm_stage', columns, dtype_dict)
+    conn.execute("DROP TABLE temp.cm_stage")
+    conn.execute("DROP TABLE temp.cm_records")
+    return change_set
+
+def read_cm_workbook_pandas(upload_path):
+    """The original wide-frame parse: read, filter, transpose and coerce the whole sheet"""
     df = pd.read_excel(upload_path)
     df = df.drop('Unnamed: 1', axis=1)
     df = df.rename(columns={'Unnamed: 2': 'Type'})
-    df = df[df['Type'] == 'Left for sale']
+    df = df[df['Type'] == LEFT_FOR_SALE]
     df = df.drop('Type', axis=1)
     # Transpose the DataFrame
     df = df.transpose()
@@ -30,37 +137,79 @@ def process_cm_inventory():
     df = df.rename(columns={'index': 'Date'})
 
     # Replace any non-numeric values with 0 except the ones in column Date
-    df = df.apply(pd.to_numeric, errors='coerce').fillna(0)
-    df['Date'] = pd.to_datetime(df['Date'])
+    dates = pd.to_datetime(df['Date'])
+    df = df.drop(columns='Date').apply(pd.to_numeric, errors='coerce').fillna(0)
 
     # Convert date to YYYY-MM-DD format for consistency
-    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
-
-    # Save processed data to CSV in data directory
-    csv_path = os.path.join(data_dir, 'cm_inventory_processed.csv')
-    df.to_csv(csv_path, index=False)
-    print(f'Processed data saved to {csv_path}')
-
-    # Save to SQLite database in data directory
-    db_path = os.path.join(data_dir, 'cm_inventory_processed.db')
-    
-    # Connect to SQLite database
-    conn = sqlite3.connect(db_path)
-    
-    # Create dtype dictionary for all columns except Date
-    dtype_dict = {'Date': 'DATE'}
-    for col in df.columns:
-        if col != 'Date':
-            dtype_dict[col] = 'INTEGER'
-    
-    # Save DataFrame to SQLite with explicit data types
-    df.to_sql('cm_inventory_processed', conn, if_exists='replace', index=False, dtype=dtype_dict)
-    
-    # Close the connection
-    conn.close()
-    print(f'Processed data saved to {db_path}')
-    
+    df.insert(0, 'Date', dates.dt.strftime('%Y-%m-%d'))
+    df.columns.name = None
+    return df
+
+def ingest_cm_workbook(conn, upload_path, engine='streaming', content_hash=None):
+    """
+    Parse the CM workbook into cm_inventory_processed; returns the change set.
+    With content_hash the streaming engine reuses, or fills, the upload
+    cache's records for that hash instead of always parsing.
+    """
+    if engine == 'streaming':
+        if content_hash is None:
+            return ingest_cm_records(conn, iter_cm_records(upload_path))
+        if not cm_upload_cache.has_records(conn, content_hash):
+            cm_upload_cache.store_records(conn, content_hash, iter_cm_records(upload_path))
+        else:
+            logger.info("Reusing parsed records of CM upload %s", content_hash[:12])
+        return ingest_cached_records(conn, content_hash)
+    if engine == 'pandas':
+        df = read_cm_workbook_pandas(upload_path)
+        dtype_dict = {'Date': 'DATE'}
+        for col in df.columns:
+            if col != 'Date':
+                dtype_dict[col] = 'INTEGER'
+        return upsert_by_date(conn, CM_TABLE, df, dtype_dict)
+    raise ValueError(f"Unknown CM ingest engine: {engine}")
+
+def process_cm_inventory(engine='streaming'):
+    # Get the absolute path to the data directory within the scraper folder
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(current_dir, 'data')
+
+    # Use path for the Excel file in data directory
+    upload_path = os.path.join(data_dir, 'cm_upload.xlsx')
+
+    if not os.path.exists(upload_path):
+        raise FileNotFoundError(f"The CM Excel file was not found at: {upload_path}")
+
+    # Save to the warehouse
+    conn = warehouse.connect()
+
+    try:
+        # An upload already reflected in the processed table needs no work
+        content_hash = cm_upload_cache.hash_file(upload_path)
+        if (cm_upload_cache.processed_hash(conn) == content_hash
+                and warehouse.table_exists(conn, CM_TABLE)):
+            logger.info("CM upload %s is already processed", content_hash[:12])
+            return "CM Inventory unchanged since last processing"
+        cm_upload_cache.register_file(conn, upload_path, content_hash)
+
+        # Upsert by Date so only changed dates are written and queued for the combine stage
+        change_set = ingest_cm_workbook(conn, upload_path, engine, content_hash)
+        cm_upload_cache.mark_processed(conn, content_hash)
+        # Keep the history of every change for pickup analysis
+        record_snapshot(conn, 'cm', change_set)
+        logger.info("Processed data saved to %s", warehouse.WAREHOUSE_DB)
+
+        # Save processed data to CSV in data directory, mirroring the full table
+        csv_path = os.path.join(data_dir, 'cm_inventory_processed.csv')
+        if has_changes(change_set) or not os.path.exists(csv_path):
+            read_table(conn, CM_TABLE).to_csv(csv_path, index=False)
+            logger.info("Processed data saved to %s", csv_path)
+    finally:
+        # Close the connection
+        conn.close()
+
     return "CM Inventory processing completed successfully"
 
 if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
     process_cm_inventory()
@@ -1,6 +1,11 @@
+import logging
 import pandas as pd
 import os
-import sqlite3
+from .inventory_store import upsert_by_date, read_table, has_changes
+from . import warehouse
+from .snapshot_store import record_snapshot
+
+logger = logging.getLogger(__name__)
 
 def process_pms_inventory(df=None):
     # Get the absolute path to the data directory within the scraper folder
@@ -8,33 +13,26 @@ def process_pms_inventory(df=None):
     data_dir = os.path.join(current_dir, 'data')
     
     # Print the paths for debugging
-    print(f"Current directory: {current_dir}")
-    print(f"Data directory: {data_dir}")
+    logger.debug("Current directory: %s", current_dir)
+    logger.debug("Data directory: %s", data_dir)
     
     os.makedirs(data_dir, exist_ok=True)
     
     # If no DataFrame is provided, read from the raw database in data directory
     if df is None:
         try:
-            # Connect to SQLite database
-            db_path = os.path.join(data_dir, 'pms_inventory_raw.db')
-            if not os.path.exists(db_path):
-                print(f"Error: Raw database not found at {db_path}")
-                return None
-                
-            conn = sqlite3.connect(db_path)
-            
-            # Read data from the pms_inventory table
-            df = pd.read_sql_query("SELECT * FROM pms_inventory", conn)
-            
-            # Close the connection
-            conn.close()
+            # Read data from the pms_inventory table in the warehouse
+            with warehouse.connection() as conn:
+                if not warehouse.table_exists(conn, 'pms_inventory'):
+                    logger.error("Error: Raw pms_inventory table not found in the warehouse")
+                    return None
+                df = read_table(conn, 'pms_inventory')
             
             if df.empty:
-                print("Error: No data found in the raw database")
+                logger.error("Error: No data found in the raw database")
                 return None
             
-            print(f"Successfully read raw data from {db_path}")
+            logger.info("Successfully read raw data from the warehouse")
             
             # Convert numeric columns to appropriate types
             numeric_columns = ['DLK', 'DLT', 'DLKP', 'DLTP', 'PRKG', 'PRKP', 'PRTG', 'PRTP', 'PRKL', 'PRTL',
@@ -52,7 +50,7 @@ def process_pms_inventory(df=None):
                 except ValueError:
                     df['Date'] = pd.to_datetime(df['Date'], format='%A, %d-%B-%Y')
         except Exception as e:
-            print(f"Error reading from database: {e}")
+            logger.error("Error reading from database: %s", e)
             return None
 
     # AVR	= The Anvaya Residence
@@ -108,23 +106,15 @@ def process_pms_inventory(df=None):
                         # Try parsing without specifying format
                         df['Date'] = pd.to_datetime(df['Date'])
                     except ValueError as e:
-                        print(f"Error parsing dates: {str(e)}")
-                        print("Sample date value:", df['Date'].iloc[0])
+                        logger.error("Error parsing dates: %s", e)
+                        logger.debug("Sample date value: %s", df['Date'].iloc[0])
                         raise
 
         # Convert date to YYYY-MM-DD format for consistency
         df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
 
-        # Save processed data to CSV in data directory
-        csv_path = os.path.join(data_dir, 'pms_inventory_processed.csv')
-        df.to_csv(csv_path, index=False)
-        print(f"Processed data saved to CSV: {csv_path}")
-        
-        # Save to SQLite database
-        db_path = os.path.join(data_dir, 'pms_inventory_processed.db')
-        
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
+        # Save to the warehouse
+        conn = warehouse.connect()
         
         # Define data types for each column
         dtype_dict = {
@@ -144,18 +134,29 @@ def process_pms_inventory(df=None):
             'Premiere Room Lagoon Access': 'INTEGER'
         }
         
-        # Save DataFrame to SQLite with explicit data types
-        df.to_sql('pms_inventory_processed', conn, if_exists='replace', index=False, dtype=dtype_dict)
-        
-        # Close the connection
-        conn.close()
-        print(f"Processed data saved to database: {db_path}")
+        try:
+            # Upsert by Date so only changed dates are written and queued for the combine stage
+            change_set = upsert_by_date(conn, 'pms_inventory_processed', df, dtype_dict)
+            # Keep the history of every change for pickup analysis
+            record_snapshot(conn, 'pms', change_set)
+            logger.info("Processed data saved to database: %s", warehouse.WAREHOUSE_DB)
+            
+            # Save processed data to CSV in data directory, mirroring the full table
+            csv_path = os.path.join(data_dir, 'pms_inventory_processed.csv')
+            if has_changes(change_set) or not os.path.exists(csv_path):
+                read_table(conn, 'pms_inventory_processed').to_csv(csv_path, index=False)
+                logger.info("Processed data saved to CSV: %s", csv_path)
+        finally:
+            # Close the connection
+            conn.close()
         
         return df
         
     except Exception as e:
-        print(f"Error during data processing: {e}")
+        logger.error("Error during data processing: %s", e)
         return None
 
 if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
     process_pms_inventory()
\ No newline at end of file
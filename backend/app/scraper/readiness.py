@@ -0,0 +1,196 @@
+"""
+Event-driven readiness checks for the PMS pages.
+
+Instead of sleeping for worst-case constants, these helpers wait on the
+signals the page actually produces (DOM mutations, in-flight XHR/fetch
+requests, Vue updating an input) and record how long every wait took.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+POLL_FREQUENCY = 0.05
+
+# Wrap XMLHttpRequest and fetch so the page keeps a count of in-flight requests
+NETWORK_TRACKER_SCRIPT = """
+    if (window.__readinessTracker) {
+        return;
+    }
+    window.__readinessTracker = {pending: 0, lastActivity: Date.now()};
+    const tracker = window.__readinessTracker;
+    const begin = () => { tracker.pending++; tracker.lastActivity = Date.now(); };
+    const end = () => { tracker.pending = Math.max(0, tracker.pending - 1); tracker.lastActivity = Date.now(); };
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        begin();
+        this.addEventListener('loadend', end, {once: true});
+        return originalSend.apply(this, arguments);
+    };
+
+    if (window.fetch) {
+        const originalFetch = window.fetch;
+        window.fetch = function() {
+            begin();
+            return originalFetch.apply(this, arguments).finally(end);
+        };
+    }
+"""
+
+NETWORK_IDLE_SCRIPT = """
+    const idleMs = arguments[0];
+    const done = arguments[arguments.length - 1];
+    const tracker = window.__readinessTracker;
+    if (!tracker) {
+        done(false);
+        return;
+    }
+    const check = () => {
+        if (tracker.pending === 0 && Date.now() - tracker.lastActivity >= idleMs) {
+            done(true);
+        } else {
+            setTimeout(check, 50);
+        }
+    };
+    check();
+"""
+
+# Resolves once the element has seen no mutations for quietMs, optionally
+# after a readiness predicate on the element becomes true
+DOM_SETTLED_SCRIPT = """
+    const selector = arguments[0];
+    const quietMs = arguments[1];
+    const predicateSource = arguments[2];
+    const done = arguments[arguments.length - 1];
+    const predicate = predicateSource ? new Function('el', predicateSource) : null;
+
+    const start = () => {
+        const el = document.querySelector(selector);
+        if (!el) {
+            return false;
+        }
+        let timer = null;
+        const settle = () => {
+            if (predicate && !predicate(el)) {
+                return;
+            }
+            clearTimeout(timer);
+            timer = setTimeout(() => { observer.disconnect(); done(true); }, quietMs);
+        };
+        const observer = new MutationObserver(settle);
+        observer.observe(el, {childList: true, subtree: true, characterData: true, attributes: true});
+        settle();
+        return true;
+    };
+
+    if (!start()) {
+        const bodyObserver = new MutationObserver(() => {
+            if (start()) {
+                bodyObserver.disconnect();
+            }
+        });
+        bodyObserver.observe(document.body, {childList: true, subtree: true});
+    }
+"""
+
+# Predicate used with DOM_SETTLED_SCRIPT: a data row with at least one cell filled in
+TABLE_HAS_DATA_PREDICATE = """
+    const rows = el.querySelectorAll('tbody tr');
+    if (rows.length < 2) {
+        return false;
+    }
+    return Array.from(rows[1].querySelectorAll('td')).some(td => td.innerText.trim() !== '');
+"""
+
+# Waits are recorded per thread, so parallel scrape windows don't mix their timings
+_local = threading.local()
+
+def _thread_timings():
+    if not hasattr(_local, 'timings'):
+        _local.timings = []
+    return _local.timings
+
+def record_wait(name, seconds, succeeded=True):
+    _thread_timings().append({'name': name, 'seconds': round(seconds, 3), 'succeeded': succeeded})
+
+def get_wait_timings(reset=False):
+    """Return the waits recorded on this thread, optionally clearing them"""
+    timings = list(_thread_timings())
+    if reset:
+        _local.timings = []
+    return timings
+
+def log_wait_summary(timings):
+    """Log the total time spent in readiness waits and the slowest ones"""
+    total = sum(t['seconds'] for t in timings)
+    logger.info("Waited %.2fs in %s readiness checks", total, len(timings))
+    for t in sorted(timings, key=lambda t: t['seconds'], reverse=True)[:3]:
+        logger.info("  %s: %.2fs%s", t['name'], t['seconds'], '' if t['succeeded'] else ' (timed out)')
+
+@contextmanager
+def timed_wait(name):
+    """Record how long the wrapped wait actually took"""
+    start = time.perf_counter()
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        elapsed = time.perf_counter() - start
+        record_wait(name, elapsed, succeeded)
+        logger.debug("Waited %.2fs for %s", elapsed, name)
+
+def _run_async(driver, script, timeout, *args):
+    driver.set_script_timeout(timeout)
+    return driver.execute_async_script(script, *args)
+
+def install_network_tracker(driver):
+    """Start counting in-flight XHR/fetch requests; call before the action to wait on"""
+    driver.execute_script(NETWORK_TRACKER_SCRIPT)
+
+def wait_for_network_idle(driver, idle_ms=500, timeout=30, name="network idle"):
+    """Wait until no tracked request has been in flight for idle_ms"""
+    with timed_wait(name):
+        return _run_async(driver, NETWORK_IDLE_SCRIPT, timeout, idle_ms)
+
+def wait_for_dom_settled(driver, selector, quiet_ms=300, timeout=20, predicate=None, name=None):
+    """
+    Wait until the element matching selector exists, satisfies the optional
+    JavaScript predicate (a function body receiving `el`) and has stopped
+    mutating for quiet_ms.
+    """
+    with timed_wait(name or f"{selector} to settle"):
+        return _run_async(driver, DOM_SETTLED_SCRIPT, timeout, selector, quiet_ms, predicate)
+
+def wait_for_value_change(driver, element, previous_value, timeout=10, name="input value change"):
+    """Wait until Vue (or the page) changes the value of an input"""
+    with timed_wait(name):
+        WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(
+            lambda d: element.get_attribute('value') != previous_value
+        )
+        return element.get_attribute('value')
+
+def wait_for_value(driver, element, expected_value, timeout=5, name="input value"):
+    """Wait until an input holds expected_value"""
+    with timed_wait(name):
+        WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(
+            lambda d: element.get_attribute('value') == expected_value
+        )
+
+def wait_for_text_change(driver, element, previous_text, timeout=5, name="text change"):
+    """Wait until an element's text differs from previous_text (or it is re-rendered)"""
+    def text_changed(d):
+        try:
+            return element.text.strip() != previous_text
+        except StaleElementReferenceException:
+            return True
+
+    with timed_wait(name):
+        WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(text_changed)
@@ -0,0 +1,195 @@
+"""
+Per-phase timing spans for PMS scrapes.
+
+scrape_pms_inventory starts a run, the scrape code wraps each phase in
+span(...), and the finished run is written to the warehouse scrape_runs table so
+p50/p95 per phase can be compared across recent runs. Spans opened while no
+run is active are ignored, which keeps the helpers usable outside a scrape.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from . import warehouse
+
+logger = logging.getLogger(__name__)
+
+PHASES = ['driver_start', 'login', 'navigation', 'date_selection', 'search',
+          'table_wait', 'extraction', 'persistence', 'processing']
+DEFAULT_RECENT_RUNS = 50
+
+class ScrapeRun:
+    """Spans recorded by one scrape; windows scraped in parallel add to the same run"""
+    def __init__(self, engine=None, horizon_days=None, windows=None):
+        self.engine = engine
+        self.horizon_days = horizon_days
+        self.windows = windows
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans = []  # (phase, seconds, succeeded)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            with self._lock:
+                self.spans.append((phase, time.perf_counter() - start, succeeded))
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def phase_totals(self):
+        totals = {}
+        with self._lock:
+            for phase, seconds, _ in self.spans:
+                totals[phase] = totals.get(phase, 0.0) + seconds
+        return totals
+
+_current_run = None
+
+def start_run(engine=None, horizon_days=None, windows=None):
+    """Make a new run the target of span() until finish_run is called"""
+    global _current_run
+    _current_run = ScrapeRun(engine, horizon_days, windows)
+    return _current_run
+
+@contextmanager
+def span(phase):
+    """Time phase against the active run, or do nothing when none is active"""
+    run = _current_run
+    if run is None:
+        yield
+        return
+    with run.span(phase):
+        yield
+
+def _ensure_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            engine TEXT,
+            horizon_days INTEGER,
+            windows INTEGER,
+            status TEXT,
+            total_seconds REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_run_spans (
+            run_id INTEGER NOT NULL REFERENCES scrape_runs(run_id),
+            phase TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            succeeded INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_run_spans_run ON scrape_run_spans (run_id)")
+
+def finish_run(run, status, db_path=None):
+    """Persist run and its spans, print a per-phase summary and return the run id"""
+    global _current_run
+    if _current_run is run:
+        _current_run = None
+
+    total = run.elapsed()
+    totals = run.phase_totals()
+    logger.info(
+        "Scrape phase timings: %s (total %.2fs)",
+        ", ".join(f"{phase} {totals[phase]:.2f}s" for phase in PHASES if phase in totals), total
+    )
+
+    conn = warehouse.connect(db_path)
+    try:
+        _ensure_tables(conn)
+        cursor = conn.execute(
+            "INSERT INTO scrape_runs (started_at, engine, horizon_days, windows, status, total_seconds) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run.started_at, run.engine, run.horizon_days, run.windows, status, round(total, 3))
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO scrape_run_spans (run_id, phase, seconds, succeeded) VALUES (?, ?, ?, ?)",
+            [(run_id, phase, round(seconds, 3), int(succeeded)) for phase, seconds, succeeded in run.spans]
+        )
+        conn.commit()
+    except Exception as e:
+        logger.warning("Could not save scrape timings: %s", e)
+        run_id = None
+    finally:
+        conn.close()
+    return run_id
+
+def phase_percentiles(limit=DEFAULT_RECENT_RUNS, status='success', db_path=None):
+    """
+    p50/p95 seconds per phase over the most recent limit runs. A phase's time
+    in a run is the sum of its spans across windows; 'total' is the run's
+    wall time.
+    """
+    conn = warehouse.connect(db_path)
+    try:
+        _ensure_tables(conn)
+        query = "SELECT run_id, total_seconds FROM scrape_runs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY run_id DESC LIMIT ?"
+        params.append(limit)
+        runs = pd.read_sql_query(query, conn, params=params)
+        if runs.empty:
+            return {'runs': 0, 'phases': {}}
+
+        placeholders = ', '.join('?' for _ in range(len(runs)))
+        spans = pd.read_sql_query(
+            f"SELECT run_id, phase, SUM(seconds) AS seconds FROM scrape_run_spans "
+            f"WHERE run_id IN ({placeholders}) GROUP BY run_id, phase",
+            conn, params=[int(run_id) for run_id in runs['run_id']]
+        )
+    finally:
+        conn.close()
+
+    per_phase = {phase: group['seconds'] for phase, group in spans.groupby('phase')}
+    per_phase['total'] = runs['total_seconds']
+    order = [phase for phase in PHASES if phase in per_phase]
+    order += sorted(phase for phase in per_phase if phase not in order and phase != 'total')
+    order.append('total')
+
+    phases = {}
+    for phase in order:
+        values = per_phase[phase]
+        phases[phase] = {
+            'runs': int(values.count()),
+            'p50': round(float(values.quantile(0.5)), 3),
+            'p95': round(float(values.quantile(0.95)), 3)
+        }
+    return {'runs': len(runs), 'phases': phases}
+
+def recent_runs(limit=20, db_path=None):
+    """The most recent runs with their per-phase totals"""
+    conn = warehouse.connect(db_path, row_factory=sqlite3.Row)
+    try:
+        _ensure_tables(conn)
+        runs = [dict(row) for row in conn.execute(
+            "SELECT * FROM scrape_runs ORDER BY run_id DESC LIMIT ?", (limit,)
+        )]
+        for run in runs:
+            run['phases'] = {
+                row['phase']: round(row['seconds'], 3) for row in conn.execute(
+                    "SELECT phase, SUM(seconds) AS seconds FROM scrape_run_spans "
+                    "WHERE run_id = ? GROUP BY phase", (run['run_id'],)
+                )
+            }
+    finally:
+        conn.close()
+    return runs
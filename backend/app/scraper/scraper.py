@@ -1,18 +1,28 @@
-from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException
+import logging
 import time
 import pandas as pd
 from .process_pms_inventory import process_pms_inventory
+from .pms_config import PMS_USERNAME, PMS_PASSWORD, pms_url, require_credentials
+from .driver_pool import get_pool, login_sessions
+from .driver_factory import create_driver
+from .scrape_metrics import span, start_run, finish_run
+from . import warehouse
+from .inventory_store import upsert_by_date, read_table, has_changes
+from .readiness import (
+    install_network_tracker, wait_for_network_idle, wait_for_dom_settled, wait_for_value_change,
+    wait_for_value, wait_for_text_change, get_wait_timings, log_wait_summary, timed_wait, TABLE_HAS_DATA_PREDICATE
+)
 import os
-import sqlite3
-import platform
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
 
 def wait_for_toast_disappear(driver, timeout=10):
     """Wait for toast notifications to disappear"""
@@ -37,10 +47,10 @@ def wait_for_element_presence(driver, by, value, timeout=10, description="elemen
         )
         return element
     except TimeoutException:
-        print(f"Timeout waiting for {description} to be present")
+        logger.warning("Timeout waiting for %s to be present", description)
         return None
     except Exception as e:
-        print(f"Error finding {description}: {e}")
+        logger.error("Error finding %s: %s", description, e)
         return None
 
 def wait_and_click(driver, by, value, timeout=10, description="element"):
@@ -57,30 +67,30 @@ def wait_and_click(driver, by, value, timeout=10, description="element"):
         element.click()
         return True
     except TimeoutException:
-        print(f"Timeout waiting for {description} to be clickable")
+        logger.warning("Timeout waiting for %s to be clickable", description)
         return False
     except ElementClickInterceptedException:
-        print(f"Click intercepted on {description}, trying JavaScript click")
+        logger.warning("Click intercepted on %s, trying JavaScript click", description)
         try:
             driver.execute_script("arguments[0].click();", element)
             return True
         except Exception as e:
-            print(f"JavaScript click failed: {e}")
+            logger.warning("JavaScript click failed: %s", e)
             return False
     except Exception as e:
-        print(f"Error clicking {description}: {e}")
+        logger.error("Error clicking %s: %s", description, e)
         return False
 
 def wait_for_table_load(driver, timeout=20):
     """Wait for table to be loaded with data"""
     try:
-        print("Waiting for table to load...")
+        logger.info("Waiting for table to load...")
         
         # Wait for table presence
         table = WebDriverWait(driver, timeout).until(
             EC.presence_of_element_located((By.ID, "tableRoomAvaibility"))
         )
-        print("Table element found")
+        logger.debug("Table element found")
         
         # Wait for loading indicator to disappear (if present)
         try:
@@ -90,394 +100,753 @@ def wait_for_table_load(driver, timeout=20):
         except:
             pass  # No loading indicator found
         
-        # Wait for table to have data rows
-        def table_has_data(driver):
-            rows = driver.find_elements(By.CSS_SELECTOR, "#tableRoomAvaibility tbody tr")
-            return len(rows) > 1 and any(cell.text.strip() for cell in rows[1].find_elements(By.TAG_NAME, "td"))
-        
-        WebDriverWait(driver, timeout).until(table_has_data)
-        print("Table has data rows")
-        
-        # Additional wait to ensure all cells are populated
-        def cells_are_populated(driver):
-            cells = driver.find_elements(By.CSS_SELECTOR, "#tableRoomAvaibility td")
-            return len(cells) > 0 and all(cell.text.strip() for cell in cells[:10])  # Check first 10 cells
-        
-        WebDriverWait(driver, timeout).until(cells_are_populated)
-        print("Table cells are populated")
-        
-        # Small delay to ensure any animations or final updates are complete
-        time.sleep(1)
+        # Wait until a data row is populated and the table has stopped changing,
+        # watched by a MutationObserver inside the page
+        wait_for_dom_settled(driver, "#tableRoomAvaibility", quiet_ms=300, timeout=timeout,
+                             predicate=TABLE_HAS_DATA_PREDICATE, name="table data")
+        logger.debug("Table cells are populated")
         
         return table
     except Exception as e:
-        print(f"Error waiting for table load: {e}")
+        logger.error("Error waiting for table load: %s", e)
         return None
 
+# Days requested per Room Availability search and default parallel windows
+WINDOW_DAYS = 100
+DEFAULT_CONCURRENCY = 2
+# Upper bounds for one scrape: each concurrent Selenium window is a Chrome instance
+MAX_CONCURRENCY = 4
+MAX_HORIZON_DAYS = 730
+
+# Numeric columns of the Room Availability table
+NUMERIC_COLUMNS = ['DLK', 'DLT', 'DLKP', 'DLTP', 'PRKG', 'PRKP', 'PRTG', 'PRTP', 'PRKL', 'PRTL',
+                   'Extra Bed', 'Total Room', 'Available', 'Tentative', 'Definite', 'Waiting List', 
+                   'Allotment', 'Out of Order']
+
+# Serializes the whole table inside the browser so extraction costs a single
+# WebDriver round trip instead of one per row and cell
+TABLE_EXTRACTION_SCRIPT = """
+    const table = arguments[0];
+    const rows = Array.from(table.querySelectorAll('tr'));
+    if (rows.length === 0) {
+        return {headers: [], rows: []};
+    }
+    const headers = Array.from(rows[0].querySelectorAll('th')).map(th => th.innerText.trim());
+    const data = [];
+    for (let i = 1; i < rows.length; i++) {
+        const cells = Array.from(rows[i].querySelectorAll('td')).map(td => td.innerText.trim());
+        if (cells.length > 0) {
+            data.push(cells);
+        }
+    }
+    return {headers: headers, rows: data};
+"""
+
+class WebDriverCallCounter:
+    """Context manager counting the WebDriver commands (HTTP round trips) a driver issues"""
+    def __init__(self, driver):
+        self.driver = driver
+        self.calls = 0
+
+    def __enter__(self):
+        original_execute = self.driver.execute
+
+        def counting_execute(driver_command, params=None):
+            self.calls += 1
+            return original_execute(driver_command, params)
+
+        self.driver.execute = counting_execute
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Drop the instance attribute so the class method is used again
+        del self.driver.execute
+        return False
+
+def _extract_table_webdriver(table):
+    """Legacy extraction: one WebDriver call per row and per cell"""
+    rows = table.find_elements(By.TAG_NAME, "tr")
+    if not rows:
+        return [], []
+    headers = [th.text for th in rows[0].find_elements(By.TAG_NAME, "th")]
+    data = []
+    for row in rows[1:]:  # Skip header row
+        cols = row.find_elements(By.TAG_NAME, "td")
+        row_data = [col.text for col in cols]
+        if row_data:  # Only add non-empty rows
+            data.append(row_data)
+    return headers, data
+
+def _extract_table_script(driver, table):
+    """Extract headers and cells with a single in-page script"""
+    result = driver.execute_script(TABLE_EXTRACTION_SCRIPT, table)
+    return result['headers'], result['rows']
+
+def _extract_table_html(table):
+    """Fetch the table's outerHTML once and parse it with lxml"""
+    from lxml import html as lxml_html
+
+    root = lxml_html.fromstring(table.get_attribute('outerHTML'))
+    rows = root.xpath('.//tr')
+    if not rows:
+        return [], []
+    headers = [th.text_content().strip() for th in rows[0].xpath('./th')]
+    data = []
+    for row in rows[1:]:
+        row_data = [td.text_content().strip() for td in row.xpath('./td')]
+        if row_data:
+            data.append(row_data)
+    return headers, data
+
+def extract_table_data(driver, table, mode='script'):
+    """
+    Extract (headers, rows) from the Room Availability table.
+
+    mode='script' serializes the table in the browser with one execute_script,
+    mode='html' parses the outerHTML with lxml, and mode='webdriver' is the
+    original per-cell walk kept for comparison.
+    """
+    if mode == 'script':
+        headers, data = _extract_table_script(driver, table)
+    elif mode == 'html':
+        headers, data = _extract_table_html(table)
+    elif mode == 'webdriver':
+        headers, data = _extract_table_webdriver(table)
+    else:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+    
+    if not headers:
+        raise Exception("No headers found in table")
+    if not data:
+        raise Exception("No data rows found in table")
+    return headers, data
+
+def build_inventory_dataframe(headers, data):
+    """Create the raw inventory DataFrame and coerce the numeric columns"""
+    df = pd.DataFrame(data, columns=headers)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+def benchmark_table_extraction(driver, table, modes=('webdriver', 'html', 'script')):
+    """
+    Run every extraction mode against an already loaded table and report the
+    number of WebDriver round trips and the elapsed time of each.
+    """
+    results = {}
+    for mode in modes:
+        with WebDriverCallCounter(driver) as counter:
+            start = time.perf_counter()
+            headers, data = extract_table_data(driver, table, mode=mode)
+            elapsed = time.perf_counter() - start
+        results[mode] = {
+            'round_trips': counter.calls,
+            'seconds': round(elapsed, 3),
+            'rows': len(data),
+            'columns': len(headers)
+        }
+        logger.info(
+            "Extraction [%s]: %s WebDriver round trips, %.3fs, %s rows x %s columns",
+            mode, counter.calls, elapsed, len(data), len(headers)
+        )
+    return results
+
 def setup_driver():
-    # Set up Chrome options
-    chrome_options = Options()
-    chrome_options.add_argument('--headless=new')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('--start-maximized')
-    chrome_options.add_argument('--disable-gpu')  # Required for headless on some systems
-    chrome_options.add_argument('--disable-software-rasterizer')  # Better performance in headless
+    # Headless lean profile with images, fonts and analytics blocked
+    return create_driver(headless=True)
+
+def login(driver, username=PMS_USERNAME, password=PMS_PASSWORD):
+    """Log in through the PMS login form"""
+    require_credentials(username, password)
+    # Navigate to the website
+    driver.get(pms_url())
+    logger.info("Navigating to Hospitality Suite website...")
+    
+    # Wait for page to load completely
+    wait_for_page_load(driver)
+    
+    # Wait for the username field to be present and interactable
+    username_field = wait_for_element_presence(driver, By.ID, "txtUsername", timeout=15, description="username field")
+    if not username_field:
+        raise Exception("Username field not found")
+    
+    # Ensure the field is interactable
+    WebDriverWait(driver, 5).until(
+        EC.element_to_be_clickable((By.ID, "txtUsername"))
+    )
+    username_field.clear()
+    username_field.send_keys(username)
     
-    # Add specific options for Mac ARM64
-    if platform.system() == 'Darwin' and platform.machine() == 'arm64':
-        chrome_options.binary_location = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
+    password_field = driver.find_element(By.ID, "txtPassword")
+    password_field.clear()
+    password_field.send_keys(password)
     
-    # Initialize the Chrome driver
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    # Click the login button
+    if not wait_and_click(driver, By.ID, "btnLogin", description="login button"):
+        raise Exception("Failed to click login button")
+    
+    logger.info("Login credentials entered...")
+    
+    # Wait for login to complete
+    wait_for_page_load(driver)
+    wait_for_toast_disappear(driver)
+    
+    logger.info("Successfully logged in!")
+    login_sessions.save(username, password, driver)
 
-def scrape_pms_inventory(start_date=None):
+def is_login_page(driver):
+    """True when the PMS redirected to the login form"""
+    return bool(driver.find_elements(By.ID, "txtUsername"))
+
+def open_authenticated_page(driver, path, username=PMS_USERNAME, password=PMS_PASSWORD):
     """
-    Scrape PMS inventory data from the website
+    Open a PMS page, reusing saved login cookies when they are still within
+    the session TTL and falling back to the login form otherwise.
     """
-    # Get the absolute path to the data directory within the scraper folder
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, 'data')
-    os.makedirs(data_dir, exist_ok=True)
+    with span('login'):
+        restored = login_sessions.restore(username, password, driver, pms_url())
+    if restored:
+        with span('navigation'):
+            driver.get(pms_url(path))
+            wait_for_page_load(driver)
+        if not is_login_page(driver):
+            logger.info("Reused existing login session")
+            return
+        logger.warning("Saved login session expired")
+        login_sessions.invalidate(username)
     
-    driver = setup_driver()
-    try:
-        # Navigate to the website
-        driver.get("https://fo.hospitality.mykg.id/")
-        print("Navigating to Hospitality Suite website...")
-        
-        # Wait for page to load completely
+    with span('login'):
+        login(driver, username, password)
+    with span('navigation'):
+        driver.get(pms_url(path))
         wait_for_page_load(driver)
-        
-        # Wait for the username field to be present and interactable
-        username_field = wait_for_element_presence(driver, By.ID, "txtUsername", timeout=15, description="username field")
-        if not username_field:
-            raise Exception("Username field not found")
-        
-        # Ensure the field is interactable
-        WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable((By.ID, "txtUsername"))
-        )
-        username_field.clear()
-        username_field.send_keys("krisnatha")
-        
-        password_field = driver.find_element(By.ID, "txtPassword")
-        password_field.clear()
-        password_field.send_keys("Nasibungkus13")
-        
-        # Click the login button
-        if not wait_and_click(driver, By.ID, "btnLogin", description="login button"):
-            raise Exception("Failed to click login button")
-        
-        print("Login credentials entered...")
-        
-        # Wait for login to complete
-        wait_for_page_load(driver)
-        wait_for_toast_disappear(driver)
-        
-        print("Successfully logged in!")
-        
-        # Navigate directly to Room Availability page
-        print("Navigating to Room Availability page...")
-        driver.get("https://fo.hospitality.mykg.id/RoomAvailable/index")
-        wait_for_page_load(driver)
-        
-        # Wait for and click the date picker to open it
-        date_picker = wait_for_element_presence(driver, By.CSS_SELECTOR, "input[type='text'][readonly]", 
-                                              timeout=15, description="date picker input")
-        if not date_picker:
-            raise Exception("Date picker input not found")
-        
-        # Wait for navbar to be fully loaded
-        navbar = wait_for_element_presence(driver, By.CLASS_NAME, "navbar-fixed-top", 
-                                         timeout=10, description="navbar")
-        if navbar:
-            # Get navbar height
-            navbar_height = navbar.size['height']
-            print(f"Navbar height: {navbar_height}")
-            
-            # Scroll the page to ensure date picker is below navbar
-            driver.execute_script(f"window.scrollTo(0, {navbar_height + 50});")
-            time.sleep(1)  # Wait for scroll to complete
-        
-        # Try to set the date by interacting with the calendar UI
+
+# Sets the date picker's v-model and resolves after Vue has re-rendered,
+# returning the input's new value (null when the binding can't be found).
+# The bound expression is read from the v-model directive on the input's
+# vnode (or taken from arguments[2]) and assigned on the vnode's context.
+DATE_INJECTION_SCRIPT = """
+    const input = arguments[0];
+    const value = arguments[1];
+    let expression = arguments[2];
+    const done = arguments[arguments.length - 1];
+
+    let vm = null;
+    for (let el = input; el && !vm; el = el.parentElement) {
+        vm = el.__vue__ || null;
+    }
+    if (!vm) {
+        done(null);
+        return;
+    }
+    const findVnode = (vnode) => {
+        if (!vnode) {
+            return null;
+        }
+        if (vnode.elm === input && vnode.data) {
+            return vnode;
+        }
+        for (const child of vnode.children || []) {
+            const found = findVnode(child);
+            if (found) {
+                return found;
+            }
+        }
+        return null;
+    };
+    let context = vm;
+    for (let c = vm; c && !expression; c = c.$parent) {
+        const vnode = findVnode(c._vnode);
+        if (!vnode) {
+            continue;
+        }
+        const model = (vnode.data.directives || []).find(d => d.name === 'model');
+        if (model && model.expression) {
+            expression = model.expression;
+            context = vnode.context || c;
+        }
+    }
+    const path = expression ? expression.split('.') : [];
+    if (!path.length || !/^[A-Za-z_$][\\w$]*$/.test(path.join('_'))) {
+        done(null);
+        return;
+    }
+    let target = context;
+    for (const key of path.slice(0, -1)) {
+        target = target[key];
+        if (target == null) {
+            done(null);
+            return;
+        }
+    }
+    target[path[path.length - 1]] = value;
+    vm.$nextTick(() => done(input.value));
+"""
+
+# Format of the Room Availability date input
+DATE_INPUT_FORMAT = '%d-%b-%Y'
+# v-model expression of the date input; None reads it from the input's vnode
+DATE_MODEL_EXPRESSION = None
+
+def inject_date(driver, date_picker, target_date):
+    """
+    Write target_date straight into the date picker's Vue model in one
+    script call. Returns True only when the input then shows the target date.
+    """
+    current_value = date_picker.get_attribute('value')
+    try:
+        datetime.strptime(current_value, DATE_INPUT_FORMAT)
+    except (ValueError, TypeError):
+        logger.warning("Unrecognised date picker value '%s', cannot inject", current_value)
+        return False
+    
+    value = target_date.strftime(DATE_INPUT_FORMAT)
+    if current_value == value:
+        return True
+    
+    driver.set_script_timeout(5)
+    new_value = driver.execute_async_script(DATE_INJECTION_SCRIPT, date_picker, value, DATE_MODEL_EXPRESSION)
+    if new_value is None:
+        logger.warning("No v-model binding found for the date picker")
+        return False
+    try:
+        return datetime.strptime(new_value, DATE_INPUT_FORMAT).date() == target_date.date()
+    except ValueError:
+        return False
+
+def set_start_date(driver, date_picker, target_date):
+    """Set the search start date by injection, falling back to the calendar walk"""
+    try:
+        with timed_wait("date injection"):
+            injected = inject_date(driver, date_picker, target_date)
+    except Exception as e:
+        logger.warning("Date injection failed: %s", e)
+        injected = False
+    
+    if injected:
+        logger.info("Set start date to %s via Vue model", target_date.strftime('%d-%b-%Y'))
+        return
+    
+    logger.warning("Falling back to selecting the date in the calendar")
+    select_date_via_calendar(driver, date_picker, target_date)
+
+def select_date_via_calendar(driver, date_picker, target_date):
+    """Select target_date by walking the uiv calendar month by month (slow fallback)"""
+    day = target_date.day
+
+    # 1. Click the calendar button to open the date picker
+    calendar_btn = date_picker.find_element(By.XPATH, "../div[@class='input-group-btn']/button")
+    calendar_btn.click()
+    logger.debug("Clicked calendar button to open date picker")
+
+    # 2. Wait for the calendar dropdown to appear
+    calendar_dropdown = wait_for_element_presence(
+        driver, By.CSS_SELECTOR, "ul.dropdown-menu .uiv-datepicker", timeout=10, description="calendar dropdown")
+    if not calendar_dropdown:
+        raise Exception("Calendar dropdown not found")
+
+    # 2.1. Navigate to the correct month and year
+    month_names = [
+        'January', 'February', 'March', 'April', 'May', 'June',
+        'July', 'August', 'September', 'October', 'November', 'December'
+    ]
+    target_month = month_names[target_date.month - 1]
+    target_year = str(target_date.year)
+    max_nav_attempts = 24  # Prevent infinite loops
+    for _ in range(max_nav_attempts):
+        # Read the current month/year from the header
+        header_btn = calendar_dropdown.find_element(By.CSS_SELECTOR, ".uiv-datepicker-title")
+        header_text = header_btn.text.strip()
+        # Example: '2024 February' or '2025 May'
+        if ' ' in header_text:
+            current_year, current_month = header_text.split(' ', 1)
+        else:
+            current_year, current_month = '', ''
+        current_month = current_month.strip()
+        current_year = current_year.strip()
+        if current_month == target_month and current_year == target_year:
+            break  # We're at the right month/year
+        # Find next/prev buttons (first and last <td> in the header row)
+        header_row = calendar_dropdown.find_element(By.TAG_NAME, "thead").find_elements(By.TAG_NAME, "tr")[0]
+        tds = header_row.find_elements(By.TAG_NAME, "td")
+        prev_btn = tds[0].find_element(By.TAG_NAME, "button")
+        next_btn = tds[-1].find_element(By.TAG_NAME, "button")
+        # Decide which direction to go
+        target_dt = int(target_year) * 12 + month_names.index(target_month)
+        current_dt = int(current_year) * 12 + month_names.index(current_month)
+        if target_dt > current_dt:
+            next_btn.click()
+        else:
+            prev_btn.click()
+        wait_for_text_change(driver, header_btn, header_text, name="calendar month change")
+    else:
+        raise Exception("Could not navigate to the correct month/year in the calendar")
+
+    # 3. Find and click the correct day button (skip text-muted)
+    day_found = False
+    previous_date_value = date_picker.get_attribute('value')
+    day_buttons = calendar_dropdown.find_elements(By.CSS_SELECTOR, "button[data-action='select']")
+    for btn in day_buttons:
         try:
-            if start_date:
-                target_date = datetime.strptime(start_date, '%Y-%m-%d')
-            else:
-                target_date = datetime.now()
-            formatted_date = target_date.strftime('%d-%b-%Y')
-            day = target_date.day
-            month = target_date.strftime('%b')
-            year = target_date.year
-
-            # 1. Click the calendar button to open the date picker
-            calendar_btn = date_picker.find_element(By.XPATH, "../div[@class='input-group-btn']/button")
-            calendar_btn.click()
-            print("Clicked calendar button to open date picker")
-            time.sleep(1)
-
-            # 2. Wait for the calendar dropdown to appear
-            calendar_dropdown = wait_for_element_presence(
-                driver, By.CSS_SELECTOR, "ul.dropdown-menu .uiv-datepicker", timeout=10, description="calendar dropdown")
-            if not calendar_dropdown:
-                raise Exception("Calendar dropdown not found")
-
-            # 2.1. Navigate to the correct month and year
-            month_names = [
-                'January', 'February', 'March', 'April', 'May', 'June',
-                'July', 'August', 'September', 'October', 'November', 'December'
-            ]
-            target_month = month_names[target_date.month - 1]
-            target_year = str(target_date.year)
-            max_nav_attempts = 24  # Prevent infinite loops
-            for _ in range(max_nav_attempts):
-                # Read the current month/year from the header
-                header_btn = calendar_dropdown.find_element(By.CSS_SELECTOR, ".uiv-datepicker-title")
-                header_text = header_btn.text.strip()
-                # Example: '2024 February' or '2025 May'
-                if ' ' in header_text:
-                    current_year, current_month = header_text.split(' ', 1)
-                else:
-                    current_year, current_month = '', ''
-                current_month = current_month.strip()
-                current_year = current_year.strip()
-                if current_month == target_month and current_year == target_year:
-                    break  # We're at the right month/year
-                # Find next/prev buttons (first and last <td> in the header row)
-                header_row = calendar_dropdown.find_element(By.TAG_NAME, "thead").find_elements(By.TAG_NAME, "tr")[0]
-                tds = header_row.find_elements(By.TAG_NAME, "td")
-                prev_btn = tds[0].find_element(By.TAG_NAME, "button")
-                next_btn = tds[-1].find_element(By.TAG_NAME, "button")
-                # Decide which direction to go
-                target_dt = int(target_year) * 12 + month_names.index(target_month)
-                current_dt = int(current_year) * 12 + month_names.index(current_month)
-                if target_dt > current_dt:
-                    next_btn.click()
+            span = btn.find_element(By.TAG_NAME, "span")
+            # Skip if span or button has 'text-muted' class
+            if 'text-muted' in span.get_attribute('class') or 'text-muted' in btn.get_attribute('class'):
+                continue
+            if span.text == str(day):
+                btn.click()
+                logger.debug("Selected day %s in calendar (not muted)", day)
+                day_found = True
+                break
+        except Exception:
+            continue
+    if not day_found:
+        raise Exception(f"Could not find day {day} in calendar (non-muted)")
+
+    # Wait for Vue to update the input
+    try:
+        wait_for_value_change(driver, date_picker, previous_date_value, name="date picker value")
+    except TimeoutException:
+        # Re-selecting the date that is already shown leaves the value unchanged
+        logger.warning("Date picker value unchanged, continuing")
+
+def _scrape_inventory_selenium(start_date, data_dir, days=WINDOW_DAYS, extraction_mode='script', benchmark_extraction=False):
+    """Drive the Room Availability page in Chrome and return the raw inventory DataFrame"""
+    pool = get_pool('headless', setup_driver)
+    with span('driver_start'):
+        driver = pool.checkout()
+    discard_driver = False
+    get_wait_timings(reset=True)
+    try:
+        # Navigate directly to Room Availability page, logging in only if needed
+        logger.info("Navigating to Room Availability page...")
+        open_authenticated_page(driver, "RoomAvailable/index")
+        
+        with span('navigation'):
+            # Wait for and click the date picker to open it
+            date_picker = wait_for_element_presence(driver, By.CSS_SELECTOR, "input[type='text'][readonly]", 
+                                                  timeout=15, description="date picker input")
+            if not date_picker:
+                raise Exception("Date picker input not found")
+        
+            # Wait for navbar to be fully loaded
+            navbar = wait_for_element_presence(driver, By.CLASS_NAME, "navbar-fixed-top", 
+                                             timeout=10, description="navbar")
+            if navbar:
+                # Get navbar height
+                navbar_height = navbar.size['height']
+                logger.debug("Navbar height: %s", navbar_height)
+            
+                # Scroll the page to ensure date picker is below navbar
+                # scrollTo is synchronous, no need to wait afterwards
+                driver.execute_script(f"window.scrollTo(0, {navbar_height + 50});")
+        
+        # Set the start date, injecting it into the Vue model when possible
+        with span('date_selection'):
+            try:
+                if start_date:
+                    target_date = datetime.strptime(start_date, '%Y-%m-%d')
                 else:
-                    prev_btn.click()
-                time.sleep(0.5)
-            else:
-                raise Exception("Could not navigate to the correct month/year in the calendar")
-
-            # 3. Find and click the correct day button (skip text-muted)
-            day_found = False
-            day_buttons = calendar_dropdown.find_elements(By.CSS_SELECTOR, "button[data-action='select']")
-            for btn in day_buttons:
-                try:
-                    span = btn.find_element(By.TAG_NAME, "span")
-                    # Skip if span or button has 'text-muted' class
-                    if 'text-muted' in span.get_attribute('class') or 'text-muted' in btn.get_attribute('class'):
-                        continue
-                    if span.text == str(day):
-                        btn.click()
-                        print(f"Selected day {day} in calendar (not muted)")
-                        day_found = True
-                        break
-                except Exception:
-                    continue
-            if not day_found:
-                raise Exception(f"Could not find day {day} in calendar (non-muted)")
-
-            # Wait for Vue to update the input
-            time.sleep(2)
-
-            # Change days to 100 with retry mechanism (moved here to prevent reset)
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    days_input = wait_for_element_presence(driver, By.CSS_SELECTOR, "input[type='number']", 
-                                                         timeout=15, description="days input")
-                    if not days_input:
-                        raise Exception("Days input field not found")
+                    target_date = datetime.now()
+            
+                set_start_date(driver, date_picker, target_date)
+
+                # Change days to the window length with retry mechanism (moved here to prevent reset)
+                days_value = str(days)
+                max_attempts = 3
+                for attempt in range(max_attempts):
+                    try:
+                        days_input = wait_for_element_presence(driver, By.CSS_SELECTOR, "input[type='number']", 
+                                                             timeout=15, description="days input")
+                        if not days_input:
+                            raise Exception("Days input field not found")
                     
-                    # Clear and set the value using JavaScript
-                    driver.execute_script("""
-                        const input = arguments[0];
-                        const value = arguments[1];
+                        # Clear and set the value using JavaScript
+                        driver.execute_script("""
+                            const input = arguments[0];
+                            const value = arguments[1];
                         
-                        // Clear the input
-                        input.value = '';
+                            // Clear the input
+                            input.value = '';
                         
-                        // Set the new value
-                        input.value = value;
+                            // Set the new value
+                            input.value = value;
                         
-                        // Create and dispatch input event
-                        const inputEvent = new Event('input', { bubbles: true });
-                        input.dispatchEvent(inputEvent);
+                            // Create and dispatch input event
+                            const inputEvent = new Event('input', { bubbles: true });
+                            input.dispatchEvent(inputEvent);
                         
-                        // Create and dispatch change event
-                        const changeEvent = new Event('change', { bubbles: true });
-                        input.dispatchEvent(changeEvent);
+                            // Create and dispatch change event
+                            const changeEvent = new Event('change', { bubbles: true });
+                            input.dispatchEvent(changeEvent);
                         
-                        // Trigger Vue's reactivity if available
-                        if (input.__vue__) {
-                            input.__vue__.$emit('input', value);
-                            input.__vue__.$emit('change', value);
-                        }
-                    """, days_input, "100")
+                            // Trigger Vue's reactivity if available
+                            if (input.__vue__) {
+                                input.__vue__.$emit('input', value);
+                                input.__vue__.$emit('change', value);
+                            }
+                        """, days_input, days_value)
                     
-                    # Verify the value was set correctly
-                    time.sleep(1)
-                    actual_value = days_input.get_attribute('value')
-                    if actual_value == "100":
-                        print("Successfully set days to 100")
-                        break
-                    else:
-                        print(f"Days value not set correctly. Expected 100, got {actual_value}")
-                        if attempt < max_attempts - 1:
-                            print("Retrying...")
-                            time.sleep(1)
+                        # Verify the value was set correctly
+                        try:
+                            wait_for_value(driver, days_input, days_value, timeout=3, name="days input value")
+                        except TimeoutException:
+                            pass
+                        actual_value = days_input.get_attribute('value')
+                        if actual_value == days_value:
+                            logger.info("Successfully set days to %s", days_value)
+                            break
                         else:
-                            raise Exception("Failed to set days value after multiple attempts")
+                            logger.warning(
+                                "Days value not set correctly. Expected %s, got %s",
+                                days_value, actual_value
+                            )
+                            if attempt < max_attempts - 1:
+                                logger.warning("Retrying...")
+                            else:
+                                raise Exception("Failed to set days value after multiple attempts")
                             
-                except Exception as e:
-                    if attempt < max_attempts - 1:
-                        print(f"Attempt {attempt + 1} failed: {str(e)}")
-                        time.sleep(1)
-                    else:
-                        raise Exception(f"Failed to set days value: {str(e)}")
+                    except Exception as e:
+                        if attempt < max_attempts - 1:
+                            logger.warning("Attempt %s failed: %s", attempt + 1, e)
+                        else:
+                            raise Exception(f"Failed to set days value: {str(e)}")
 
-        except Exception as e:
-            print(f"Error setting date via calendar: {str(e)}")
-            raise Exception(f"Failed to set date via calendar: {str(e)}")
+            except Exception as e:
+                logger.error("Error setting date via calendar: %s", e)
+                raise Exception(f"Failed to set date via calendar: {str(e)}")
         
         # Click search button and wait for results
-        if not wait_and_click(driver, By.ID, "btnSearchRsv", timeout=15, description="search button"):
-            raise Exception("Failed to click search button")
-        print("Clicked search button")
-        
-        # Add longer wait time for table to fully load
-        print("Waiting for table to fully load...")
-        time.sleep(6)  # Wait 6 seconds for full table load
+        with span('search'):
+            install_network_tracker(driver)
+            if not wait_and_click(driver, By.ID, "btnSearchRsv", timeout=15, description="search button"):
+                raise Exception("Failed to click search button")
+            logger.debug("Clicked search button")
+        
+            # Wait for the search request to finish instead of a fixed delay
+            logger.info("Waiting for table to fully load...")
+            try:
+                wait_for_network_idle(driver, idle_ms=300, timeout=30, name="search response")
+            except TimeoutException:
+                logger.warning("Network did not go idle, checking the table anyway")
         
         # Wait for table to load with more detailed status updates
-        table = wait_for_table_load(driver)
+        with span('table_wait'):
+            table = wait_for_table_load(driver)
         if not table:
             raise Exception("Failed to load table data")
         
-        print("Table loaded successfully, extracting data...")
-        
-        # Get all rows
-        rows = table.find_elements(By.TAG_NAME, "tr")
-        if len(rows) <= 1:
-            raise Exception("Table has no data rows")
-        
-        # Extract headers
-        headers = [th.text for th in rows[0].find_elements(By.TAG_NAME, "th")]
-        if not headers:
-            raise Exception("No headers found in table")
-        
-        # Extract data
-        data = []
-        for row in rows[1:]:  # Skip header row
-            cols = row.find_elements(By.TAG_NAME, "td")
-            row_data = [col.text for col in cols]
-            if row_data:  # Only add non-empty rows
-                data.append(row_data)
-        
-        if not data:
-            raise Exception("No data rows found in table")
-        
-        # Create DataFrame
-        df = pd.DataFrame(data, columns=headers)
+        logger.info("Table loaded successfully, extracting data...")
         
-        # Convert numeric columns to appropriate types
-        numeric_columns = ['DLK', 'DLT', 'DLKP', 'DLTP', 'PRKG', 'PRKP', 'PRTG', 'PRTP', 'PRKL', 'PRTL',
-                         'Extra Bed', 'Total Room', 'Available', 'Tentative', 'Definite', 'Waiting List', 
-                         'Allotment', 'Out of Order']
+        if benchmark_extraction:
+            benchmark_table_extraction(driver, table)
         
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        with span('extraction'):
+            headers, data = extract_table_data(driver, table, mode=extraction_mode)
+            df = build_inventory_dataframe(headers, data)
         
-        print("\nScraping completed successfully!")
-        
-        # Save raw data to CSV
-        csv_path = os.path.join(data_dir, 'pms_inventory.csv')
-        df.to_csv(csv_path, index=False)
-        print(f"Raw data saved to {csv_path}")
-        
-        # Save to SQLite database
-        db_path = os.path.join(data_dir, 'pms_inventory_raw.db')
-        conn = sqlite3.connect(db_path)
-        
-        # Define data types for each column
-        dtype_dict = {
-            'Date': 'DATE',
-            'AVR': 'INTEGER',
-            'AVS': 'INTEGER',
-            'ASP': 'INTEGER',
-            'ASW': 'INTEGER',
-            'AVP': 'INTEGER',
-            'BFS': 'INTEGER',
-            'DLK': 'INTEGER',
-            'DLT': 'INTEGER',
-            'DLKP': 'INTEGER',
-            'DLTP': 'INTEGER',
-            'DLS': 'INTEGER',
-            'FAM': 'INTEGER',
-            'PRKG': 'INTEGER',
-            'PRKP': 'INTEGER',
-            'PRTG': 'INTEGER',
-            'PRTP': 'INTEGER',
-            'PRKL': 'INTEGER',
-            'PRTL': 'INTEGER',
-            'PSU': 'INTEGER',
-            'Extra Bed': 'INTEGER',
-            'Total Room': 'INTEGER',
-            'Available': 'INTEGER',
-            'Tentative': 'INTEGER',
-            'Definite': 'INTEGER',
-            'Waiting List': 'INTEGER',
-            'Allotment': 'INTEGER',
-            'Out of Order': 'INTEGER'
-        }
-        
-        # Save DataFrame to SQLite
-        df.to_sql('pms_inventory', conn, if_exists='replace', index=False, dtype=dtype_dict)
-        conn.close()
-        print(f"Raw data saved to {db_path}")
-        
-        # Process the inventory data
-        print("\nStarting inventory data processing...")
-        processed_df = process_pms_inventory(df)
-        print("Processed data saved to CSV and database")
-        
-        return processed_df
+        logger.info("Scraping completed successfully!")
+        return df
         
     except Exception as e:
-        print(f"An error occurred: {str(e)}")
+        logger.error("An error occurred: %s", e)
         # Take screenshot on error
         try:
             screenshot_path = os.path.join(data_dir, 'error_screenshot.png')
             driver.save_screenshot(screenshot_path)
-            print(f"Error screenshot saved to {screenshot_path}")
+            logger.error("Error screenshot saved to %s", screenshot_path)
         except:
             pass
+        # The page state is unknown after a failure, so don't hand this driver out again
+        discard_driver = True
         return None
     finally:
-        driver.quit()
-        print("Browser closed")
+        log_wait_summary(get_wait_timings(reset=True))
+        pool.release(driver, discard=discard_driver)
+        logger.info("Browser returned to pool")
+
+def save_raw_inventory(df, data_dir):
+    """
+    Upsert the raw scrape into the warehouse pms_inventory table and refresh
+    pms_inventory.csv when anything changed. Returns the change set.
+    """
+    conn = warehouse.connect()
+    
+    # Define data types for each column
+    dtype_dict = {
+        'Date': 'DATE',
+        'AVR': 'INTEGER',
+        'AVS': 'INTEGER',
+        'ASP': 'INTEGER',
+        'ASW': 'INTEGER',
+        'AVP': 'INTEGER',
+        'BFS': 'INTEGER',
+        'DLK': 'INTEGER',
+        'DLT': 'INTEGER',
+        'DLKP': 'INTEGER',
+        'DLTP': 'INTEGER',
+        'DLS': 'INTEGER',
+        'FAM': 'INTEGER',
+        'PRKG': 'INTEGER',
+        'PRKP': 'INTEGER',
+        'PRTG': 'INTEGER',
+        'PRTP': 'INTEGER',
+        'PRKL': 'INTEGER',
+        'PRTL': 'INTEGER',
+        'PSU': 'INTEGER',
+        'Extra Bed': 'INTEGER',
+        'Total Room': 'INTEGER',
+        'Available': 'INTEGER',
+        'Tentative': 'INTEGER',
+        'Definite': 'INTEGER',
+        'Waiting List': 'INTEGER',
+        'Allotment': 'INTEGER',
+        'Out of Order': 'INTEGER'
+    }
+    
+    try:
+        # Only rows whose values changed are written
+        change_set = upsert_by_date(conn, 'pms_inventory', df, dtype_dict, track_pending=False)
+        logger.info("Raw data saved to %s", warehouse.WAREHOUSE_DB)
+        
+        # Export the full table so the CSV matches the database
+        csv_path = os.path.join(data_dir, 'pms_inventory.csv')
+        if has_changes(change_set) or not os.path.exists(csv_path):
+            read_table(conn, 'pms_inventory').to_csv(csv_path, index=False)
+            logger.info("Raw data saved to %s", csv_path)
+    finally:
+        conn.close()
+    return change_set
+
+def split_horizon(start_date, horizon_days, window_days=WINDOW_DAYS):
+    """Split a horizon into (window start 'YYYY-MM-DD', days) windows"""
+    if start_date:
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+    else:
+        start = datetime.now()
+    windows = []
+    offset = 0
+    while offset < horizon_days:
+        days = min(window_days, horizon_days - offset)
+        windows.append(((start + timedelta(days=offset)).strftime('%Y-%m-%d'), days))
+        offset += days
+    return windows
+
+def _parse_scraped_dates(dates):
+    """Parse the 'Tuesday, 08-Jul-2025' style dates of the availability table"""
+    for date_format in ('%A, %d-%b-%Y', '%A, %d-%B-%Y'):
+        try:
+            return pd.to_datetime(dates, format=date_format)
+        except (ValueError, TypeError):
+            continue
+    return pd.to_datetime(dates)
+
+def merge_windows(frames):
+    """Concatenate window results, de-duplicated by Date and sorted chronologically"""
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(subset='Date', keep='first')
+    order = _parse_scraped_dates(df['Date']).argsort()
+    return df.iloc[order].reset_index(drop=True)
+
+def _scrape_window(start_date, days, engine, data_dir, extraction_mode='script', benchmark_extraction=False):
+    """Scrape one window with the requested engine, falling back to Selenium"""
+    if engine == 'http':
+        from .http_scraper import scrape_pms_inventory_http
+        try:
+            return scrape_pms_inventory_http(start_date, days=days)
+        except Exception as e:
+            logger.warning("HTTP engine failed for window %s: %s", start_date, e)
+            logger.warning("Falling back to the Selenium engine...")
+    return _scrape_inventory_selenium(start_date, data_dir, days, extraction_mode, benchmark_extraction)
+
+def scrape_pms_inventory(start_date=None, engine='selenium', horizon_days=None, concurrency=DEFAULT_CONCURRENCY,
+                         window_days=WINDOW_DAYS, extraction_mode='script', benchmark_extraction=False):
+    """
+    Scrape PMS inventory data from the website
+
+    engine='http' logs in with a pooled requests session and reads the Room
+    Availability data endpoint directly; it is experimental (see
+    http_scraper) and the Selenium engine is used as a fallback whenever it
+    fails. Horizons longer than window_days are split into
+    windows that are scraped concurrently (up to concurrency browsers or
+    sessions at a time) and merged by Date. extraction_mode selects how the
+    availability table is read by the Selenium engine (see
+    extract_table_data). With benchmark_extraction=True every mode is run
+    once against the first loaded table and the round-trip counts are printed.
+    """
+    if engine not in ('selenium', 'http'):
+        raise ValueError(f"Unknown scrape engine: {engine}")
+    
+    # Get the absolute path to the data directory within the scraper folder
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(current_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    
+    if horizon_days and horizon_days > MAX_HORIZON_DAYS:
+        raise ValueError(f"horizon_days is limited to {MAX_HORIZON_DAYS}")
+    windows = split_horizon(start_date, horizon_days or window_days, window_days)
+    concurrency = max(1, min(concurrency, len(windows), MAX_CONCURRENCY))
+    if engine == 'selenium':
+        get_pool('headless', setup_driver).ensure_capacity(concurrency)
+    logger.info(
+        "Scraping %s window(s) of up to %s days with concurrency %s",
+        len(windows), window_days, concurrency
+    )
+    
+    # Phase timings of this run end up in the scrape_runs table
+    run = start_run(engine=engine, horizon_days=horizon_days or window_days, windows=len(windows))
+    processed_df = None
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(_scrape_window, window_start, days, engine, data_dir, extraction_mode,
+                                benchmark_extraction and index == 0)
+                for index, (window_start, days) in enumerate(windows)
+            ]
+            frames = [future.result() for future in futures]
+        
+        if any(frame is None for frame in frames):
+            logger.warning("One or more windows failed, discarding partial scrape")
+            return None
+        
+        df = merge_windows(frames)
+        logger.info("Scraping completed successfully! %s dates in %s window(s)", len(df), len(windows))
+        
+        try:
+            with span('persistence'):
+                save_raw_inventory(df, data_dir)
+            
+            # Process the inventory data
+            logger.info("Starting inventory data processing...")
+            with span('processing'):
+                processed_df = process_pms_inventory(df)
+            logger.info("Processed data saved to CSV and database")
+            
+            return processed_df
+        except Exception as e:
+            logger.error("An error occurred: %s", e)
+            return None
+    finally:
+        finish_run(run, 'success' if processed_df is not None else 'failed')
 
 def main():
     """
     Main function to run the scraping and processing sequence
     """
-    print("=== Starting PMS Inventory Scraping and Processing ===")
-    print("Step 1: Scraping data from Hospitality Suite...")
+    logger.info("=== Starting PMS Inventory Scraping and Processing ===")
+    logger.info("Step 1: Scraping data from Hospitality Suite...")
     processed_data = scrape_pms_inventory()
     
     if processed_data is not None:
-        print("\n=== Process Completed Successfully ===")
-        print("1. Data scraped from Hospitality Suite")
-        print("2. Raw data saved to pms_inventory.csv")
-        print("3. Data processed and saved to pms_inventory_processed.csv")
+        logger.info("=== Process Completed Successfully ===")
+        logger.info("1. Data scraped from Hospitality Suite")
+        logger.info("2. Raw data saved to pms_inventory.csv")
+        logger.info("3. Data processed and saved to pms_inventory_processed.csv")
     else:
-        print("\n=== Process Failed ===")
-        print("Please check the error messages above.")
+        logger.error("=== Process Failed ===")
+        logger.error("Please check the error messages above.")
 
 if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
     main() 
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Season calendar: which season each stay date falls in, defined as data.
+
+Seasons are date ranges stored in the warehouse season_calendar table, per
+property ('' is the default for every property). A range is either
+recurring ('MM-DD' bounds, repeated every year, wrapping over New Year when
+start > end) or for specific dates ('YYYY-MM-DD' bounds). Ranges are
+compiled into one season code per day, so assigning seasons to a date
+column is a single array lookup. Later layers win: default recurring,
+default dated, property recurring, property dated. Until default ranges are
+saved, the built-in DEFAULT_SEASON_RANGES are the default layer.
+"""
+
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_TABLE = 'season_calendar'
+SEASONS = ['Normal', 'Shoulder', 'High', 'Peak']
+FALLBACK_SEASON = 'Normal'
+
+# The hotel's standard year
+DEFAULT_SEASON_RANGES = [
+    {'season': 'Peak', 'start': '01-01', 'end': '01-05'},
+    {'season': 'Normal', 'start': '01-06', 'end': '05-31'},
+    {'season': 'Shoulder', 'start': '06-01', 'end': '06-30'},
+    {'season': 'High', 'start': '07-01', 'end': '08-31'},
+    {'season': 'Shoulder', 'start': '09-01', 'end': '09-30'},
+    {'season': 'Normal', 'start': '10-01', 'end': '12-22'},
+    {'season': 'High', 'start': '12-23', 'end': '12-26'},
+    {'season': 'Peak', 'start': '12-27', 'end': '12-31'}
+]
+
+def ensure_calendar_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CALENDAR_TABLE} (
+            property TEXT NOT NULL DEFAULT '',
+            range_start TEXT NOT NULL,
+            range_end TEXT NOT NULL,
+            season TEXT NOT NULL,
+            PRIMARY KEY (property, range_start, range_end)
+        )
+    """)
+
+def _is_recurring(bound):
+    return len(bound) == 5
+
+def validate_ranges(ranges):
+    """Raise ValueError for unknown seasons, malformed bounds or mixed range kinds"""
+    for entry in ranges:
+        season, start, end = entry.get('season'), str(entry.get('start', '')), str(entry.get('end', ''))
+        if season not in SEASONS:
+            raise ValueError(f"Unknown season '{season}', expected one of {SEASONS}")
+        if _is_recurring(start) != _is_recurring(end):
+            raise ValueError(f"Range {start}..{end} mixes a recurring and a dated bound")
+        # Recurring bounds are checked against a leap year so 02-29 is accepted
+        prefix = '2024-' if _is_recurring(start) else ''
+        try:
+            first, last = pd.Timestamp(prefix + start), pd.Timestamp(prefix + end)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid season range {start}..{end}: {e}")
+        if not prefix and first > last:
+            raise ValueError(f"Season range {start}..{end} ends before it starts")
+
+def load_ranges(conn, property_id=None):
+    """The ranges for property_id (and the defaults) as [{'property', 'season', 'start', 'end'}]"""
+    ensure_calendar_table(conn)
+    rows = conn.execute(
+        f"SELECT property, season, range_start, range_end FROM {CALENDAR_TABLE} WHERE property IN ('', ?) "
+        f"ORDER BY property, range_start",
+        (property_id or '',)
+    ).fetchall()
+    ranges = [{'property': p, 'season': s, 'start': start, 'end': end} for p, s, start, end in rows]
+    if not any(entry['property'] == '' for entry in ranges):
+        ranges = [dict(entry, property='') for entry in DEFAULT_SEASON_RANGES] + ranges
+    return ranges
+
+def save_ranges(conn, ranges, property_id=None):
+    """Replace the ranges of property_id ('' for the defaults) in one transaction"""
+    validate_ranges(ranges)
+    ensure_calendar_table(conn)
+    with conn:
+        conn.execute(f"DELETE FROM {CALENDAR_TABLE} WHERE property = ?", (property_id or '',))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {CALENDAR_TABLE} (property, range_start, range_end, season) VALUES (?, ?, ?, ?)",
+            [(property_id or '', str(r['start']), str(r['end']), r['season']) for r in ranges]
+        )
+    return len(ranges)
+
+def _month_day(year, bound):
+    """'MM-DD' in year; 02-29 falls back to 02-28 outside leap years"""
+    month, day = int(bound[:2]), int(bound[3:])
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return date(year, month, day - 1)
+
+def _concrete_spans(entry, first, last):
+    """(start, end) dates of entry that can overlap first..last"""
+    start, end = str(entry['start']), str(entry['end'])
+    if not _is_recurring(start):
+        return [(pd.Timestamp(start).date(), pd.Timestamp(end).date())]
+    spans = []
+    for year in range(first.year - 1, last.year + 1):
+        span_start = _month_day(year, start)
+        span_end = _month_day(year + 1 if start > end else year, end)
+        spans.append((span_start, span_end))
+    return spans
+
+def compile_calendar(ranges, first, last):
+    """
+    One season code (index into SEASONS, -1 where no range applies) per day
+    from first to last inclusive, in layer order.
+    """
+    first, last = pd.Timestamp(first).date(), pd.Timestamp(last).date()
+    codes = np.full((last - first).days + 1, -1, dtype=np.int8)
+    layers = sorted(ranges, key=lambda r: (r.get('property', '') != '', not _is_recurring(str(r['start']))))
+    for entry in layers:
+        code = SEASONS.index(entry['season'])
+        for span_start, span_end in _concrete_spans(entry, first, last):
+            lo = max((span_start - first).days, 0)
+            hi = min((span_end - first).days, len(codes) - 1)
+            if lo <= hi:
+                codes[lo:hi + 1] = code
+    return codes
+
+def assign_seasons(dates, ranges=None):
+    """Season label per date of a datetime Series, aligned to its index"""
+    ranges = ranges or DEFAULT_SEASON_RANGES
+    days = pd.to_datetime(dates).dt.normalize()
+    if days.empty:
+        return pd.Series([], index=dates.index, dtype=object)
+    first = days.min()
+    codes = compile_calendar(ranges, first, days.max())
+    day_codes = codes[(days - first).dt.days.to_numpy()]
+    unassigned = day_codes < 0
+    if unassigned.any():
+        logger.warning(
+            "Warning: Unassigned season for %s dates. Defaulting to %s.",
+            int(unassigned.sum()), FALLBACK_SEASON
+        )
+        day_codes = np.where(unassigned, SEASONS.index(FALLBACK_SEASON), day_codes)
+    return pd.Series(np.array(SEASONS, dtype=object)[day_codes], index=dates.index)
@@ -0,0 +1,155 @@
+"""
+Append-only history of the processed PMS and CM inventories for pickup analysis.
+
+Every processed write appends the rows that changed, stamped with the
+capture time, to inventory_snapshots in the warehouse. Cells are stored in
+long format (source, stay_date, room_type, capture_ts) so CM columns can
+come and go, and because unchanged rows are not repeated the table grows
+with the number of changes rather than with days x horizon. A NULL
+available marks a stay date that dropped out of the source.
+
+The primary key doubles as the as-of index: the state of a stay date at
+capture T is its newest row with capture_ts <= T, one index seek per cell.
+"""
+
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from .inventory_store import read_table, changed_keys
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLE = 'inventory_snapshots'
+CAPTURE_TABLE = 'snapshot_captures'
+SOURCES = {
+    'pms': 'pms_inventory_processed',
+    'cm': 'cm_inventory_processed'
+}
+
+def ensure_snapshot_tables(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+            source TEXT NOT NULL,
+            stay_date TEXT NOT NULL,
+            room_type TEXT NOT NULL,
+            capture_ts TEXT NOT NULL,
+            available INTEGER,
+            PRIMARY KEY (source, stay_date, room_type, capture_ts)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{SNAPSHOT_TABLE}_capture
+        ON {SNAPSHOT_TABLE} (capture_ts, stay_date)
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CAPTURE_TABLE} (
+            source TEXT NOT NULL,
+            capture_ts TEXT NOT NULL,
+            stay_dates INTEGER NOT NULL,
+            cells INTEGER NOT NULL,
+            PRIMARY KEY (source, capture_ts)
+        )
+    """)
+
+def _capture_timestamp():
+    return datetime.now().isoformat(timespec='seconds')
+
+def _has_snapshots(conn, source):
+    row = conn.execute(f"SELECT 1 FROM {SNAPSHOT_TABLE} WHERE source = ? LIMIT 1", (source,)).fetchone()
+    return row is not None
+
+def record_snapshot(conn, source, change_set, capture_ts=None):
+    """
+    Append the rows of the source table touched by change_set. The first
+    snapshot of a source records the whole table as its baseline. Returns the
+    number of cells written.
+    """
+    ensure_snapshot_tables(conn)
+    table = SOURCES[source]
+    capture_ts = capture_ts or _capture_timestamp()
+
+    if _has_snapshots(conn, source):
+        dates = changed_keys(change_set)
+        if not dates:
+            return 0
+        df = read_table(conn, table, dates)
+    else:
+        df = read_table(conn, table)
+
+    cells = []
+    room_types = [col for col in df.columns if col != 'Date']
+    for row in df.itertuples(index=False, name=None):
+        values = dict(zip(df.columns, row))
+        for room_type in room_types:
+            value = values[room_type]
+            if pd.isna(value):
+                value = None
+            elif hasattr(value, 'item'):
+                value = value.item()
+            cells.append((source, values['Date'], room_type, capture_ts, value))
+
+    # Dates that left the source get a tombstone for every room type they had
+    for stay_date in change_set.get('removed', []):
+        known = conn.execute(
+            f"SELECT DISTINCT room_type FROM {SNAPSHOT_TABLE} WHERE source = ? AND stay_date = ?",
+            (source, stay_date)
+        ).fetchall()
+        cells.extend((source, stay_date, room_type, capture_ts, None) for room_type, in known)
+
+    if not cells:
+        return 0
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {SNAPSHOT_TABLE} (source, stay_date, room_type, capture_ts, available) "
+        f"VALUES (?, ?, ?, ?, ?)",
+        cells
+    )
+    conn.execute(
+        f"INSERT OR REPLACE INTO {CAPTURE_TABLE} (source, capture_ts, stay_dates, cells) VALUES (?, ?, ?, ?)",
+        (source, capture_ts, len({cell[1] for cell in cells}), len(cells))
+    )
+    conn.commit()
+    logger.info("Snapshot %s@%s: %s cells", source, capture_ts, len(cells))
+    return len(cells)
+
+def list_captures(conn, source=None):
+    ensure_snapshot_tables(conn)
+    query = f"SELECT source, capture_ts, stay_dates, cells FROM {CAPTURE_TABLE}"
+    params = []
+    if source:
+        query += " WHERE source = ?"
+        params.append(source)
+    return pd.read_sql_query(query + " ORDER BY capture_ts", conn, params=params)
+
+def availability_as_of(conn, source, stay_from, stay_to, as_of=None):
+    """
+    Availability per stay date (rows) and room type (columns) for stay dates
+    stay_from..stay_to as the source looked at capture time as_of (latest
+    when None).
+    """
+    ensure_snapshot_tables(conn)
+    as_of = as_of or '9999-12-31T23:59:59'
+    cells = pd.read_sql_query(f"""
+        SELECT s.stay_date AS Date, s.room_type, s.available
+        FROM {SNAPSHOT_TABLE} s
+        WHERE s.source = ? AND s.stay_date BETWEEN ? AND ?
+          AND s.capture_ts = (
+              SELECT MAX(i.capture_ts) FROM {SNAPSHOT_TABLE} i
+              WHERE i.source = s.source AND i.stay_date = s.stay_date
+                AND i.room_type = s.room_type AND i.capture_ts <= ?
+          )
+    """, conn, params=[source, stay_from, stay_to, as_of])
+    cells = cells.dropna(subset=['available'])
+    if cells.empty:
+        return pd.DataFrame(columns=['Date'])
+    wide = cells.pivot(index='Date', columns='room_type', values='available')
+    wide.columns.name = None
+    return wide.reset_index().sort_values('Date').reset_index(drop=True)
+
+def pickup(conn, source, stay_from, stay_to, from_ts, to_ts):
+    """Change in availability per stay date and room type between two capture times"""
+    before = availability_as_of(conn, source, stay_from, stay_to, from_ts).set_index('Date')
+    after = availability_as_of(conn, source, stay_from, stay_to, to_ts).set_index('Date')
+    before, after = before.align(after, join='outer')
+    return (after - before).reset_index()
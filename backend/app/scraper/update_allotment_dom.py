@@ -1,26 +1,22 @@
-import csv
+import logging
 import os
 import time
-import platform
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from .pms_config import PMS_USERNAME, PMS_PASSWORD, pms_url, require_credentials
+from .driver_pool import get_pool, login_sessions
+from .driver_factory import create_driver
+from .allotment_ledger import read_allocation_csv, plan_push, record_pushed
+from .allotment_plan import plan_submissions, plan_summary
+from .update_pms_cm_allotment import add_date_range
+
+logger = logging.getLogger(__name__)
+
+ALLOTMENT_DETAIL_PATH = "allotment/detail?companyid=1001"
 
 def setup_driver():
-    chrome_options = Options()
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('--start-maximized')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument('--disable-software-rasterizer')
-    if platform.system() == 'Darwin' and platform.machine() == 'arm64':
-        chrome_options.binary_location = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    return create_driver(headless=False)
 
 def wait_for_element(driver, by, value, timeout=15):
     return WebDriverWait(driver, timeout).until(
@@ -59,14 +55,14 @@ def handle_sweet_alert_dom(driver, timeout=10):
         time.sleep(1)
         return True
     except Exception as e:
-        print(f"No sweet alert found or error: {e}")
+        logger.warning("No sweet alert found or error: %s", e)
         return False
 
 def login_and_navigate(driver, username, password):
-    print("Navigating to login page...")
-    driver.get("https://fo.hospitality.mykg.id/")
+    logger.info("Navigating to login page...")
+    driver.get(pms_url())
     wait_for_page_load(driver)
-    print("Waiting for login fields...")
+    logger.debug("Waiting for login fields...")
     wait_for_element(driver, By.ID, "txtUsername")
     # Set username and password via DOM
     driver.execute_script("document.getElementById('txtUsername').value = arguments[0];", username)
@@ -74,10 +70,11 @@ def login_and_navigate(driver, username, password):
     time.sleep(0.2)
     # Click login
     driver.execute_script("document.getElementById('btnLogin').click();")
-    print("Clicked login button.")
+    logger.debug("Clicked login button.")
     wait_for_page_load(driver)
     wait_for_toast_disappear(driver)
-    print("Logged in. Waiting for brand dropdown...")
+    login_sessions.save(username, password, driver)
+    logger.info("Logged in. Waiting for brand dropdown...")
     wait_for_element(driver, By.ID, "className")
     time.sleep(1)
     # Select brand (try several variations)
@@ -90,64 +87,40 @@ def login_and_navigate(driver, username, password):
             wait_for_element(driver, By.ID, "hotelName")
             options = driver.execute_script("return Array.from(document.getElementById('hotelName').options).map(o=>o.text);")
             if any("ANVAYA" in o for o in options):
-                print(f"Selected brand: {brand}")
+                logger.info("Selected brand: %s", brand)
                 break
         except Exception as e:
             continue
     # Select hotel
-    print("Selecting hotel...")
+    logger.info("Selecting hotel...")
     driver.execute_script("var sel=document.getElementById('hotelName'); for(var i=0;i<sel.options.length;i++){if(sel.options[i].text.includes('ANVAYA')){sel.selectedIndex=i;sel.dispatchEvent(new Event('change',{bubbles:true}));break;}}")
     time.sleep(1)
     wait_for_page_load(driver)
     # Click Rate Management menu
-    print("Navigating to Rate Management...")
+    logger.info("Navigating to Rate Management...")
     driver.execute_script("document.querySelector('a[data-appid=\'4\']').click();")
     wait_for_page_load(driver)
     # Click Allotment in the navigation
-    print("Navigating to Allotment menu...")
+    logger.info("Navigating to Allotment menu...")
     driver.execute_script("var el = Array.from(document.querySelectorAll('span')).find(e => e.textContent.includes('Allotment')); if(el){el.parentElement.click();}")
     wait_for_page_load(driver)
     # Go to the allotment detail page
-    print("Navigating to allotment detail page...")
-    driver.get("https://fo.hospitality.mykg.id/allotment/detail?companyid=1001")
+    logger.info("Navigating to allotment detail page...")
+    driver.get(pms_url(ALLOTMENT_DETAIL_PATH))
     wait_for_page_load(driver)
-    print("Ready to process allotment.")
-
-def read_and_group_csv(csv_path):
-    date_inventory = []
-    with open(csv_path, 'r') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            date_obj = datetime.strptime(row['Date'], '%Y-%m-%d')
-            formatted_date = date_obj.strftime('%m/%d/%Y')
-            date_inventory.append({
-                'date': formatted_date,
-                'inventory': int(row['Deluxe Online Inventory'])
-            })
-    # Group consecutive dates with the same inventory
-    groups = []
-    current_group = []
-    for item in date_inventory:
-        if not current_group:
-            current_group.append(item)
-        elif item['inventory'] == current_group[0]['inventory']:
-            current_group.append(item)
-        else:
-            groups.append(current_group)
-            current_group = [item]
-    if current_group:
-        groups.append(current_group)
-    return groups
-
-def add_date_range_dom(driver, start_date, end_date):
-    driver.execute_script("document.getElementById('txtStartDate').value = arguments[0];", start_date)
-    driver.execute_script("document.getElementById('txtStartDate').dispatchEvent(new Event('change', {bubbles:true}));")
-    time.sleep(0.2)
-    driver.execute_script("document.getElementById('txtEndDate').value = arguments[0];", end_date)
-    driver.execute_script("document.getElementById('txtEndDate').dispatchEvent(new Event('change', {bubbles:true}));")
-    time.sleep(0.2)
-    driver.execute_script("document.getElementById('ModalAddRoomAddDateButton').click();")
-    time.sleep(0.5)
+    logger.info("Ready to process allotment.")
+
+def open_allotment_with_saved_session(driver, username, password):
+    """Go straight to the allotment detail page using saved login cookies"""
+    if not login_sessions.restore(username, password, driver, pms_url()):
+        return False
+    driver.get(pms_url(ALLOTMENT_DETAIL_PATH))
+    wait_for_page_load(driver)
+    if driver.find_elements(By.ID, "btnAddRoom"):
+        logger.info("Reused existing login session.")
+        return True
+    login_sessions.invalidate(username)
+    return False
 
 def select_deluxe_room_type_dom(driver):
     driver.execute_script("var cb=document.querySelector(\"input#lstRoomType[value='DLT']\"); if(cb && !cb.checked){cb.checked=true;cb.dispatchEvent(new Event('change', {bubbles:true}));}")
@@ -165,40 +138,66 @@ def set_remark_dom(driver, remark):
 
 def click_save_dom(driver):
     driver.execute_script("document.getElementById('btnSaveRoomAllotment').click();")
-    print('Clicked Save button')
+    logger.debug('Clicked Save button')
     time.sleep(1)
 
-def process_allotment_dom(driver, groups):
-    for group_index, group in enumerate(groups):
-        inventory = group[0]['inventory']
-        for batch_start in range(0, len(group), 5):
-            batch = group[batch_start:batch_start+5]
-            print(f"Processing group {group_index+1}, batch {batch_start//5+1} (inventory: {inventory})")
-            driver.execute_script("document.getElementById('btnAddRoom').click();")
-            time.sleep(1.5)
-            for date_range in batch:
-                add_date_range_dom(driver, date_range['date'], date_range['date'])
-            select_deluxe_room_type_dom(driver)
-            set_number_of_rooms_dom(driver, inventory)
-            set_remark_dom(driver, f"Automated update via DOM, inventory {inventory}, batch {batch_start//5+1}")
-            click_save_dom(driver)
-            handle_sweet_alert_dom(driver)
-            wait_for_toast_disappear(driver)
-            print(f"Successfully processed batch {batch_start//5+1} in group {group_index+1}")
-            time.sleep(2)
-
-def main(username="krisnatha", password="Nasibungkus13"):
-    driver = setup_driver()
+def process_allotment_dom(driver, submissions, counts=None):
+    """Save each planned submission (see allotment_plan.plan_submissions) through the modal"""
+    for index, submission in enumerate(submissions):
+        inventory = submission['inventory']
+        logger.info("Processing submission %s of %s (inventory: %s, %s date ranges)",
+                    index + 1, len(submissions), inventory, len(submission['ranges']))
+        driver.execute_script("document.getElementById('btnAddRoom').click();")
+        time.sleep(1.5)
+        for start_date, end_date in submission['ranges']:
+            add_date_range(driver, start_date, end_date)
+        select_deluxe_room_type_dom(driver)
+        set_number_of_rooms_dom(driver, inventory)
+        set_remark_dom(driver, f"Automated update via DOM, inventory {inventory}, batch {index+1}")
+        click_save_dom(driver)
+        # Only a confirmed save goes into the ledger; otherwise the next run retries these dates
+        if not handle_sweet_alert_dom(driver):
+            raise Exception(f"Save of submission {index+1} was not confirmed (no sweet alert)")
+        if not wait_for_toast_disappear(driver):
+            raise Exception(f"Save of submission {index+1} was not confirmed (no toast)")
+        record_pushed(submission['items'])
+        if counts is not None:
+            counts['pushed'] += len(submission['items'])
+        logger.info("Successfully processed submission %s", index + 1)
+        time.sleep(2)
+
+def main(username=PMS_USERNAME, password=PMS_PASSWORD, full_resync=False):
+    require_credentials(username, password)
+    csv_path = os.path.join(os.path.dirname(__file__), 'data/daily_inventory_allocation_seasonal.csv')
+    # Only push the dates whose inventory changed since the last push
+    date_inventory, counts = plan_push(read_allocation_csv(csv_path), full_resync=full_resync)
+    if not date_inventory:
+        # Nothing changed, so skip the browser and the login altogether
+        logger.info("PMS allotment is already up to date (%s dates unchanged).", counts['skipped'])
+        return counts
+    submissions = plan_submissions(date_inventory)
+    summary = plan_summary(date_inventory, submissions)
+    logger.info("Planned %s submissions with %s date ranges for %s dates (%s dates unchanged).",
+                summary['submissions'], summary['ranges'], summary['dates'], counts['skipped'])
+    pool = get_pool('allotment', setup_driver)
+    driver = pool.checkout()
+    discard_driver = False
     try:
-        login_and_navigate(driver, username, password)
-        csv_path = os.path.join(os.path.dirname(__file__), 'data/daily_inventory_allocation_seasonal.csv')
-        groups = read_and_group_csv(csv_path)
-        print(f"Read and grouped CSV into {len(groups)} groups.")
-        process_allotment_dom(driver, groups)
-        print('Allotment update via DOM completed.')
+        if not open_allotment_with_saved_session(driver, username, password):
+            login_and_navigate(driver, username, password)
+        process_allotment_dom(driver, submissions, counts)
+        logger.info("Allotment update via DOM completed: %s dates pushed, %s skipped.",
+                    counts['pushed'], counts['skipped'])
+        return counts
+    except Exception:
+        # The page state is unknown after a failure, so don't hand this driver out again
+        discard_driver = True
+        raise
     finally:
-        # driver.quit()  # Uncomment to close browser after running
-        pass
+        # Hand the driver back so it is reused or quit by the pool instead of leaking
+        pool.release(driver, discard=discard_driver)
 
 if __name__ == '__main__':
+    from .log_config import configure_logging
+    configure_logging()
     main() 
\ No newline at end of file
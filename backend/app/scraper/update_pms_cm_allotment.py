@@ -1,18 +1,74 @@
-from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException
+import logging
 import time
-import platform
-import csv
 from datetime import datetime
 import os
 from selenium.webdriver.common.keys import Keys
 from ..shared import log_queue
+from .pms_config import PMS_USERNAME, PMS_PASSWORD, pms_url, require_credentials
+from .driver_pool import get_pool, login_sessions
+from .driver_factory import create_driver
+from .allotment_ledger import read_allocation_csv, plan_push, record_pushed
+from .allotment_plan import plan_submissions, plan_summary
+from .allotment_http import push_allotment_http
+
+logger = logging.getLogger(__name__)
+
+ALLOTMENT_DETAIL_PATH = "allotment/detail?companyid=1001"
+
+# Logging level for each log() message type streamed to the frontend
+LOG_LEVELS = {'error': logging.ERROR, 'warning': logging.WARNING, 'debug': logging.DEBUG}
+
+# Rows of the Add Allotment Room modal's date range table, and its validation
+# messages. Both selectors are unverified against the live page, so a table
+# that never changes only slows add_date_range down; it never fails it.
+DATE_RANGE_ROW_SELECTOR = "#modalAddRoom table tbody tr"
+VALIDATION_MESSAGE_SELECTOR = "#modalAddRoom .field-validation-error, #modalAddRoom .invalid-feedback, .swal2-container .swal2-html-container"
+ADD_DATE_TIMEOUT = 5
+# Fixed wait after Add Date when the selector matches no rows, as before the fast path
+ADD_DATE_SETTLE_SECONDS = 1
+
+# Fill the date range, fire the events the datepicker listens to, click Add Date and read the form back
+ADD_DATE_RANGE_SCRIPT = """
+var start = document.getElementById('txtStartDate');
+var end = document.getElementById('txtEndDate');
+var button = document.getElementById('ModalAddRoomAddDateButton');
+if (!start || !end || !button) {
+    return {error: 'Could not find the date range inputs or the Add Date button'};
+}
+var rows = Array.prototype.slice.call(document.querySelectorAll(arguments[2]));
+[[start, arguments[0]], [end, arguments[1]]].forEach(function (pair) {
+    pair[0].value = pair[1];
+    pair[0].dispatchEvent(new Event('input', {bubbles: true}));
+    pair[0].dispatchEvent(new Event('change', {bubbles: true}));
+});
+var values = [start.value, end.value];
+button.click();
+var errors = Array.prototype.slice.call(document.querySelectorAll(arguments[3]))
+    .filter(function (el) { return el.offsetParent !== null && el.textContent.trim(); })
+    .map(function (el) { return el.textContent.trim(); });
+return {
+    rows: rows.length,
+    table: rows.map(function (row) { return row.textContent; }).join('\\n'),
+    start: values[0],
+    end: values[1],
+    errors: errors
+};
+"""
+
+# Row count, row text and visible validation messages of the modal
+DATE_RANGE_STATE_SCRIPT = """
+var rows = Array.prototype.slice.call(document.querySelectorAll(arguments[0]));
+var errors = Array.prototype.slice.call(document.querySelectorAll(arguments[1]))
+    .filter(function (el) { return el.offsetParent !== null && el.textContent.trim(); })
+    .map(function (el) { return el.textContent.trim(); });
+return [rows.length, rows.map(function (row) { return row.textContent; }).join('\\n'), errors];
+"""
 
 def wait_for_toast_disappear(driver, timeout=10):
     """Wait for toast message to disappear"""
@@ -43,10 +99,10 @@ def wait_for_element_presence(driver, by, value, timeout=10, description="elemen
         )
         return element
     except TimeoutException:
-        print(f"Timeout waiting for {description} to be present")
+        logger.warning("Timeout waiting for %s to be present", description)
         return None
     except Exception as e:
-        print(f"Error finding {description}: {e}")
+        logger.error("Error finding %s: %s", description, e)
         return None
 
 def wait_and_click(driver, by, value, timeout=10, description="element"):
@@ -63,46 +119,27 @@ def wait_and_click(driver, by, value, timeout=10, description="element"):
         element.click()
         return True
     except TimeoutException:
-        print(f"Timeout waiting for {description} to be clickable")
+        logger.warning("Timeout waiting for %s to be clickable", description)
         return False
     except ElementClickInterceptedException:
-        print(f"Click intercepted on {description}, trying JavaScript click")
+        logger.warning("Click intercepted on %s, trying JavaScript click", description)
         try:
             driver.execute_script("arguments[0].click();", element)
             return True
         except Exception as e:
-            print(f"JavaScript click failed: {e}")
+            logger.warning("JavaScript click failed: %s", e)
             return False
     except Exception as e:
-        print(f"Error clicking {description}: {e}")
+        logger.error("Error clicking %s: %s", description, e)
         return False
 
 def setup_driver():
-    # Set up Chrome options
-    chrome_options = Options()
-    # chrome_options.add_argument('--headless=new')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('--start-maximized')
-    chrome_options.add_argument('--disable-gpu')  # Required for headless on some systems
-    chrome_options.add_argument('--disable-software-rasterizer')  # Better performance in headless
-    
-    # Add specific options for Mac ARM64
-    if platform.system() == 'Darwin' and platform.machine() == 'arm64':
-        chrome_options.binary_location = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
-    
-    # Initialize the Chrome driver
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    # Visible browser; stylesheets stay loaded because the modal flow relies on CSS visibility
+    return create_driver(headless=False)
 
 def log(driver, message, type='info'):
-    """Log message to both console and browser, and send to queue for streaming"""
-    print(message)
-    try:
-        driver.execute_script(f"console.log({repr(message)})")
-    except Exception as e:
-        print(f"Could not log to browser console: {e}")
+    """Log message at the level matching type and send it to the queue for streaming"""
+    logger.log(LOG_LEVELS.get(type, logging.INFO), message)
     
     # Send log to queue for streaming
     try:
@@ -111,104 +148,44 @@ def log(driver, message, type='info'):
             'message': message
         })
     except Exception as e:
-        print(f"Could not send log to queue: {e}")
+        logger.warning("Could not send log to queue: %s", e)
 
-def add_date_range(driver, start_date, end_date):
-    """Add a date range to the form"""
-    log(driver, f"Adding date range: {start_date} to {end_date}")
-    
-    # Set start date
-    start_date_input = wait_for_element_presence(driver, By.ID, "txtStartDate", description="start date input")
-    if not start_date_input:
-        raise Exception("Could not find start date input field")
-    
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", start_date_input)
-    time.sleep(0.5)
-    
-    # Clear and set start date value directly first
-    driver.execute_script("arguments[0].value = '';", start_date_input)
-    time.sleep(0.5)
-    
-    # Set the start date value
-    log(driver, f"Setting start date value to: {start_date}")
-    driver.execute_script(f"arguments[0].value = '{start_date}';", start_date_input)
-    time.sleep(0.5)
-    
-    # Verify start date was set
-    start_date_value = start_date_input.get_attribute('value')
-    log(driver, f"Start date value after setting: {start_date_value}")
-    
-    # Parse the start date
-    start_date_obj = datetime.strptime(start_date, '%m/%d/%Y')
-    start_day = str(start_date_obj.day)
-    
-    # Set end date
-    end_date_input = wait_for_element_presence(driver, By.ID, "txtEndDate", description="end date input")
-    if not end_date_input:
-        raise Exception("Could not find end date input field")
-    
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", end_date_input)
-    time.sleep(0.5)
-    
-    # Clear and set end date value directly first
-    driver.execute_script("arguments[0].value = '';", end_date_input)
-    time.sleep(0.5)
-    
-    # Set the end date value
-    log(driver, f"Setting end date value to: {end_date}")
-    driver.execute_script(f"arguments[0].value = '{end_date}';", end_date_input)
-    time.sleep(0.5)
-    
-    # Verify end date was set
-    end_date_value = end_date_input.get_attribute('value')
-    log(driver, f"End date value after setting: {end_date_value}")
-    
-    # Parse the end date
-    end_date_obj = datetime.strptime(end_date, '%m/%d/%Y')
-    end_day = str(end_date_obj.day)
-    
-    # Wait a moment to ensure dates are properly set
-    time.sleep(1)
-    
-    # Verify both dates are set correctly before proceeding
-    final_start_date = start_date_input.get_attribute('value')
-    final_end_date = end_date_input.get_attribute('value')
-    
-    log(driver, f"Final start date: {final_start_date}")
-    log(driver, f"Final end date: {final_end_date}")
-    
-    if not final_start_date or not final_end_date:
-        # Try setting the dates one more time if they were cleared
-        if not final_start_date:
-            driver.execute_script(f"arguments[0].value = '{start_date}';", start_date_input)
-            time.sleep(0.5)
-        if not final_end_date:
-            driver.execute_script(f"arguments[0].value = '{end_date}';", end_date_input)
-            time.sleep(0.5)
-        
-        # Check one final time
-        final_start_date = start_date_input.get_attribute('value')
-        final_end_date = end_date_input.get_attribute('value')
-        
-        if not final_start_date or not final_end_date:
-            raise Exception(f"Failed to set dates correctly. Start: {final_start_date} (expected {start_date}), End: {final_end_date} (expected {end_date})")
-    
-    # Click Add Date button
-    add_date_button = wait_for_element_presence(driver, By.ID, "ModalAddRoomAddDateButton", description="Add Date button")
-    if not add_date_button:
-        raise Exception("Could not find Add Date button")
-    
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", add_date_button)
-    time.sleep(0.5)
-    
+def _date_range_state(driver):
+    """(rows in the modal's date range table, their text, visible validation messages)"""
+    return driver.execute_script(DATE_RANGE_STATE_SCRIPT, DATE_RANGE_ROW_SELECTOR, VALIDATION_MESSAGE_SELECTOR)
+
+def add_date_range(driver, start_date, end_date, timeout=ADD_DATE_TIMEOUT):
+    """
+    Add a date range to the open modal: fill both dates, fire their change
+    events and click Add Date in one script call, then wait only until the
+    range table changes. Raises if a date input ends up empty or the form
+    shows a validation message. When DATE_RANGE_ROW_SELECTOR matches nothing
+    it waits ADD_DATE_SETTLE_SECONDS instead, like the old fixed sleep.
+    """
+    result = driver.execute_script(ADD_DATE_RANGE_SCRIPT, start_date, end_date,
+                                   DATE_RANGE_ROW_SELECTOR, VALIDATION_MESSAGE_SELECTOR)
+    if result.get('error'):
+        raise Exception(result['error'])
+    # The datepicker may reformat the value, so only an empty input is an error
+    if not result['start'] or not result['end']:
+        raise Exception(f"Failed to set dates correctly. Start: {result['start']} (expected {start_date}), "
+                        f"End: {result['end']} (expected {end_date})")
+    if result['errors']:
+        raise Exception(f"Date range {start_date} to {end_date} rejected: {'; '.join(result['errors'])}")
+
+    def table_changed(driver):
+        rows, table, errors = _date_range_state(driver)
+        if errors:
+            raise Exception(f"Date range {start_date} to {end_date} rejected: {'; '.join(errors)}")
+        # Text as well as count, so a placeholder row being replaced counts too
+        return rows != result['rows'] or table != result['table']
+
+    wait = timeout if result['rows'] else ADD_DATE_SETTLE_SECONDS
     try:
-        add_date_button.click()
-    except:
-        driver.execute_script("arguments[0].click();", add_date_button)
-    
-    # Wait for the new date range to be added and verify it was added
-    time.sleep(1)
-    log(driver, "Successfully added date range")
+        WebDriverWait(driver, wait, poll_frequency=0.1).until(table_changed)
+    except TimeoutException:
+        if result['rows']:
+            log(driver, f"Date range table did not change after adding {start_date} to {end_date}, continuing", type='warning')
 
 def handle_sweet_alert(driver, timeout=10):
     """Handle sweet alert dialog"""
@@ -238,311 +215,340 @@ def handle_sweet_alert(driver, timeout=10):
         log(driver, f"Error handling sweet alert: {str(e)}")
         return False
 
-def update_allotmet(driver=None, username="krisnatha", password="Nasibungkus13"):
-    """
-    Login to the website and select the hotel brand
-    Returns True if successful, False otherwise
-    """
-    try:
-        # If no driver is provided, create a new one
-        if driver is None:
-            driver = setup_driver()
-            should_quit_driver = False
-        else:
-            should_quit_driver = False
-
-        # Navigate to the website
-        driver.get("https://fo.hospitality.mykg.id/")
-        log(driver, "Navigating to Hospitality Suite website...")
-        
-        # Wait for page to load completely
-        wait_for_page_load(driver)
-        
-        # Wait for the username field to be present and interactable
-        username_field = wait_for_element_presence(driver, By.ID, "txtUsername", timeout=15, description="username field")
-        if not username_field:
-            raise Exception("Username field not found")
+def login_and_navigate(driver, username, password):
+    """Log in, select the hotel and open the allotment detail page"""
+    # Navigate to the website
+    driver.get(pms_url())
+    log(driver, "Navigating to Hospitality Suite website...")
+    
+    # Wait for page to load completely
+    wait_for_page_load(driver)
+    
+    # Wait for the username field to be present and interactable
+    username_field = wait_for_element_presence(driver, By.ID, "txtUsername", timeout=15, description="username field")
+    if not username_field:
+        raise Exception("Username field not found")
+    
+    # Ensure the field is interactable
+    WebDriverWait(driver, 5).until(
+        EC.element_to_be_clickable((By.ID, "txtUsername"))
+    )
+    username_field.clear()
+    username_field.send_keys(username)
+    
+    password_field = driver.find_element(By.ID, "txtPassword")
+    password_field.clear()
+    password_field.send_keys(password)
+    
+    # Click the login button
+    if not wait_and_click(driver, By.ID, "btnLogin", description="login button"):
+        raise Exception("Failed to click login button")
+    
+    log(driver, "Login credentials entered...")
+    
+    # Wait for login to complete
+    wait_for_page_load(driver)
+    wait_for_toast_disappear(driver)
+    login_sessions.save(username, password, driver)
+    
+    # Wait for the brand dropdown to be present and interactable
+    log(driver, "Waiting for brand dropdown to be ready...")
+    WebDriverWait(driver, 15).until(
+        EC.presence_of_element_located((By.ID, "className"))
+    )
+    WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable((By.ID, "className"))
+    )
+    
+    # Wait for the brand dropdown and select "The ANVAYA"
+    brand_select_elem = driver.find_element(By.ID, "className")
+    if not brand_select_elem:
+        raise Exception("Brand dropdown not found")
+    
+    # Wait for brand options to be populated
+    def brand_options_loaded(driver):
+        try:
+            brand_select = Select(driver.find_element(By.ID, "className"))
+            options = [o.text for o in brand_select.options]
+            log(driver, f"Current brand options: {options}")
+            return len(options) > 1  # More than just "Select Brand"
+        except:
+            return False
         
-        # Ensure the field is interactable
-        WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable((By.ID, "txtUsername"))
-        )
-        username_field.clear()
-        username_field.send_keys(username)
+    log(driver, "Waiting for brand options to load...")
+    # Try multiple times to wait for options
+    max_attempts = 3
+    for attempt in range(max_attempts):
+        try:
+            WebDriverWait(driver, 15).until(brand_options_loaded)
+            break
+        except TimeoutException:
+            if attempt < max_attempts - 1:
+                log(driver, f"Attempt {attempt + 1} failed, retrying...")
+                time.sleep(2)  # Wait before retrying
+            else:
+                raise Exception("Brand options failed to load after multiple attempts")
+    
+    # Print all available options for debugging
+    brand_select = Select(brand_select_elem)
+    available_options = [option.text for option in brand_select.options]
+    log(driver, f"Available brand options: {available_options}")
+    
+    # Try different variations of the brand name
+    brand_name_variations = ["The ANVAYA", "THE ANVAYA", "The Anvaya", "THE ANVAYA BEACH RESORT BALI"]
+    selected = False
+    
+    for brand_name in brand_name_variations:
+        try:
+            log(driver, f"Attempting to select brand: {brand_name}")
+            brand_select.select_by_visible_text(brand_name)
+            selected = True
+            log(driver, f"Successfully selected brand: {brand_name}")
+            break
+        except NoSuchElementException:
+            log(driver, f"Brand name '{brand_name}' not found in dropdown")
+            continue
+    
+    if not selected:
+        raise Exception(f"Could not find any matching brand name. Available options: {available_options}")
+    
+    # Wait for the hotel dropdown to be populated
+    def hotel_option_loaded(driver):
+        try:
+            hotel_select_elem = driver.find_element(By.ID, "hotelName")
+            options = [o.text for o in hotel_select_elem.find_elements(By.TAG_NAME, "option")]
+            log(driver, f"Available hotel options: {options}")
+            return len(options) > 1  # More than just "Select Hotel"
+        except Exception as e:
+            log(driver, f"Error checking hotel options: {str(e)}")
+            return False
         
-        password_field = driver.find_element(By.ID, "txtPassword")
-        password_field.clear()
-        password_field.send_keys(password)
+    log(driver, "Waiting for hotel options to load...")
+    WebDriverWait(driver, 15).until(hotel_option_loaded)
+    
+    hotel_select_elem = driver.find_element(By.ID, "hotelName")
+    hotel_select = Select(hotel_select_elem)
+    log(driver, "Attempting to select hotel: The ANVAYA Beach Resort Bali")
+    hotel_select.select_by_visible_text("The ANVAYA Beach Resort Bali")
+    log(driver, "Hotel selected successfully")
+    
+    # Wait for selection to take effect
+    wait_for_page_load(driver)
+    
+    # Click Rate Management menu
+    rate_management_link = wait_for_element_presence(
+        driver, 
+        By.CSS_SELECTOR, 
+        'a[data-appid="4"]',
+        timeout=15,
+        description="Rate Management menu"
+    )
+    if not rate_management_link:
+        raise Exception("Rate Management menu not found")
         
-        # Click the login button
-        if not wait_and_click(driver, By.ID, "btnLogin", description="login button"):
-            raise Exception("Failed to click login button")
+    if not wait_and_click(driver, By.CSS_SELECTOR, 'a[data-appid="4"]', description="Rate Management menu"):
+        raise Exception("Failed to click Rate Management menu")
         
-        log(driver, "Login credentials entered...")
+    # Wait for page to load after clicking
+    wait_for_page_load(driver)
+    
+    # Click Allotment in the navigation
+    log(driver, "Looking for Allotment menu...")
+    allotment_link = wait_for_element_presence(
+        driver,
+        By.XPATH,
+        "//span[contains(text(), 'Allotment')]/parent::a",
+        timeout=15,
+        description="Allotment menu"
+    )
+    if not allotment_link:
+        raise Exception("Allotment menu not found")
         
-        # Wait for login to complete
-        wait_for_page_load(driver)
-        wait_for_toast_disappear(driver)
+    if not wait_and_click(driver, By.XPATH, "//span[contains(text(), 'Allotment')]/parent::a", description="Allotment menu"):
+        raise Exception("Failed to click Allotment menu")
         
-        # Wait for the brand dropdown to be present and interactable
-        log(driver, "Waiting for brand dropdown to be ready...")
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.ID, "className"))
-        )
-        WebDriverWait(driver, 15).until(
-            EC.element_to_be_clickable((By.ID, "className"))
+    # Wait for page to load after clicking
+    wait_for_page_load(driver)
+    log(driver, "Successfully clicked Allotment menu")
+    
+    # Navigate directly to the allotment detail page
+    log(driver, "Navigating to allotment detail page...")
+    driver.get(pms_url(ALLOTMENT_DETAIL_PATH))
+    
+    # Wait for page to load
+    wait_for_page_load(driver)
+    log(driver, "Successfully navigated to allotment detail page")
+
+def open_allotment_with_saved_session(driver, username, password):
+    """
+    Go straight to the allotment detail page using saved login cookies.
+    Returns False when there is no fresh session or it was rejected.
+    """
+    if not login_sessions.restore(username, password, driver, pms_url()):
+        return False
+    driver.get(pms_url(ALLOTMENT_DETAIL_PATH))
+    wait_for_page_load(driver)
+    if driver.find_elements(By.ID, "btnAddRoom"):
+        return True
+    login_sessions.invalidate(username)
+    return False
+
+def push_submissions(driver, submissions, counts):
+    """Save each planned submission through the Add Allotment Room modal, recording it in the ledger"""
+    for index, submission in enumerate(submissions):
+        inventory = submission['inventory']
+        log(driver, f"\nProcessing submission {index + 1} of {len(submissions)} "
+                    f"(inventory: {inventory}, {len(submission['ranges'])} date ranges)")
+        # Click Add Allotment Room button to open modal
+        if not wait_and_click(driver, By.ID, "btnAddRoom", description="Add Allotment Room button"):
+            raise Exception("Failed to click Add Allotment Room button")
+        # Wait for modal to appear
+        modal = wait_for_element_presence(driver, By.ID, "modalAddRoom", timeout=15, description="Add Room modal")
+        if not modal:
+            raise Exception("Modal did not appear after clicking Add Allotment Room button")
+        # Wait for modal to be fully loaded
+        WebDriverWait(driver, 30).until(
+            EC.visibility_of_element_located((By.ID, "txtStartDate"))
         )
-        
-        # Wait for the brand dropdown and select "The ANVAYA"
-        brand_select_elem = driver.find_element(By.ID, "className")
-        if not brand_select_elem:
-            raise Exception("Brand dropdown not found")
-        
-        # Wait for brand options to be populated
-        def brand_options_loaded(driver):
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", modal)
+        time.sleep(1)
+        # Add each date range of the submission
+        for start_date, end_date in submission['ranges']:
+            add_date_range(driver, start_date, end_date)
+        log(driver, f"Added {len(submission['ranges'])} date ranges (inventory: {inventory})")
+        # After adding all date ranges of the submission, select Deluxe room type
+        log(driver, "Selecting Deluxe room type...")
+        deluxe_checkbox = wait_for_element_presence(driver, By.XPATH, "//input[@type='checkbox' and @id='lstRoomType' and @value='DLT']", description="Deluxe room type checkbox")
+        if not deluxe_checkbox:
+            log(driver, "Could not find Deluxe room type checkbox (DLT)")
+            raise Exception("Could not find Deluxe room type checkbox (DLT)")
+        driver.execute_script("arguments[0].scrollIntoView(true);", deluxe_checkbox)
+        time.sleep(0.5)
+        if not deluxe_checkbox.is_selected():
             try:
-                brand_select = Select(driver.find_element(By.ID, "className"))
-                options = [o.text for o in brand_select.options]
-                log(driver, f"Current brand options: {options}")
-                return len(options) > 1  # More than just "Select Brand"
+                deluxe_checkbox.click()
             except:
-                return False
-            
-        log(driver, "Waiting for brand options to load...")
-        # Try multiple times to wait for options
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                WebDriverWait(driver, 15).until(brand_options_loaded)
-                break
-            except TimeoutException:
-                if attempt < max_attempts - 1:
-                    log(driver, f"Attempt {attempt + 1} failed, retrying...")
-                    time.sleep(2)  # Wait before retrying
-                else:
-                    raise Exception("Brand options failed to load after multiple attempts")
-        
-        # Print all available options for debugging
-        brand_select = Select(brand_select_elem)
-        available_options = [option.text for option in brand_select.options]
-        log(driver, f"Available brand options: {available_options}")
-        
-        # Try different variations of the brand name
-        brand_name_variations = ["The ANVAYA", "THE ANVAYA", "The Anvaya", "THE ANVAYA BEACH RESORT BALI"]
-        selected = False
-        
-        for brand_name in brand_name_variations:
-            try:
-                log(driver, f"Attempting to select brand: {brand_name}")
-                brand_select.select_by_visible_text(brand_name)
-                selected = True
-                log(driver, f"Successfully selected brand: {brand_name}")
-                break
-            except NoSuchElementException:
-                log(driver, f"Brand name '{brand_name}' not found in dropdown")
-                continue
-        
-        if not selected:
-            raise Exception(f"Could not find any matching brand name. Available options: {available_options}")
-        
-        # Wait for the hotel dropdown to be populated
-        def hotel_option_loaded(driver):
-            try:
-                hotel_select_elem = driver.find_element(By.ID, "hotelName")
-                options = [o.text for o in hotel_select_elem.find_elements(By.TAG_NAME, "option")]
-                log(driver, f"Available hotel options: {options}")
-                return len(options) > 1  # More than just "Select Hotel"
-            except Exception as e:
-                log(driver, f"Error checking hotel options: {str(e)}")
-                return False
-            
-        log(driver, "Waiting for hotel options to load...")
-        WebDriverWait(driver, 15).until(hotel_option_loaded)
-        
-        hotel_select_elem = driver.find_element(By.ID, "hotelName")
-        hotel_select = Select(hotel_select_elem)
-        log(driver, "Attempting to select hotel: The ANVAYA Beach Resort Bali")
-        hotel_select.select_by_visible_text("The ANVAYA Beach Resort Bali")
-        log(driver, "Hotel selected successfully")
-        
-        # Wait for selection to take effect
-        wait_for_page_load(driver)
-        
-        # Click Rate Management menu
-        rate_management_link = wait_for_element_presence(
-            driver, 
-            By.CSS_SELECTOR, 
-            'a[data-appid="4"]',
-            timeout=15,
-            description="Rate Management menu"
-        )
-        if not rate_management_link:
-            raise Exception("Rate Management menu not found")
-            
-        if not wait_and_click(driver, By.CSS_SELECTOR, 'a[data-appid="4"]', description="Rate Management menu"):
-            raise Exception("Failed to click Rate Management menu")
-            
-        # Wait for page to load after clicking
-        wait_for_page_load(driver)
-        
-        # Click Allotment in the navigation
-        log(driver, "Looking for Allotment menu...")
-        allotment_link = wait_for_element_presence(
-            driver,
-            By.XPATH,
-            "//span[contains(text(), 'Allotment')]/parent::a",
-            timeout=15,
-            description="Allotment menu"
-        )
-        if not allotment_link:
-            raise Exception("Allotment menu not found")
-            
-        if not wait_and_click(driver, By.XPATH, "//span[contains(text(), 'Allotment')]/parent::a", description="Allotment menu"):
-            raise Exception("Failed to click Allotment menu")
-            
-        # Wait for page to load after clicking
-        wait_for_page_load(driver)
-        log(driver, "Successfully clicked Allotment menu")
-        
-        # Navigate directly to the allotment detail page
-        log(driver, "Navigating to allotment detail page...")
-        driver.get("https://fo.hospitality.mykg.id/allotment/detail?companyid=1001")
-        
-        # Wait for page to load
-        wait_for_page_load(driver)
-        log(driver, "Successfully navigated to allotment detail page")
-        
+                driver.execute_script("arguments[0].click();", deluxe_checkbox)
+        # Set number of rooms from the submission's inventory
+        log(driver, "Setting number of rooms...")
+        number_of_rooms = wait_for_element_presence(driver, By.ID, "txtNumberOfRoom", description="number of rooms input")
+        if not number_of_rooms:
+            log(driver, "Could not find number of rooms input field")
+            raise Exception("Could not find number of rooms input field")
+        driver.execute_script("arguments[0].scrollIntoView(true);", number_of_rooms)
+        time.sleep(0.2)
+        number_of_rooms.clear()
+        number_of_rooms.send_keys(str(inventory))
+        log(driver, f"Set number of rooms to {inventory}")
+        # Add remark
+        log(driver, "Adding remark...")
+        remark_textarea = wait_for_element_presence(driver, By.ID, "txtRemarkAllotment", description="remark textarea")
+        if not remark_textarea:
+            log(driver, "Could not find remark textarea")
+            raise Exception("Could not find remark textarea")
+        driver.execute_script("arguments[0].scrollIntoView(true);", remark_textarea)
+        time.sleep(0.2)
+        remark_textarea.clear()
+        remark_textarea.send_keys(f"Updated from CSV data - Deluxe Online Inventory for inventory {inventory}, batch {index + 1}")
+        log(driver, "Added remark")
+        # Click Save button
+        log(driver, "Clicking Save button...")
+        save_button = wait_for_element_presence(driver, By.ID, "btnSaveRoomAllotment", description="save button")
+        if not save_button:
+            log(driver, "Could not find save button")
+            raise Exception("Could not find save button")
+        driver.execute_script("arguments[0].scrollIntoView(true);", save_button)
+        time.sleep(0.2)
+        save_button.click()
+        log(driver, "Clicked Save button")
+        time.sleep(1)
+        # Wait for and handle sweet alert
+        if not handle_sweet_alert(driver):
+            log(driver, "Failed to handle sweet alert")
+            raise Exception("Failed to handle sweet alert")
+        # Wait for toast to disappear
+        if not wait_for_toast_disappear(driver):
+            log(driver, "Failed to wait for toast to disappear")
+            raise Exception("Failed to wait for toast to disappear")
+        record_pushed(submission['items'])
+        counts['pushed'] += len(submission['items'])
+        log(driver, f"Successfully processed submission {index + 1} of {len(submissions)}")
+        # Wait a bit before processing next submission
+        time.sleep(2)
+
+def update_allotmet(driver=None, username=PMS_USERNAME, password=PMS_PASSWORD, full_resync=False,
+                    engine='selenium'):
+    """
+    Login to the website and select the hotel brand, then push the dates
+    whose inventory differs from the allotment ledger (every date with
+    full_resync). engine='http' posts the submissions directly and only
+    opens a browser for the ones that fail.
+    Returns True if successful, False otherwise
+    """
+    pool = None
+    discard_driver = False
+    try:
+        require_credentials(username, password)
+
         # Read and process CSV data
         log(driver, "Reading CSV data...")
-        date_inventory = []
         try:
             csv_path = os.path.join(os.path.dirname(__file__), 'data/daily_inventory_allocation_seasonal.csv')
             log(driver, f"Attempting to open CSV file at: {csv_path}")
-            
-            with open(csv_path, 'r') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    date_obj = datetime.strptime(row['Date'], '%Y-%m-%d')
-                    formatted_date = date_obj.strftime('%m/%d/%Y')
-                    date_inventory.append({
-                        'date': formatted_date,
-                        'inventory': int(row['Deluxe Online Inventory'])
-                    })
-                log(driver, f"Successfully read {len(date_inventory)} dates from CSV")
+            date_inventory = read_allocation_csv(csv_path)
+            log(driver, f"Successfully read {len(date_inventory)} dates from CSV")
         except Exception as e:
             log(driver, f"Error reading CSV file: {str(e)}")
             raise
+
+        # Only push what the PMS doesn't have yet
+        date_inventory, counts = plan_push(date_inventory, full_resync=full_resync)
+        log(driver, f"{counts['planned']} dates to push, {counts['skipped']} unchanged since the last push"
+                    + (" (full resync)" if full_resync else ""))
+        if not date_inventory:
+            log(driver, "PMS allotment is already up to date")
+            return True
         
-        # Group consecutive dates with same inventory
-        log(driver, "Grouping consecutive dates...")
-        current_group = []
-        groups = []
-        
-        for i, item in enumerate(date_inventory):
-            if not current_group:
-                current_group.append(item)
-            elif item['inventory'] == current_group[0]['inventory']:
-                current_group.append(item)
-            else:
-                groups.append(current_group)
-                current_group = [item]
-        
-        if current_group:
-            groups.append(current_group)
-        log(driver, f"Created {len(groups)} groups of consecutive dates")
-        
-        # Process each group with correct batching logic
-        log(driver, "Processing date ranges in batches of 5 within each inventory group...")
-        for group_index, group in enumerate(groups):
-            log(driver, f"\nProcessing inventory group {group_index + 1} of {len(groups)} (inventory: {group[0]['inventory']})")
-            # Split this group into batches of 5 date ranges
-            for batch_start in range(0, len(group), 5):
-                batch = group[batch_start:batch_start+5]
-                log(driver, f"  Processing batch {batch_start//5 + 1} of {(len(group) + 4)//5} in this group")
-                # Click Add Allotment Room button to open modal
-                if not wait_and_click(driver, By.ID, "btnAddRoom", description="Add Allotment Room button"):
-                    raise Exception("Failed to click Add Allotment Room button")
-                # Wait for modal to appear
-                modal = wait_for_element_presence(driver, By.ID, "modalAddRoom", timeout=15, description="Add Room modal")
-                if not modal:
-                    raise Exception("Modal did not appear after clicking Add Allotment Room button")
-                # Wait for modal to be fully loaded
-                WebDriverWait(driver, 30).until(
-                    EC.visibility_of_element_located((By.ID, "txtStartDate"))
-                )
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", modal)
-                time.sleep(1)
-                # Add each date range in the batch
-                for date_range in batch:
-                    log(driver, f"    Adding date: {date_range['date']} (inventory: {date_range['inventory']})")
-                    add_date_range(driver, date_range['date'], date_range['date'])
-                # After adding all date ranges in the batch, select Deluxe room type
-                log(driver, "Selecting Deluxe room type...")
-                deluxe_checkbox = wait_for_element_presence(driver, By.XPATH, "//input[@type='checkbox' and @id='lstRoomType' and @value='DLT']", description="Deluxe room type checkbox")
-                if not deluxe_checkbox:
-                    log(driver, "Could not find Deluxe room type checkbox (DLT)")
-                    raise Exception("Could not find Deluxe room type checkbox (DLT)")
-                driver.execute_script("arguments[0].scrollIntoView(true);", deluxe_checkbox)
-                time.sleep(0.5)
-                if not deluxe_checkbox.is_selected():
-                    try:
-                        deluxe_checkbox.click()
-                    except:
-                        driver.execute_script("arguments[0].click();", deluxe_checkbox)
-                # Set number of rooms from inventory (use the group's inventory)
-                log(driver, "Setting number of rooms...")
-                number_of_rooms = wait_for_element_presence(driver, By.ID, "txtNumberOfRoom", description="number of rooms input")
-                if not number_of_rooms:
-                    log(driver, "Could not find number of rooms input field")
-                    raise Exception("Could not find number of rooms input field")
-                driver.execute_script("arguments[0].scrollIntoView(true);", number_of_rooms)
-                time.sleep(0.2)
-                number_of_rooms.clear()
-                number_of_rooms.send_keys(str(group[0]['inventory']))
-                log(driver, f"Set number of rooms to {group[0]['inventory']}")
-                # Add remark
-                log(driver, "Adding remark...")
-                remark_textarea = wait_for_element_presence(driver, By.ID, "txtRemarkAllotment", description="remark textarea")
-                if not remark_textarea:
-                    log(driver, "Could not find remark textarea")
-                    raise Exception("Could not find remark textarea")
-                driver.execute_script("arguments[0].scrollIntoView(true);", remark_textarea)
-                time.sleep(0.2)
-                remark_textarea.clear()
-                remark_textarea.send_keys(f"Updated from CSV data - Deluxe Online Inventory for inventory {group[0]['inventory']}, batch {batch_start//5 + 1}")
-                log(driver, "Added remark")
-                # Click Save button
-                log(driver, "Clicking Save button...")
-                save_button = wait_for_element_presence(driver, By.ID, "btnSaveRoomAllotment", description="save button")
-                if not save_button:
-                    log(driver, "Could not find save button")
-                    raise Exception("Could not find save button")
-                driver.execute_script("arguments[0].scrollIntoView(true);", save_button)
-                time.sleep(0.2)
-                save_button.click()
-                log(driver, "Clicked Save button")
-                time.sleep(1)
-                # Wait for and handle sweet alert
-                if not handle_sweet_alert(driver):
-                    log(driver, "Failed to handle sweet alert")
-                    raise Exception("Failed to handle sweet alert")
-                # Wait for toast to disappear
-                if not wait_for_toast_disappear(driver):
-                    log(driver, "Failed to wait for toast to disappear")
-                    raise Exception("Failed to wait for toast to disappear")
-                log(driver, f"Successfully processed batch {batch_start//5 + 1} in group {group_index + 1}")
-                # Wait a bit before processing next batch
-                time.sleep(2)
+        # Coalesce the dates into contiguous ranges, several per modal submission
+        submissions = plan_submissions(date_inventory)
+        summary = plan_summary(date_inventory, submissions)
+        log(driver, f"Planned {summary['submissions']} submissions with {summary['ranges']} date ranges "
+                    f"(per-date batching needed {summary['legacy_submissions']} submissions)")
+
+        if engine == 'http':
+            try:
+                submissions = push_allotment_http(submissions, counts, username, password)
+            except Exception as e:
+                log(driver, f"HTTP allotment push failed: {str(e)}")
+            if not submissions:
+                log(driver, f"Pushed {counts['pushed']} dates over HTTP, skipped {counts['skipped']} unchanged")
+                return True
+            log(driver, f"Falling back to the browser for {len(submissions)} submissions")
+
+        # If no driver is provided, check one out of the shared pool
+        if driver is None:
+            pool = get_pool('allotment', setup_driver)
+            driver = pool.checkout()
+
+        if open_allotment_with_saved_session(driver, username, password):
+            log(driver, "Reused existing login session, on allotment detail page")
+        else:
+            login_and_navigate(driver, username, password)
+
+        push_submissions(driver, submissions, counts)
         log(driver, "Successfully processed all dates from CSV")
+        log(driver, f"Pushed {counts['pushed']} dates, skipped {counts['skipped']} unchanged")
         return True
         
     except Exception as e:
-        log(driver, f"An error occurred: {str(e)}")
+        log(driver, f"An error occurred: {str(e)}", type='error')
+        # The modal may be half filled, so don't hand this driver out again
+        discard_driver = True
         return False
         
     finally:
-        if should_quit_driver and driver:
-            pass
+        if pool is not None:
+            pool.release(driver, discard=discard_driver)
 
 def wait_for_datepicker(driver, timeout=10):
     """Wait for datepicker to be visible"""
@@ -573,13 +579,15 @@ def select_date_from_picker(driver, date_str):
     return False
 
 if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
     # Test the function
     driver = setup_driver()
     try:
         if update_allotmet(driver):
-            print("Successfully logged in and selected hotel")
+            logger.info("Successfully logged in and selected hotel")
         else:
-            print("Failed to login or select hotel")
+            logger.error("Failed to login or select hotel")
     finally:
         # driver.quit()  # Commented out to keep browser open
         pass 
\ No newline at end of file
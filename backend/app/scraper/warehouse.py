@@ -0,0 +1,260 @@
+"""
+Single SQLite warehouse shared by every pipeline stage and API route.
+
+All tables live in data/warehouse.db, opened in WAL mode so readers in the
+API never block behind a stage that is writing. Inventory tables are keyed
+on Date (see inventory_store.ensure_table); the allocation table gets its
+schema here. Tables from the old per-stage database files are copied in
+once, the first time the warehouse is opened.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(CURRENT_DIR, 'data')
+WAREHOUSE_DB = 'warehouse.db'
+
+# Per-stage database files replaced by the warehouse and the tables they held
+LEGACY_DATABASES = {
+    'pms_inventory_raw.db': ['pms_inventory'],
+    'pms_inventory_processed.db': ['pms_inventory_processed', 'pending_changes'],
+    'cm_inventory_processed.db': ['cm_inventory_processed', 'pending_changes'],
+    'combined_inventory.db': ['combined_inventory'],
+    'inventory_allocation.db': ['daily_inventory_allocation'],
+    'scrape_metrics.db': ['scrape_runs', 'scrape_run_spans']
+}
+
+ALLOCATION_TABLE = 'daily_inventory_allocation'
+ALLOCATION_COLUMNS = {
+    'Date': 'DATE PRIMARY KEY',
+    'DayOfWeek': 'TEXT',
+    'Season': 'TEXT',
+    'Occupancy': 'REAL',
+    'DemandLevel': 'TEXT',
+    'Deluxe Remaining Inventory': 'INTEGER',
+    'Deluxe Online Inventory': 'INTEGER',
+    'Deluxe BAR Rate': 'TEXT',
+    'Premiere Remaining Inventory': 'INTEGER',
+    'Premiere Online Inventory': 'INTEGER',
+    'Premiere BAR Rate': 'TEXT'
+}
+
+# Per-date fingerprint of the inputs each allocation row was computed from
+ALLOCATION_INPUTS_TABLE = 'allocation_inputs'
+
+# Legacy files already copied in, so they are migrated once and not on every start
+MIGRATIONS_TABLE = 'legacy_migrations'
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+# Set by set_warehouse_path to send default connections elsewhere (e.g. a benchmark's scratch copy)
+_warehouse_override = None
+
+def warehouse_path(data_dir=None):
+    if data_dir is None and _warehouse_override:
+        return _warehouse_override
+    return os.path.join(data_dir or DATA_DIR, WAREHOUSE_DB)
+
+def set_warehouse_path(db_path):
+    """Open db_path instead of data/warehouse.db by default (None restores it); returns the previous override"""
+    global _warehouse_override
+    previous = _warehouse_override
+    _warehouse_override = db_path
+    return previous
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def connect(db_path=None, row_factory=None):
+    """
+    Open the warehouse in WAL mode, migrating the legacy per-stage files the
+    first time a process opens it.
+    """
+    db_path = db_path or warehouse_path()
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')  # Durable at checkpoints, no fsync per commit
+    conn.execute('PRAGMA foreign_keys=ON')
+    if row_factory is not None:
+        conn.row_factory = row_factory
+
+    if db_path not in _migrated:
+        with _migrate_lock:
+            if db_path not in _migrated:
+                migrate_legacy_databases(conn, os.path.dirname(db_path))
+                ensure_allocation_table(conn)
+                _migrated.add(db_path)
+    return conn
+
+@contextmanager
+def connection(db_path=None, row_factory=None):
+    """Open the warehouse for the duration of a with-block"""
+    conn = connect(db_path, row_factory)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+def count_rows(conn, table):
+    if not table_exists(conn, table):
+        return 0
+    return conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+
+def migrate_legacy_databases(conn, data_dir=None, remove_legacy=False):
+    """
+    Copy tables from the per-stage database files into the warehouse, once
+    per file: each migrated file is recorded in legacy_migrations and
+    skipped afterwards, so stale rows such as old pending changes are not
+    copied in again on the next start. Tables already present in the
+    warehouse are left alone. Returns {table: rows copied}.
+    """
+    data_dir = data_dir or DATA_DIR
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            filename TEXT PRIMARY KEY,
+            migrated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    done = {row[0] for row in conn.execute(f"SELECT filename FROM {MIGRATIONS_TABLE}")}
+    copied = {}
+    for filename, tables in LEGACY_DATABASES.items():
+        legacy_path = os.path.join(data_dir, filename)
+        if filename in done or not os.path.exists(legacy_path):
+            continue
+        conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+        try:
+            for table in tables:
+                schema = conn.execute(
+                    "SELECT sql FROM legacy.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+                ).fetchone()
+                if schema is None:
+                    continue
+                if table == 'pending_changes':
+                    # Both processed stages queue into one pending table
+                    conn.execute(schema[0].replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+                    conn.execute("INSERT OR IGNORE INTO main.pending_changes SELECT * FROM legacy.pending_changes")
+                    continue
+                if table_exists(conn, table):
+                    continue
+                conn.execute(schema[0])
+                for index_sql, in conn.execute(
+                    "SELECT sql FROM legacy.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table,)
+                ).fetchall():
+                    conn.execute(index_sql)
+                conn.execute(f"INSERT INTO main.{_quote(table)} SELECT * FROM legacy.{_quote(table)}")
+                copied[table] = count_rows(conn, table)
+                logger.info("Migrated %s rows of %s from %s", copied[table], table, filename)
+            conn.execute(f"INSERT INTO {MIGRATIONS_TABLE} (filename) VALUES (?)", (filename,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+        if remove_legacy:
+            os.remove(legacy_path)
+            logger.info("Removed %s", legacy_path)
+    return copied
+
+def _allocation_is_keyed(conn):
+    return any(row[1] == 'Date' and row[5] for row in conn.execute(f"PRAGMA table_info({ALLOCATION_TABLE})"))
+
+def ensure_allocation_table(conn):
+    """Create the allocation table with a Date key, rebuilding one written by to_sql"""
+    if table_exists(conn, ALLOCATION_TABLE) and not _allocation_is_keyed(conn):
+        existing = pd.read_sql_query(f"SELECT * FROM {ALLOCATION_TABLE}", conn)
+        conn.execute(f"DROP TABLE {ALLOCATION_TABLE}")
+        _create_allocation_table(conn)
+        if not existing.empty:
+            _insert_allocation(conn, existing)
+        conn.commit()
+        logger.info("Rebuilt %s with a Date primary key", ALLOCATION_TABLE)
+    else:
+        _create_allocation_table(conn)
+
+def _create_allocation_table(conn):
+    definitions = ', '.join(f"{_quote(col)} {col_type}" for col, col_type in ALLOCATION_COLUMNS.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {ALLOCATION_TABLE} ({definitions})")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{ALLOCATION_TABLE}_season ON {ALLOCATION_TABLE} (Season)")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ALLOCATION_INPUTS_TABLE} (
+            Date TEXT PRIMARY KEY,
+            input_hash TEXT NOT NULL
+        )
+    """)
+
+def _insert_allocation(conn, df):
+    columns = [col for col in ALLOCATION_COLUMNS if col in df.columns]
+    column_list = ', '.join(_quote(col) for col in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    rows = df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {ALLOCATION_TABLE} ({column_list}) VALUES ({placeholders})",
+        [tuple(v.item() if hasattr(v, 'item') else v for v in row) for row in rows]
+    )
+
+def _write_allocation_inputs(conn, inputs):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {ALLOCATION_INPUTS_TABLE} (Date, input_hash) VALUES (?, ?)",
+        list(inputs.items())
+    )
+
+def replace_allocation(conn, df, inputs=None):
+    """
+    Replace the allocation table contents with df in one transaction; returns
+    the row count. inputs ({Date: input hash}) records what the rows were
+    computed from; without it the next incremental yield run starts over.
+    """
+    ensure_allocation_table(conn)
+    with conn:
+        conn.execute(f"DELETE FROM {ALLOCATION_TABLE}")
+        conn.execute(f"DELETE FROM {ALLOCATION_INPUTS_TABLE}")
+        _insert_allocation(conn, df)
+        if inputs:
+            _write_allocation_inputs(conn, inputs)
+    return count_rows(conn, ALLOCATION_TABLE)
+
+def upsert_allocation(conn, df, removed_dates=(), inputs=None):
+    """Write the rows of df over their dates and drop removed_dates in one transaction; returns the row count"""
+    ensure_allocation_table(conn)
+    with conn:
+        _insert_allocation(conn, df)
+        for table in (ALLOCATION_TABLE, ALLOCATION_INPUTS_TABLE):
+            conn.executemany(f"DELETE FROM {table} WHERE Date = ?", [(d,) for d in removed_dates])
+        if inputs:
+            _write_allocation_inputs(conn, inputs)
+    return count_rows(conn, ALLOCATION_TABLE)
+
+def read_allocation(conn):
+    return pd.read_sql_query(f"SELECT * FROM {ALLOCATION_TABLE} ORDER BY Date", conn)
+
+def read_allocation_inputs(conn):
+    """{Date: input hash} of the current allocation rows"""
+    ensure_allocation_table(conn)
+    return dict(conn.execute(f"SELECT Date, input_hash FROM {ALLOCATION_INPUTS_TABLE}"))
+
+if __name__ == "__main__":
+    from .log_config import configure_logging
+    configure_logging()
+    import argparse
+    parser = argparse.ArgumentParser(description="Migrate the per-stage databases into the warehouse")
+    parser.add_argument('--remove-legacy', action='store_true', help="Delete the old files after copying")
+    args = parser.parse_args()
+    with connection() as conn:
+        migrate_legacy_databases(conn, remove_legacy=args.remove_legacy)
+    logger.info("Warehouse ready at %s", warehouse_path())
@@ -0,0 +1,77 @@
+"""
+In-process LRU cache of yield results.
+
+A yield run is a pure function of the combined_inventory contents and the
+yield settings, so results are cached under (data version, canonical
+settings). The data version hashes the combined table's row hashes, so any
+write to it changes the key; the combine stage also clears the cache so
+stale frames don't hold memory. Cached frames are copied on the way in and
+out, callers can modify what they get back.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .inventory_store import HASH_COLUMN
+
+COMBINED_TABLE = 'combined_inventory'
+MAX_ENTRIES = 32
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+def data_version(conn):
+    """Hash of the combined inventory rows, or None when the table doesn't exist"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({COMBINED_TABLE})")]
+    if not columns:
+        return None
+    # Tables not yet rewritten by the combine stage have no row hashes to go on
+    selected = f'Date, {HASH_COLUMN}' if HASH_COLUMN in columns else '*'
+    digest = hashlib.sha1()
+    for row in conn.execute(f'SELECT {selected} FROM {COMBINED_TABLE} ORDER BY Date'):
+        digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+def cache_key(version, settings):
+    """Key for settings against data version; settings must be JSON-serializable"""
+    return version + ':' + json.dumps(settings, sort_keys=True, separators=(',', ':'), default=str)
+
+def get_or_compute(key, compute):
+    """
+    The cached frame for key, or compute() stored under key. None results
+    (failed runs) are returned but never cached.
+    """
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return _entries[key].copy()
+        _stats['misses'] += 1
+
+    result = compute()
+    if result is None:
+        return None
+
+    with _lock:
+        _entries[key] = result.copy()
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats['evictions'] += 1
+    return result
+
+def invalidate():
+    """Drop every cached result"""
+    with _lock:
+        if _entries:
+            _stats['invalidations'] += 1
+        _entries.clear()
+
+def stats():
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return dict(_stats, entries=len(_entries), max_entries=MAX_ENTRIES,
+                    hit_rate=round(_stats['hits'] / lookups, 3) if lookups else None)
@@ -0,0 +1,203 @@
+"""
+What-if evaluation of many custom yield configurations at once.
+
+The combined inventory is loaded, cleaned and given seasons once. Each
+scenario only bins demand with its own settings, after which every
+scenario's rows are stacked and run through yielder.yield_arrays in one
+vectorized pass, with thresholds, caps and override settings as per-row
+arrays. Large grids can be split over a process pool. Nothing is written
+to the live allocation table.
+"""
+
+import itertools
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .yielder import (
+    load_and_clean_data, yield_arrays, _inventory_column,
+    DEMAND_BINS, DEMAND_LABELS, VERY_LOW_THRESHOLD_PCT, LOW_THRESHOLD_PCT, ROOM_CAPS,
+    DELUXE_OVERRIDE_OCCUPANCY, DELUXE_OVERRIDE_PREMIERE, DELUXE_OVERRIDE_AMOUNT, YIELD_MATRIX
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_SCENARIOS = 1000
+POOL_MIN_SCENARIOS = 50  # Smaller batches finish faster in-process than a pool starts
+ROOMS = [('Deluxe Room', 'Deluxe'), ('Premiere Room', 'Premiere')]
+
+DEFAULT_SCENARIO = {
+    'demand_bins': DEMAND_BINS,
+    'demand_labels': DEMAND_LABELS,
+    'very_low_threshold_pct': VERY_LOW_THRESHOLD_PCT,
+    'low_threshold_pct': LOW_THRESHOLD_PCT,
+    'room_caps': ROOM_CAPS,
+    'deluxe_override_occupancy': DELUXE_OVERRIDE_OCCUPANCY,
+    'deluxe_override_premiere': DELUXE_OVERRIDE_PREMIERE,
+    'deluxe_override_amount': DELUXE_OVERRIDE_AMOUNT
+}
+
+def normalize_scenario(config):
+    """
+    config on top of DEFAULT_SCENARIO. Falsy thresholds and caps fall back to
+    the defaults the same way apply_yield_matrix treats them.
+    """
+    unknown = set(config) - set(DEFAULT_SCENARIO)
+    if unknown:
+        raise ValueError(f"Unknown scenario settings: {sorted(unknown)}")
+    scenario = dict(DEFAULT_SCENARIO)
+    scenario.update({key: value for key, value in config.items() if value is not None})
+    for key in ('very_low_threshold_pct', 'low_threshold_pct', 'room_caps', 'demand_bins', 'demand_labels'):
+        scenario[key] = scenario[key] or DEFAULT_SCENARIO[key]
+    if len(scenario['demand_labels']) != len(scenario['demand_bins']) - 1:
+        raise ValueError("demand_labels needs one label per demand bin")
+    known_demand = set(YIELD_MATRIX['Deluxe Room']['Normal'])
+    if not set(scenario['demand_labels']) <= known_demand:
+        raise ValueError(f"demand_labels must be among {sorted(known_demand)}")
+    missing_caps = [room for room, _ in ROOMS if room not in scenario['room_caps']]
+    if missing_caps:
+        raise ValueError(f"room_caps is missing {missing_caps}")
+    # Fail here rather than halfway through the stacked pass
+    for key in ('very_low_threshold_pct', 'low_threshold_pct', 'deluxe_override_occupancy',
+                'deluxe_override_premiere', 'deluxe_override_amount'):
+        float(scenario[key])
+    for room, _ in ROOMS:
+        float(scenario['room_caps'][room])
+    return scenario
+
+def expand_grid(grid, base=None, limit=MAX_SCENARIOS):
+    """
+    Scenarios for every combination of the lists in grid, e.g.
+    {'low_threshold_pct': [0.15, 0.2], 'room_caps': [{...}, {...}]}, on top of base.
+    Raises ValueError before expanding when there would be more than limit.
+    """
+    if not isinstance(grid, dict):
+        raise ValueError("grid must map settings to lists of values")
+    keys = list(grid)
+    values = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+    size = math.prod(len(value) for value in values)
+    if size > limit:
+        raise ValueError(f"At most {limit} scenarios per request, the grid has {size}")
+    return [dict(base or {}, **dict(zip(keys, combination))) for combination in itertools.product(*values)]
+
+def _demand_levels(occupancy, scenario):
+    return pd.cut(
+        occupancy,
+        bins=scenario['demand_bins'],
+        labels=scenario['demand_labels'],
+        include_lowest=True
+    ).astype(object)
+
+def _summary(columns, demand, overrides, window):
+    """Totals and BAR mix per room for one scenario's slice of the stacked arrays"""
+    summary = {'dates': window.stop - window.start, 'skipped': int(pd.isna(demand[window]).sum()),
+               'override_dates': int(overrides[window].sum())}
+    for _, prefix in ROOMS:
+        summary[f'{prefix} Online Total'] = int(columns[f'{prefix} Online Inventory'][window].sum())
+        rates = columns[f'{prefix} BAR Rate'][window]
+        labels, counts = np.unique(rates[rates != ''].astype(str), return_counts=True)
+        summary[f'{prefix} BAR Mix'] = {str(label): int(count) for label, count in zip(labels, counts)}
+    return summary
+
+def evaluate_scenarios(base, scenarios, include_dates=False):
+    """
+    Evaluate normalized scenarios against base (load_and_clean_data output)
+    in one stacked pass; returns one result dict per scenario.
+    """
+    if not scenarios:
+        return []
+    rows = len(base)
+    stacked_demand = np.concatenate([_demand_levels(base['Occupancy'], s).to_numpy() for s in scenarios])
+    valid = pd.notna(stacked_demand)
+
+    def per_row(key, room=None):
+        values = [s[key][room] if room else s[key] for s in scenarios]
+        return np.repeat(np.asarray(values, dtype=float), rows)[valid]
+
+    def tiled(column, dtype):
+        return np.tile(base[column].to_numpy(dtype=dtype), len(scenarios))[valid]
+
+    results = yield_arrays(
+        tiled('Season', object), stacked_demand[valid],
+        tiled('Premiere Room', float), tiled('Deluxe Room', float), tiled('Occupancy', float),
+        per_row('very_low_threshold_pct'), per_row('low_threshold_pct'),
+        {room: per_row('room_caps', room) for room, _ in ROOMS},
+        per_row('deluxe_override_occupancy'), per_row('deluxe_override_premiere'), per_row('deluxe_override_amount')
+    )
+
+    columns = {}
+    for room, prefix in ROOMS:
+        online, bar = results[room]
+        columns[f'{prefix} Online Inventory'] = np.zeros(len(valid))
+        columns[f'{prefix} Online Inventory'][valid] = online
+        columns[f'{prefix} BAR Rate'] = np.full(len(valid), '', dtype=object)
+        columns[f'{prefix} BAR Rate'][valid] = bar
+    overrides = np.zeros(len(valid), dtype=bool)
+    overrides[valid] = results['override']
+
+    dates = base['Date'].dt.strftime('%Y-%m-%d').to_numpy()
+    evaluated = []
+    for i, scenario in enumerate(scenarios):
+        window = slice(i * rows, (i + 1) * rows)
+        result = {'config': scenario, 'summary': _summary(columns, stacked_demand, overrides, window)}
+        if include_dates:
+            frame = pd.DataFrame({'Date': dates, 'Season': base['Season'].to_numpy(),
+                                  'DemandLevel': stacked_demand[window]})
+            for room, prefix in ROOMS:
+                frame[f'{prefix} Online Inventory'] = _inventory_column(columns[f'{prefix} Online Inventory'][window])
+                frame[f'{prefix} BAR Rate'] = columns[f'{prefix} BAR Rate'][window]
+            result['dates'] = frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+        evaluated.append(result)
+    return evaluated
+
+def _evaluate_chunk(args):
+    base, scenarios, include_dates = args
+    return evaluate_scenarios(base, scenarios, include_dates)
+
+def run_scenarios(configs, include_dates=False, workers=None, property_id=None, db_path=None):
+    """
+    Normalize configs, load the shared inventory once and evaluate every
+    scenario. With workers > 1 and at least POOL_MIN_SCENARIOS scenarios the
+    grid is split across that many processes, at most one per CPU. Configs
+    that fail validation come back with an 'error' instead of results.
+    """
+    if len(configs) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios per request, got {len(configs)}")
+    workers = min(workers or 0, os.cpu_count() or 1)
+
+    results = [None] * len(configs)
+    scenarios, positions = [], []
+    for position, config in enumerate(configs):
+        try:
+            scenarios.append(normalize_scenario(config))
+            positions.append(position)
+        except (ValueError, TypeError) as e:
+            results[position] = {'config': config, 'error': str(e)}
+
+    base = load_and_clean_data(db_path=db_path, property_id=property_id)
+    if base is None:
+        raise RuntimeError("Failed to load and clean data")
+    base = base[['Date', 'Season', 'Deluxe Room', 'Premiere Room', 'Occupancy']]
+
+    if workers and workers > 1 and len(scenarios) >= POOL_MIN_SCENARIOS:
+        chunk_size = -(-len(scenarios) // workers)
+        chunks = [scenarios[i:i + chunk_size] for i in range(0, len(scenarios), chunk_size)]
+        logger.info("Evaluating %s scenarios in %s processes", len(scenarios), len(chunks))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            evaluated = [result for chunk in executor.map(
+                _evaluate_chunk, [(base, chunk, include_dates) for chunk in chunks]
+            ) for result in chunk]
+    else:
+        logger.info("Evaluating %s scenarios", len(scenarios))
+        evaluated = evaluate_scenarios(base, scenarios, include_dates)
+
+    for position, result in zip(positions, evaluated):
+        result['id'] = position
+        results[position] = result
+    for position, result in enumerate(results):
+        result.setdefault('id', position)
+    return results
@@ -1,8 +1,17 @@
+import hashlib
+import json
+import logging
+import numpy as np
 import pandas as pd
 from tabulate import tabulate
-from datetime import datetime
 import os
 import sqlite3
+from . import warehouse
+from .inventory_store import read_table, clear_pending_changes, HASH_COLUMN
+from .season_calendar import load_ranges, assign_seasons
+from . import yield_cache
+
+logger = logging.getLogger(__name__)
 
 # Demand level configuration
 DEMAND_BINS = [0, 70, 85, 100]  # Bins for Low, Medium, High demand
@@ -23,6 +32,67 @@ DELUXE_OVERRIDE_OCCUPANCY = 70  # Override threshold for occupancy
 DELUXE_OVERRIDE_PREMIERE = 61   # Override threshold for Premiere inventory
 DELUXE_OVERRIDE_AMOUNT = 2      # Amount of Deluxe rooms to open in override
 
+# Base BAR per room type, season and demand level
+YIELD_MATRIX = {
+    'Deluxe Room': {
+        'Normal': {
+            'High': {'bar': 'BAR4'},
+            'Medium': {'bar': 'BAR5'},
+            'Low': {'bar': 'BAR6'}
+        },
+        'Shoulder': {
+            'High': {'bar': 'BAR3'},
+            'Medium': {'bar': 'BAR4'},
+            'Low': {'bar': 'BAR5'}
+        },
+        'High': {
+            'High': {'bar': 'BAR2'},
+            'Medium': {'bar': 'BAR3'},
+            'Low': {'bar': 'BAR4'}
+        },
+        'Peak': {
+            'High': {'bar': 'BAR2'},
+            'Medium': {'bar': 'BAR3'},
+            'Low': {'bar': 'BAR3'}
+        }
+    },
+    'Premiere Room': {
+        'Normal': {
+            'High': {'bar': 'BAR4'},
+            'Medium': {'bar': 'BAR5'},
+            'Low': {'bar': 'BAR6'}
+        },
+        'Shoulder': {
+            'High': {'bar': 'BAR3'},
+            'Medium': {'bar': 'BAR4'},
+            'Low': {'bar': 'BAR5'}
+        },
+        'High': {
+            'High': {'bar': 'BAR2'},
+            'Medium': {'bar': 'BAR3'},
+            'Low': {'bar': 'BAR4'}
+        },
+        'Peak': {
+            'High': {'bar': 'BAR2'},
+            'Medium': {'bar': 'BAR3'},
+            'Low': {'bar': 'BAR3'}
+        }
+    }
+}
+
+VALID_BAR_RATES = {'BAR2', 'BAR3', 'BAR4', 'BAR5', 'BAR6'}
+BAR_RATE_ORDER = {'BAR6': 5, 'BAR5': 4, 'BAR4': 3, 'BAR3': 2, 'BAR2': 1}  # Lower number = more expensive
+BAR_RATE_REVERSE = {1: 'BAR2', 2: 'BAR3', 3: 'BAR4', 4: 'BAR5', 5: 'BAR6'}
+
+BAR_LABELS = np.array([''] + [BAR_RATE_REVERSE[rank] for rank in sorted(BAR_RATE_REVERSE)], dtype=object)
+
+COMBINED_TABLE = 'combined_inventory'
+ALLOCATION_OUTPUT_COLUMNS = [
+    'Date', 'DayOfWeek', 'Season', 'Occupancy', 'DemandLevel',
+    'Deluxe Remaining Inventory', 'Deluxe Online Inventory', 'Deluxe BAR Rate',
+    'Premiere Remaining Inventory', 'Premiere Online Inventory', 'Premiere BAR Rate'
+]
+
 # Get the absolute path to the data directory within the scraper folder
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(CURRENT_DIR, 'data')
@@ -38,39 +108,42 @@ def should_override_deluxe(occupancy, premiere_inventory, deluxe_inventory):
             (occupancy < DELUXE_OVERRIDE_OCCUPANCY or premiere_inventory > DELUXE_OVERRIDE_PREMIERE))
 
 # Load and clean the dataset
-def load_and_clean_data(db_path=None, demand_bins=None, demand_labels=None):
+def load_and_clean_data(db_path=None, demand_bins=None, demand_labels=None, property_id=None, dates=None):
     # Use default values if not provided
     demand_bins = demand_bins or DEMAND_BINS
     demand_labels = demand_labels or DEMAND_LABELS
     
-    # Use the correct absolute path for the database
+    # Use the warehouse unless another database is given
     if db_path is None:
-        db_path = os.path.join(DATA_DIR, 'combined_inventory.db')
+        db_path = warehouse.warehouse_path()
     
-    print(f"Attempting to load data from: {db_path}")
+    logger.debug("Attempting to load data from: %s", db_path)
     
     try:
         # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
-        print("Successfully connected to database")
+        conn = warehouse.connect(db_path)
+        logger.debug("Successfully connected to database")
         
         # Read data from the combined_inventory table
-        data = pd.read_sql_query("SELECT * FROM combined_inventory", conn)
-        print(f"Successfully read {len(data)} rows from database")
+        data = read_table(conn, COMBINED_TABLE, dates)
+        logger.info("Successfully read %s rows from database", len(data))
+
+        # Season ranges for the property, compiled into a per-day lookup below
+        season_ranges = load_ranges(conn, property_id)
         
         # Close the connection
         conn.close()
         
         # Print column names for debugging
-        print("Available columns:", data.columns.tolist())
+        logger.debug("Available columns: %s", data.columns.tolist())
         
     except sqlite3.OperationalError as e:
-        print(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         if "no such table" in str(e):
-            print("Error: combined_inventory table does not exist. Please run combine inventory first.")
+            logger.error("Error: combined_inventory table does not exist. Please run combine inventory first.")
         return None
     except Exception as e:
-        print(f"Error reading from database: {e}")
+        logger.error("Error reading from database: %s", e)
         return None
     
     # Map the actual column names to our expected names
@@ -87,44 +160,24 @@ def load_and_clean_data(db_path=None, demand_bins=None, demand_labels=None):
     relevant_columns = ['Date', 'Deluxe Room', 'Premiere Room', 'Occupancy']
     missing_columns = [col for col in relevant_columns if col not in data.columns]
     if missing_columns:
-        print(f"Error: Missing required columns: {missing_columns}")
-        print("Available columns:", data.columns.tolist())
+        logger.error("Error: Missing required columns: %s", missing_columns)
+        logger.debug("Available columns: %s", data.columns.tolist())
         return None
     
     data = data[relevant_columns]
     
     if data.isnull().any().any():
-        print("Warning: Missing values detected. Filling with 0 for inventory and median for Occupancy.")
+        logger.warning("Warning: Missing values detected. Filling with 0 for inventory and median for Occupancy.")
         data[['Deluxe Room', 'Premiere Room']] = data[['Deluxe Room', 'Premiere Room']].fillna(0)
         data['Occupancy'] = data['Occupancy'].fillna(data['Occupancy'].median())
     
     try:
         data['Date'] = pd.to_datetime(data['Date'])
     except Exception as e:
-        print(f"Error: Invalid date format. {e}")
+        logger.error("Error: Invalid date format. %s", e)
         return None
     
-    def assign_season(date):
-        year = date.year
-        date_no_year = date.replace(year=2025)
-        if (datetime(2025, 1, 1) <= date_no_year <= datetime(2025, 1, 5) or
-            datetime(2025, 12, 27) <= date_no_year <= datetime(2025, 12, 31) or
-            date >= datetime(2026, 1, 1) and date <= datetime(2026, 1, 3)):
-            return 'Peak'
-        elif (datetime(2025, 1, 6) <= date_no_year <= datetime(2025, 5, 31) or
-              datetime(2025, 10, 1) <= date_no_year <= datetime(2025, 12, 22)):
-            return 'Normal'
-        elif (datetime(2025, 6, 1) <= date_no_year <= datetime(2025, 6, 30) or
-              datetime(2025, 9, 1) <= date_no_year <= datetime(2025, 9, 30)):
-            return 'Shoulder'
-        elif (datetime(2025, 7, 1) <= date_no_year <= datetime(2025, 8, 31) or
-              datetime(2025, 12, 23) <= date_no_year <= datetime(2025, 12, 26)):
-            return 'High'
-        else:
-            print(f"Warning: Unassigned season for {date}. Defaulting to Normal.")
-            return 'Normal'
-    
-    data['Season'] = data['Date'].apply(assign_season)
+    data['Season'] = assign_seasons(data['Date'], season_ranges)
     
     try:
         data['DemandLevel'] = pd.cut(
@@ -134,18 +187,19 @@ def load_and_clean_data(db_path=None, demand_bins=None, demand_labels=None):
             include_lowest=True
         )
     except Exception as e:
-        print(f"Error: Invalid Occupancy values. {e}")
+        logger.error("Error: Invalid Occupancy values. %s", e)
         return None
     
     data['DayOfWeek'] = data['Date'].dt.day_name()
     
     if (data['Deluxe Room'] < 0).any() or (data['Premiere Room'] < 0).any():
-        print("Warning: Negative inventory values detected.")
+        logger.warning("Warning: Negative inventory values detected.")
     
     return data
 
 # Apply yield matrix with limited online allotment and BAR based on remaining inventory
-def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None, room_caps=None):
+def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None, room_caps=None,
+                       engine='vectorized'):
     # Use default values if not provided
     very_low_threshold_pct = very_low_threshold_pct or VERY_LOW_THRESHOLD_PCT
     low_threshold_pct = low_threshold_pct or LOW_THRESHOLD_PCT
@@ -155,60 +209,143 @@ def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None
     required_columns = ['Deluxe Room', 'Premiere Room']
     for col in required_columns:
         if col not in data.columns:
-            print(f"Error: Required column '{col}' not found! Available columns: {data.columns.tolist()}")
+            logger.error(
+                "Error: Required column '%s' not found! Available columns: %s",
+                col, data.columns.tolist()
+            )
             raise Exception(f"Required column '{col}' not found! Available columns: {data.columns.tolist()}")
 
-    yield_matrix = {
-        'Deluxe Room': {
-            'Normal': {
-                'High': {'bar': 'BAR4'},
-                'Medium': {'bar': 'BAR5'},
-                'Low': {'bar': 'BAR6'}
-            },
-            'Shoulder': {
-                'High': {'bar': 'BAR3'},
-                'Medium': {'bar': 'BAR4'},
-                'Low': {'bar': 'BAR5'}
-            },
-            'High': {
-                'High': {'bar': 'BAR2'},
-                'Medium': {'bar': 'BAR3'},
-                'Low': {'bar': 'BAR4'}
-            },
-            'Peak': {
-                'High': {'bar': 'BAR2'},
-                'Medium': {'bar': 'BAR3'},
-                'Low': {'bar': 'BAR3'}
-            }
-        },
-        'Premiere Room': {
-            'Normal': {
-                'High': {'bar': 'BAR4'},
-                'Medium': {'bar': 'BAR5'},
-                'Low': {'bar': 'BAR6'}
-            },
-            'Shoulder': {
-                'High': {'bar': 'BAR3'},
-                'Medium': {'bar': 'BAR4'},
-                'Low': {'bar': 'BAR5'}
-            },
-            'High': {
-                'High': {'bar': 'BAR2'},
-                'Medium': {'bar': 'BAR3'},
-                'Low': {'bar': 'BAR4'}
-            },
-            'Peak': {
-                'High': {'bar': 'BAR2'},
-                'Medium': {'bar': 'BAR3'},
-                'Low': {'bar': 'BAR3'}
-            }
-        }
-    }
-    
-    valid_bar_rates = {'BAR2', 'BAR3', 'BAR4', 'BAR5', 'BAR6'}
-    bar_rate_order = {'BAR6': 5, 'BAR5': 4, 'BAR4': 3, 'BAR3': 2, 'BAR2': 1}  # Lower number = more expensive
-    bar_rate_reverse = {1: 'BAR2', 2: 'BAR3', 3: 'BAR4', 4: 'BAR5', 5: 'BAR6'}
-    
+    if engine == 'vectorized':
+        return _apply_yield_matrix_vectorized(data, very_low_threshold_pct, low_threshold_pct, room_caps)
+    if engine == 'rowwise':
+        return _apply_yield_matrix_rowwise(data, very_low_threshold_pct, low_threshold_pct, room_caps)
+    raise ValueError(f"Unknown yield engine: {engine}")
+
+def _lookup_indices(values, labels):
+    """Positions of values in labels; unknown values raise KeyError like the dict lookup does"""
+    indices = pd.Index(labels).get_indexer(values)
+    if (indices < 0).any():
+        raise KeyError(values[indices < 0][0])
+    return indices
+
+def _bar_rank_table(room):
+    """
+    Base BAR rank of room as a NumPy lookup array indexed [season, demand],
+    with the season and demand labels of its axes
+    """
+    seasons = list(YIELD_MATRIX[room])
+    demands = list(YIELD_MATRIX[room][seasons[0]])
+    ranks = np.empty((len(seasons), len(demands)), dtype=np.int64)
+    for s, season in enumerate(seasons):
+        for d, demand in enumerate(demands):
+            base_bar = YIELD_MATRIX[room][season][demand]['bar']
+            ranks[s, d] = BAR_RATE_ORDER[base_bar] if base_bar in VALID_BAR_RATES else BAR_RATE_ORDER['BAR5']
+    return seasons, demands, ranks
+
+def _first_min(*arrays):
+    """Element-wise min() with Python's semantics: the first smallest argument wins, NaN never does"""
+    result = arrays[0]
+    for array in arrays[1:]:
+        result = np.where(array < result, array, result)
+    return result
+
+def _online_allotment(remaining, room_cap):
+    """get_online_allotment for a whole column; values between the integer tiers fall through to the last one"""
+    return np.select(
+        [remaining <= 0,
+         (remaining >= 1) & (remaining <= 5),
+         (remaining >= 6) & (remaining <= 10),
+         (remaining >= 11) & (remaining <= 50)],
+        [0.0,
+         _first_min(2.0, remaining, room_cap),
+         _first_min(5.0, remaining, room_cap),
+         _first_min(10.0, remaining, room_cap)],
+        _first_min(30.0, remaining, room_cap)
+    )
+
+def _adjusted_bar(base_rank, remaining, capacity, very_low_threshold_pct, low_threshold_pct):
+    """adjust_bar_rate for a whole column: shift the base rank up 2 (very low) or 1 (low) levels"""
+    shift = np.select(
+        [remaining <= capacity * very_low_threshold_pct, remaining <= capacity * low_threshold_pct],
+        [2, 1],
+        0
+    )
+    return BAR_LABELS[np.maximum(1, base_rank - shift)]
+
+def _inventory_column(values):
+    """Keep the int64 column the row-wise writes leave unless a fractional allotment was written"""
+    if np.all(np.mod(values, 1) == 0):
+        return values.astype(np.int64)
+    return values
+
+def yield_arrays(seasons, demands, premiere, deluxe, occupancy, very_low_threshold_pct, low_threshold_pct,
+                 room_caps, override_occupancy=None, override_premiere=None, override_amount=None):
+    """
+    The yield matrix over NumPy arrays of valid rows. Thresholds, room caps
+    and override settings may be scalars or arrays aligned with the rows, so
+    rows evaluated under different configurations can share one pass.
+    Returns {room: (online inventory, BAR rate), 'override': deluxe override mask}.
+    """
+    override_occupancy = DELUXE_OVERRIDE_OCCUPANCY if override_occupancy is None else override_occupancy
+    override_premiere = DELUXE_OVERRIDE_PREMIERE if override_premiere is None else override_premiere
+    override_amount = DELUXE_OVERRIDE_AMOUNT if override_amount is None else override_amount
+
+    results = {}
+    for room, remaining in (('Premiere Room', premiere), ('Deluxe Room', deluxe)):
+        season_labels, demand_labels, ranks = _bar_rank_table(room)
+        base_rank = ranks[_lookup_indices(seasons, season_labels), _lookup_indices(demands, demand_labels)]
+        room_cap = np.asarray(room_caps[room], dtype=float)
+        online = _online_allotment(remaining, room_cap)
+        if room == 'Deluxe Room':
+            override = (deluxe < 1) & ((occupancy < override_occupancy) | (premiere > override_premiere))
+            online = np.where(override, np.asarray(override_amount, dtype=float), online)
+            results['override'] = override
+        bar = _adjusted_bar(base_rank, remaining, room_cap, very_low_threshold_pct, low_threshold_pct)
+        results[room] = (online, bar)
+    return results
+
+def _apply_yield_matrix_vectorized(data, very_low_threshold_pct, low_threshold_pct, room_caps):
+    data['Deluxe Online Inventory'] = 0
+    data['Deluxe BAR Rate'] = ''
+    data['Premiere Online Inventory'] = 0
+    data['Premiere BAR Rate'] = ''
+
+    demand = data['DemandLevel'].astype(object)
+    valid = demand.notna().to_numpy()
+    if not valid.all():
+        logger.warning("Warning: Skipping %s rows due to invalid DemandLevel.", int((~valid).sum()))
+        if logger.isEnabledFor(logging.DEBUG):
+            for idx, date in data.loc[~valid, 'Date'].items():
+                logger.debug("Skipped row %s (%s)", idx, date.date())
+    if not valid.any():
+        return data
+
+    seasons = data['Season'].to_numpy(dtype=object)[valid]
+    demands = demand.to_numpy()[valid]
+    premiere = data['Premiere Room'].to_numpy(dtype=float)[valid]
+    deluxe = data['Deluxe Room'].to_numpy(dtype=float)[valid]
+    occupancy = data['Occupancy'].to_numpy(dtype=float)[valid]
+
+    results = yield_arrays(seasons, demands, premiere, deluxe, occupancy,
+                           very_low_threshold_pct, low_threshold_pct, room_caps)
+    if results['override'].any():
+        logger.info(
+            "Deluxe Room: Override applied on %s dates - Opening %s rooms",
+            int(results['override'].sum()), DELUXE_OVERRIDE_AMOUNT
+        )
+
+    for room, prefix in (('Deluxe Room', 'Deluxe'), ('Premiere Room', 'Premiere')):
+        online, bar = results[room]
+        online_column = np.zeros(len(data))
+        online_column[valid] = online
+        bar_column = np.full(len(data), '', dtype=object)
+        bar_column[valid] = bar
+        data[f'{prefix} Online Inventory'] = _inventory_column(online_column)
+        data[f'{prefix} BAR Rate'] = bar_column
+    return data
+
+def _apply_yield_matrix_rowwise(data, very_low_threshold_pct, low_threshold_pct, room_caps):
+    """The original per-row implementation, kept to check the vectorized engine against"""
     data['Deluxe Online Inventory'] = 0
     data['Deluxe BAR Rate'] = ''
     data['Premiere Online Inventory'] = 0
@@ -218,12 +355,15 @@ def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None
         season = row['Season']
         demand = row['DemandLevel']
         if pd.isna(demand):
-            print(f"Warning: Skipping row {idx} due to invalid DemandLevel for {row['Date'].strftime('%Y-%m-%d')}.")
+            logger.warning("Warning: Skipping row %s due to invalid DemandLevel for %s.", idx, row['Date'].date())
             continue
 
         # Defensive check for required keys in the row
         if 'Premiere Room' not in row or 'Deluxe Room' not in row:
-            print(f"Error: Row {idx} is missing 'Premiere Room' or 'Deluxe Room'. Row keys: {row.keys().tolist()}")
+            logger.error(
+                "Error: Row %s is missing 'Premiere Room' or 'Deluxe Room'. Row keys: %s",
+                idx, row.keys().tolist()
+            )
             continue
 
         premiere_remaining = row['Premiere Room']
@@ -249,25 +389,31 @@ def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None
             very_low_threshold = capacity * very_low_threshold_pct
             low_threshold = capacity * low_threshold_pct
             
-            base_rank = bar_rate_order.get(base_bar, 4)  # Default to BAR5 if invalid
+            base_rank = BAR_RATE_ORDER.get(base_bar, 4)  # Default to BAR5 if invalid
             if remaining_inventory <= very_low_threshold:
                 new_rank = max(1, base_rank - 2)  # Shift up 2 levels, cap at BAR2
-                print(f"{row['Date'].strftime('%Y-%m-%d')} {room_type}: Remaining {remaining_inventory} (Very Low) → {base_bar} to {bar_rate_reverse[new_rank]}")
+                logger.debug("%s %s: Remaining %s (Very Low) → %s to %s",
+                             row['Date'].date(), room_type, remaining_inventory, base_bar, BAR_RATE_REVERSE[new_rank])
             elif remaining_inventory <= low_threshold:
                 new_rank = max(1, base_rank - 1)  # Shift up 1 level
-                print(f"{row['Date'].strftime('%Y-%m-%d')} {room_type}: Remaining {remaining_inventory} (Low) → {base_bar} to {bar_rate_reverse[new_rank]}")
+                logger.debug("%s %s: Remaining %s (Low) → %s to %s",
+                             row['Date'].date(), room_type, remaining_inventory, base_bar, BAR_RATE_REVERSE[new_rank])
             else:
                 new_rank = base_rank  # No change
-                print(f"{row['Date'].strftime('%Y-%m-%d')} {room_type}: Remaining {remaining_inventory} (Moderate/High) → {base_bar}")
-            return bar_rate_reverse.get(new_rank, 'BAR5')
+                logger.debug("%s %s: Remaining %s (Moderate/High) → %s",
+                             row['Date'].date(), room_type, remaining_inventory, base_bar)
+            return BAR_RATE_REVERSE.get(new_rank, 'BAR5')
         
         # Premiere Room
         room = 'Premiere Room'
         remaining = premiere_remaining
         online_inventory = get_online_allotment(remaining, room_caps[room])
-        base_bar = yield_matrix[room][season][demand]['bar']
-        if base_bar not in valid_bar_rates:
-            print(f"Warning: Invalid Premiere BAR Rate '{base_bar}' for {row['Date'].strftime('%Y-%m-%d')}. Using BAR5.")
+        base_bar = YIELD_MATRIX[room][season][demand]['bar']
+        if base_bar not in VALID_BAR_RATES:
+            logger.warning(
+                "Warning: Invalid Premiere BAR Rate '%s' for %s. Using BAR5.",
+                base_bar, row['Date'].date()
+            )
             base_bar = 'BAR5'
         bar_rate = adjust_bar_rate(base_bar, remaining, room, demand, season)
         
@@ -281,13 +427,19 @@ def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None
         # Check for override conditions
         if should_override_deluxe(row['Occupancy'], premiere_remaining, remaining):
             online_inventory = DELUXE_OVERRIDE_AMOUNT
-            print(f"{row['Date'].strftime('%Y-%m-%d')} Deluxe Room: Override applied - Opening {online_inventory} rooms (Occupancy: {row['Occupancy']:.2f}%, Premiere: {premiere_remaining}, Deluxe: {remaining})")
+            logger.debug(
+                "%s Deluxe Room: Override applied - Opening %s rooms (Occupancy: %.2f%%, Premiere: %s, Deluxe: %s)",
+                row['Date'].date(), online_inventory, row['Occupancy'], premiere_remaining, remaining
+            )
         else:
             online_inventory = get_online_allotment(remaining, room_caps[room])
         
-        base_bar = yield_matrix[room][season][demand]['bar']
-        if base_bar not in valid_bar_rates:
-            print(f"Warning: Invalid Deluxe BAR Rate '{base_bar}' for {row['Date'].strftime('%Y-%m-%d')}. Using BAR5.")
+        base_bar = YIELD_MATRIX[room][season][demand]['bar']
+        if base_bar not in VALID_BAR_RATES:
+            logger.warning(
+                "Warning: Invalid Deluxe BAR Rate '%s' for %s. Using BAR5.",
+                base_bar, row['Date'].date()
+            )
             base_bar = 'BAR5'
         bar_rate = adjust_bar_rate(base_bar, remaining, room, demand, season)
         
@@ -296,101 +448,244 @@ def apply_yield_matrix(data, very_low_threshold_pct=None, low_threshold_pct=None
     
     return data
 
-# Main execution
-def main():
-    try:
-        print("Starting yield calculation process...")
-        data = load_and_clean_data()
+INVENTORY_LEVELS = np.array(['Very Low', 'Low', 'Moderate/High'], dtype=object)
+
+def explain_yield(data, very_low_threshold_pct=None, low_threshold_pct=None, room_caps=None):
+    """
+    Decision trace of a yielded frame (apply_yield_matrix output), one row
+    per date and room: the base BAR from the matrix, the inventory level that
+    shifted it, the override and the resulting rate and allotment. Built from
+    whole columns and only when asked for, the yield itself never formats rows.
+    """
+    very_low_threshold_pct = very_low_threshold_pct or VERY_LOW_THRESHOLD_PCT
+    low_threshold_pct = low_threshold_pct or LOW_THRESHOLD_PCT
+    room_caps = room_caps or ROOM_CAPS
+
+    rows = data[data['DemandLevel'].notna().to_numpy()]
+    seasons = rows['Season'].to_numpy(dtype=object)
+    demands = rows['DemandLevel'].astype(object).to_numpy()
+    frames = []
+    for room, prefix in (('Deluxe Room', 'Deluxe'), ('Premiere Room', 'Premiere')):
+        remaining = rows[room].to_numpy(dtype=float)
+        season_labels, demand_labels, ranks = _bar_rank_table(room)
+        base_rank = ranks[_lookup_indices(seasons, season_labels), _lookup_indices(demands, demand_labels)]
+        capacity = float(room_caps[room])
+        level = np.select(
+            [remaining <= capacity * very_low_threshold_pct, remaining <= capacity * low_threshold_pct], [0, 1], 2
+        )
+        if room == 'Deluxe Room':
+            override = (remaining < 1) & (
+                (rows['Occupancy'].to_numpy(dtype=float) < DELUXE_OVERRIDE_OCCUPANCY)
+                | (rows['Premiere Room'].to_numpy(dtype=float) > DELUXE_OVERRIDE_PREMIERE)
+            )
+        else:
+            override = np.zeros(len(rows), dtype=bool)
+        frames.append(pd.DataFrame({
+            'Date': rows['Date'].to_numpy(),
+            'Room': room,
+            'Season': seasons,
+            'DemandLevel': demands,
+            'Remaining': rows[room].to_numpy(),
+            'Base BAR': BAR_LABELS[base_rank],
+            'Inventory Level': INVENTORY_LEVELS[level],
+            'BAR Rate': rows[f'{prefix} BAR Rate'].to_numpy(),
+            'Override': override,
+            'Online Inventory': rows[f'{prefix} Online Inventory'].to_numpy()
+        }))
+    explain = pd.concat(frames, ignore_index=True)
+    return explain.sort_values(['Date', 'Room'], kind='stable', ignore_index=True)
+
+def compute_yield(demand_bins=None, demand_labels=None, very_low_threshold_pct=None, low_threshold_pct=None,
+                  room_caps=None, property_id=None, db_path=None):
+    """
+    load_and_clean_data followed by apply_yield_matrix, memoized on the
+    combined inventory version, the property's season ranges and the settings.
+    Returns None when the data can't be loaded.
+    """
+    def compute():
+        data = load_and_clean_data(db_path, demand_bins, demand_labels, property_id)
         if data is None:
-            print("Error: Failed to load and clean data")
             return None
+        return apply_yield_matrix(data, very_low_threshold_pct, low_threshold_pct, room_caps)
+
+    with warehouse.connection(db_path) as conn:
+        version = yield_cache.data_version(conn)
+        season_ranges = load_ranges(conn, property_id)
+    if version is None:
+        return compute()
+
+    settings = {
+        'db_path': db_path or warehouse.warehouse_path(),
+        'property': property_id or '',
+        'season_ranges': season_ranges,
+        'demand_bins': demand_bins or DEMAND_BINS,
+        'demand_labels': demand_labels or DEMAND_LABELS,
+        'very_low_threshold_pct': very_low_threshold_pct or VERY_LOW_THRESHOLD_PCT,
+        'low_threshold_pct': low_threshold_pct or LOW_THRESHOLD_PCT,
+        'room_caps': room_caps or ROOM_CAPS
+    }
+    return yield_cache.get_or_compute(yield_cache.cache_key(version, settings), compute)
+
+def allocation_output(data):
+    """The allocation table layout of a yielded frame"""
+    output = data.rename(columns={
+        'Deluxe Room': 'Deluxe Remaining Inventory',
+        'Premiere Room': 'Premiere Remaining Inventory'
+    })[ALLOCATION_OUTPUT_COLUMNS].copy()
+    output['Date'] = output['Date'].dt.strftime('%Y-%m-%d')
+    output['Occupancy'] = output['Occupancy'].round(2)
+    return output
+
+def _settings_fingerprint(season_ranges):
+    """Hash of everything besides the combined row that an allocation row depends on"""
+    settings = {
+        'season_ranges': season_ranges,
+        'demand_bins': DEMAND_BINS,
+        'demand_labels': DEMAND_LABELS,
+        'very_low_threshold_pct': VERY_LOW_THRESHOLD_PCT,
+        'low_threshold_pct': LOW_THRESHOLD_PCT,
+        'room_caps': ROOM_CAPS,
+        'override': [DELUXE_OVERRIDE_OCCUPANCY, DELUXE_OVERRIDE_PREMIERE, DELUXE_OVERRIDE_AMOUNT],
+        'matrix': YIELD_MATRIX
+    }
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _input_hashes(conn, fingerprint):
+    """{Date: input hash} of the combined rows, or None when the table has no row hashes to go on"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({COMBINED_TABLE})")]
+    if HASH_COLUMN not in columns:
+        return None
+    return {
+        date: hashlib.sha1(f"{fingerprint}:{row_hash}".encode('utf-8')).hexdigest()
+        for date, row_hash in conn.execute(f"SELECT Date, {HASH_COLUMN} FROM {COMBINED_TABLE}")
+    }
+
+def _rows_are_independent(conn):
+    """
+    Whether an allocation row depends on its own combined row only. Missing
+    occupancy is filled with the median of every loaded row, which a partial
+    recompute would get wrong.
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({COMBINED_TABLE})")]
+    if 'Occupancy' not in columns:
+        return False
+    return conn.execute(f"SELECT 1 FROM {COMBINED_TABLE} WHERE Occupancy IS NULL LIMIT 1").fetchone() is None
+
+def update_allocation(changed_dates=None, full_rebuild=False, db_path=None):
+    """
+    Bring the allocation table up to date with combined_inventory.
+
+    Each allocation row remembers a hash of the combined row and yield
+    settings it was computed from. Only dates in changed_dates are
+    recomputed; when it is None they are found by diffing those hashes
+    against the current combined rows, which also picks up removed dates
+    and settings changes. Recomputed rows are upserted, the rest are left
+    alone. Falls back to a full recompute when full_rebuild is set, there
+    is no snapshot yet, or rows can't be computed independently.
+
+    Returns (allocation DataFrame, report) with the recomputed, reused and
+    removed row counts, or (None, report) on failure.
+    """
+    report = {'mode': 'incremental', 'recomputed': 0, 'reused': 0, 'removed': 0}
+    with warehouse.connection(db_path) as conn:
+        if not warehouse.table_exists(conn, COMBINED_TABLE):
+            logger.error("Error: combined_inventory table does not exist. Please run combine inventory first.")
+            return None, report
+        input_hashes = _input_hashes(conn, _settings_fingerprint(load_ranges(conn)))
+        snapshot = warehouse.read_allocation_inputs(conn)
+        allocated = warehouse.count_rows(conn, warehouse.ALLOCATION_TABLE)
+        incremental = (not full_rebuild and input_hashes is not None and bool(snapshot)
+                       and allocated == len(snapshot) and _rows_are_independent(conn))
+
+        if incremental:
+            if changed_dates is None:
+                dates = sorted(d for d, h in input_hashes.items() if snapshot.get(d) != h)
+                removed = sorted(set(snapshot) - set(input_hashes))
+            else:
+                changed_dates = set(changed_dates)
+                dates = sorted(changed_dates & set(input_hashes))
+                removed = sorted((changed_dates & set(snapshot)) - set(input_hashes))
+            report.update(recomputed=len(dates), removed=len(removed),
+                          reused=len(set(snapshot) - set(dates) - set(removed)))
+            logger.info("Incremental yield: %s dates to recompute, %s to remove, %s reused",
+                        len(dates), len(removed), report['reused'])
+            if not dates and not removed:
+                logger.info("No changed dates, allocation is up to date")
+                clear_pending_changes(conn, COMBINED_TABLE)
+                conn.commit()
+                return warehouse.read_allocation(conn), report
+
+    if incremental:
+        data = load_and_clean_data(db_path, dates=dates) if dates else None
+        if dates and data is None:
+            return None, report
+        output = allocation_output(apply_yield_matrix(data)) if dates else pd.DataFrame(columns=ALLOCATION_OUTPUT_COLUMNS)
+    else:
+        report['mode'] = 'full'
+        data = compute_yield(db_path=db_path)
+        if data is None:
+            return None, report
+        output = allocation_output(data)
+        report['recomputed'] = len(output)
+
+    with warehouse.connection(db_path) as conn:
+        if incremental:
+            warehouse.upsert_allocation(conn, output, removed, {d: input_hashes[d] for d in output['Date']})
+        else:
+            warehouse.replace_allocation(conn, output, input_hashes)
+        # The allocation now reflects every combined change
+        clear_pending_changes(conn, COMBINED_TABLE)
+        conn.commit()
+        allocation = warehouse.read_allocation(conn)
+    logger.info("Yield %s: %s rows recomputed, %s reused, %s removed",
+                report['mode'], report['recomputed'], report['reused'], report['removed'])
+    return allocation, report
+
+def run_yield(changed_dates=None, full_rebuild=False):
+    """update_allocation plus the CSV export; returns (allocation, report)"""
+    try:
+        logger.info("Starting yield calculation process...")
+        logger.info("Applying yield matrix...")
+        output, report = update_allocation(changed_dates, full_rebuild)
+        if output is None:
+            logger.error("Error: Failed to load and clean data")
+            return None, report
         
-        print("Applying yield matrix...")
-        data = apply_yield_matrix(data)
-        
-        # Create a copy of the data with the correct column names
-        output = data.copy()
-        
-        # Rename the columns to match the expected output format
-        output = output.rename(columns={
-            'Deluxe Room': 'Deluxe Remaining Inventory',
-            'Premiere Room': 'Premiere Remaining Inventory'
-        })
-        
-        # Select and order the columns for output
-        output = output[[
-            'Date', 'DayOfWeek', 'Season', 'Occupancy', 'DemandLevel',
-            'Deluxe Remaining Inventory', 'Deluxe Online Inventory', 'Deluxe BAR Rate',
-            'Premiere Remaining Inventory', 'Premiere Online Inventory', 'Premiere BAR Rate'
-        ]]
-        
-        # Format the date and occupancy
-        output['Date'] = output['Date'].dt.strftime('%Y-%m-%d')
-        output['Occupancy'] = output['Occupancy'].round(2)
-        
-        print("\n=== Day-by-Day Inventory Allocation ===")
-        print(tabulate(output, headers='keys', tablefmt='grid', showindex=False))
+        # The full table is only rendered when someone will see it
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("=== Day-by-Day Inventory Allocation ===\n%s",
+                         tabulate(output, headers='keys', tablefmt='grid', showindex=False))
         
         # Create data directory if it doesn't exist
         os.makedirs(DATA_DIR, exist_ok=True)
-        print(f"Ensuring data directory exists: {DATA_DIR}")
+        logger.debug("Ensuring data directory exists: %s", DATA_DIR)
         
-        # Save to CSV
+        # Save to CSV when the allocation changed
         csv_path = os.path.join(DATA_DIR, 'daily_inventory_allocation_seasonal.csv')
-        output.to_csv(csv_path, index=False)
-        print(f"Output saved to CSV: '{csv_path}'")
-        
-        # Save to SQLite
-        db_path = os.path.join(DATA_DIR, 'inventory_allocation.db')
-        print(f"Attempting to save to database: {db_path}")
-        
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
-        print("Connected to SQLite database")
-        
-        # Enable date handling in SQLite
-        conn.execute('PRAGMA foreign_keys = ON')
-        
-        # Define SQLite data types for each column
-        dtype = {
-            'Date': 'DATE',
-            'DayOfWeek': 'TEXT',
-            'Season': 'TEXT',
-            'Occupancy': 'REAL',
-            'DemandLevel': 'TEXT',
-            'Deluxe Remaining Inventory': 'INTEGER',
-            'Deluxe Online Inventory': 'INTEGER',
-            'Deluxe BAR Rate': 'TEXT',
-            'Premiere Remaining Inventory': 'INTEGER',
-            'Premiere Online Inventory': 'INTEGER',
-            'Premiere BAR Rate': 'TEXT'
-        }
-        
-        # Save to database
-        output.to_sql('daily_inventory_allocation', conn, if_exists='replace', index=False, dtype=dtype)
-        
-        # Verify the data was written
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM daily_inventory_allocation")
-        count = cursor.fetchone()[0]
-        conn.close()
+        if report['recomputed'] or report['removed'] or not os.path.exists(csv_path):
+            output.to_csv(csv_path, index=False)
+            logger.info("Output saved to CSV: '%s'", csv_path)
 
-        if count == 0:
-            print("Warning: No data was written to the database")
-            return None
+        if output.empty:
+            logger.warning("Warning: No data was written to the database")
+            return None, report
             
-        print(f"Successfully wrote {count} rows to database")
-        return output
+        logger.info("Allocation table holds %s rows", len(output))
+        return output, report
         
     except Exception as e:
-        print(f"Error in main function: {str(e)}")
-        if 'conn' in locals():
-            try:
-                conn.close()
-                print("Database connection closed after error")
-            except:
-                pass
+        logger.error("Error in main function: %s", e)
         raise
 
+# Main execution
+def main(changed_dates=None, full_rebuild=False):
+    return run_yield(changed_dates, full_rebuild)[0]
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    from .log_config import configure_logging
+    configure_logging()
+    import argparse
+    parser = argparse.ArgumentParser(description="Update the allocation table from combined_inventory")
+    parser.add_argument('--full', action='store_true', help="Recompute every date instead of only changed ones")
+    args = parser.parse_args()
+    main(full_rebuild=args.full)
\ No newline at end of file